@@ -5,7 +5,10 @@
 #include <string.h>
 #include <fcntl.h>
 #include <unistd.h>
+#include <signal.h>
+#include <sys/resource.h>
 #include <sys/types.h>
+#include <sys/wait.h>
 
 #define MAX_FILE (1 * 1024 * 1024L)
 
@@ -15,6 +18,16 @@ static int ExecuteFilesOnyByOne(int argc, char **argv) {
 
   unsigned char *buf = (unsigned char *)malloc(MAX_FILE);
 
+  // In batch mode, the output of each file is enclosed by start and end markers
+  // carrying the argv index of the file, so that logs can be attributed to each file.
+  int batch = getenv("FR_BATCH_MARKERS") != NULL;
+
+  // Targets tokenize FIXREVERTER in place, so it is restored before each file.
+  char *fixreverter = getenv("FIXREVERTER");
+  if (fixreverter) { fixreverter = strdup(fixreverter); }
+
+  if (batch) { fprintf(stderr, "[FRDRIVER] ready\n"); }
+
   for (int i = 1; i < argc; i++) {
 
     int fd = 0;
@@ -27,9 +40,12 @@ static int ExecuteFilesOnyByOne(int argc, char **argv) {
 
     if (length > 0) {
 
+      if (fixreverter) { setenv("FIXREVERTER", fixreverter, 1); }
+      if (batch) { fprintf(stderr, "[FRDRIVER] start %d\n", i); }
       printf("Reading %zu bytes from %s\n", length, argv[i]);
       LLVMFuzzerTestOneInput(buf, length);
       printf("Execution successful.\n");
+      if (batch) { fprintf(stderr, "[FRDRIVER] end %d\n", i); }
 
     }
 
@@ -37,11 +53,145 @@ static int ExecuteFilesOnyByOne(int argc, char **argv) {
 
   }
 
+  free(buf);
+  free(fixreverter);
+  return 0;
+
+}
+
+static int ReadAll(int fd, void *data, size_t size) {
+
+  for (size_t done = 0; done < size;) {
+
+    ssize_t n = read(fd, (char *)data + done, size - done);
+    if (n <= 0) { return -1; }
+    done += n;
+
+  }
+
+  return 0;
+
+}
+
+static int WriteAll(int fd, const void *data, size_t size) {
+
+  for (size_t done = 0; done < size;) {
+
+    ssize_t n = write(fd, (const char *)data + done, size - done);
+    if (n <= 0) { return -1; }
+    done += n;
+
+  }
+
+  return 0;
+
+}
+
+// Reads a string prefixed by its uint32 length. Returns NULL on EOF or error.
+static char *ReadString(int fd) {
+
+  uint32_t length;
+  if (ReadAll(fd, &length, sizeof(length)) != 0) { return NULL; }
+  char *str = (char *)malloc(length + 1);
+  if (ReadAll(fd, str, length) != 0) {
+
+    free(str);
+    return NULL;
+
+  }
+
+  str[length] = '\0';
+  return str;
+
+}
+
+// Runs one file in a forked child with its stderr written to log_path.
+static void RunChild(int ctl_fd, int st_fd, unsigned char *buf, const char *fixreverter,
+                     const char *seed_path, const char *log_path) {
+
+  // A group of its own lets the client kill the child and anything it spawns.
+  setpgid(0, 0);
+  close(ctl_fd);
+  close(st_fd);
+
+  int log_fd = open(log_path, O_WRONLY | O_CREAT | O_TRUNC, 0600);
+  int null_fd = open("/dev/null", O_WRONLY);
+  if (log_fd == -1 || null_fd == -1) { _exit(1); }
+  dup2(log_fd, 2);
+  dup2(null_fd, 1);
+  close(log_fd);
+  close(null_fd);
+
+  setenv("FIXREVERTER", fixreverter, 1);
+
+  int fd = open(seed_path, O_RDONLY);
+  if (fd == -1) { exit(0); }
+  ssize_t length = read(fd, buf, MAX_FILE);
+  close(fd);
+  if (length > 0) { LLVMFuzzerTestOneInput(buf, length); }
+  exit(0);
+
+}
+
+// Fork-server mode, enabled by setting FR_FORKSERVER to "<control fd>,<status fd>".
+// The server stays resident and forks a child per request, so process creation and sanitizer
+// initialization are paid once per binary instead of once per execution.
+// Once started, the server writes FR_FORKSERVER_HELLO to the status fd. Each request on the control fd is three
+// length-prefixed strings: the FIXREVERTER value, the seed path and the log path. The server replies with the
+// pid of the child and, once the child is gone, its wait status and its max RSS in KB, all as int32.
+// The server exits when the control fd is closed.
+#define FR_FORKSERVER_HELLO 0x32465246
+
+static int ForkServer(const char *fds) {
+
+  int ctl_fd, st_fd;
+  if (sscanf(fds, "%d,%d", &ctl_fd, &st_fd) != 2) { return 1; }
+
+  unsigned char *buf = (unsigned char *)malloc(MAX_FILE);
+  uint32_t hello = FR_FORKSERVER_HELLO;
+  if (WriteAll(st_fd, &hello, sizeof(hello)) != 0) { return 1; }
+
+  while (1) {
+
+    char *fixreverter = ReadString(ctl_fd);
+    char *seed_path = fixreverter ? ReadString(ctl_fd) : NULL;
+    char *log_path = seed_path ? ReadString(ctl_fd) : NULL;
+    if (!log_path) { break; }
+
+    int32_t pid = fork();
+    if (pid == 0) { RunChild(ctl_fd, st_fd, buf, fixreverter, seed_path, log_path); }
+    free(fixreverter);
+    free(seed_path);
+    free(log_path);
+    if (WriteAll(st_fd, &pid, sizeof(pid)) != 0) { break; }
+
+    int32_t status = 0;
+    struct rusage usage;
+    memset(&usage, 0, sizeof(usage));
+    if (pid < 0 || wait4(pid, &status, 0, &usage) < 0) {
+
+      // Reported as killed by SIGKILL since the child did not run to completion.
+      status = SIGKILL;
+
+    }
+
+    int32_t max_rss = usage.ru_maxrss;
+    if (WriteAll(st_fd, &status, sizeof(status)) != 0 ||
+        WriteAll(st_fd, &max_rss, sizeof(max_rss)) != 0) {
+
+      break;
+
+    }
+
+  }
+
   free(buf);
   return 0;
 
 }
 
 int main(int argc, char **argv) {
+    char *fork_server = getenv("FR_FORKSERVER");
+    if (fork_server) { return ForkServer(fork_server); }
     return ExecuteFilesOnyByOne(argc, argv);
 }
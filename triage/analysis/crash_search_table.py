@@ -0,0 +1,30 @@
+import json
+
+from prettytable import PrettyTable
+from common.confighelper import ConfigHelper
+
+
+# Prints the subsets of triggers run to find the crash sets of each crash seed, compared with the exhaustive search.
+def crash_search_table(helper: ConfigHelper) -> None:
+    table = PrettyTable()
+    table.field_names = ['benchmark', 'fuzzer', 'trial', 'seed', 'triggers', 'crash sets',
+                         'executions', 'exhaustive', 'saved']
+    total_executions = 0
+    total_exhaustive = 0
+    for benchmark in helper.benchmarks():
+        for fuzzer in helper.fuzzers():
+            for trial in helper.trials(benchmark, fuzzer):
+                with open(helper.parsed_seeds_store(benchmark, fuzzer, trial, 'crash'), 'r') as f:
+                    crashed = json.load(f)
+                for seed in crashed:
+                    # Stores of older triage runs do not record executions.
+                    if 'executions' not in seed:
+                        continue
+                    table.add_row([benchmark, fuzzer, trial, seed['id'], len(seed['triggers']), len(seed['crashes']),
+                                   seed['executions'], seed['exhaustive_executions'],
+                                   seed['exhaustive_executions'] - seed['executions']])
+                    total_executions += seed['executions']
+                    total_exhaustive += seed['exhaustive_executions']
+    print(table)
+    print(f'crash set search ran {total_executions} executions, '
+          f'{total_exhaustive - total_executions} fewer than the exhaustive search ({total_exhaustive})')
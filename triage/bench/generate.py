@@ -0,0 +1,163 @@
+import collections
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import subprocess
+import tarfile
+
+import common.paths
+import common.utils
+from common.fuzzers import ADAPTERS
+
+# Name of the experiment, and of the fuzz target of all benchmarks, in the generated tree.
+EXPERIMENT = 'synthetic'
+FUZZ_TARGET = 'fuzz_stub'
+# Bytes from TRIGGER_BASE on trigger an injection of the stub target, and lower bytes only reach it.
+TRIGGER_BASE = 128
+# Hours the synthetic fuzzing trials ran, which bounds the times of their seeds.
+FUZZING_HOURS = 1
+STUB_SOURCE = os.path.join(os.path.dirname(__file__), 'stub_target.c')
+DRIVER_SOURCE = os.path.join(os.path.dirname(common.utils.SCRIPT_DIR), 'fuzzers', 'fr_triage_driver',
+                             'FRFuzzingDriver.c')
+
+
+# Size of a generated experiment: `benchmarks` benchmarks with `trials` trials of every fuzzer with an adapter, each
+# with `queue_seeds` queue seeds and `crash_seeds` crash seeds in `snapshots` corpus archives. Stub targets have
+# `injections` injections, of which `crash_sets` sets of 1 to 3 injections crash together.
+Scale = collections.namedtuple('Scale', ['benchmarks', 'trials', 'queue_seeds', 'crash_seeds', 'snapshots',
+                                         'injections', 'crash_sets'], defaults=[2, 64, 8])
+
+
+SCALES = {'small': Scale(benchmarks=2, trials=2, queue_seeds=50, crash_seeds=10),
+          'medium': Scale(benchmarks=3, trials=5, queue_seeds=400, crash_seeds=40),
+          'large': Scale(benchmarks=5, trials=10, queue_seeds=2000, crash_seeds=100, snapshots=4, injections=128,
+                         crash_sets=16)}
+
+
+# Generates a FuzzBench experiment tree of `scale` under `root`, with a stub triage binary and config.ini.
+# Seeds are drawn from `seed`, so that a scale always generates the same tree. Returns the path of config.ini.
+def generate(root: str, scale: Scale, seed: int = 0, values: dict = None) -> str:
+    if os.path.exists(root) and not os.path.exists(os.path.join(root, 'exp', EXPERIMENT)):
+        logging.error(f'{root} exists and was not generated by the triage benchmark, choose another directory')
+        exit(1)
+    common.paths.rm_if_exist(root)
+    rnd = random.Random(seed)
+    crash_sets = random_crash_sets(rnd, scale)
+    benchmarks = [f'stub{i:02d}' for i in range(scale.benchmarks)]
+    for benchmark in benchmarks:
+        benchmark_dir = os.path.join(root, 'fuzzbench', 'benchmarks', benchmark)
+        common.paths.mkdir(benchmark_dir)
+        with open(os.path.join(benchmark_dir, 'benchmark.yaml'), 'w') as f:
+            f.write(f'fuzz_target: {FUZZ_TARGET}\n')
+        dda_dir = os.path.join(root, 'work', 'dda_store', benchmark)
+        common.paths.mkdir(dda_dir)
+        with open(os.path.join(dda_dir, 'dda.json'), 'w') as f:
+            json.dump([{'index': i, 'pattern': ['COND_ABORT', 'COND_EXEC', 'COND_ASSIGN'][i % 3]}
+                       for i in range(scale.injections)], f)
+        # Trials of a benchmark share initial seeds and find the same crashes.
+        initial_seeds = [queue_seed(rnd, scale, crash_sets) for _ in range(max(scale.queue_seeds // 10, 1))]
+        crash_contents = [crash_seed(rnd, scale, crash_set) for crash_set in crash_sets for _ in range(3)]
+        for fuzzer in ADAPTERS:
+            for trial in range(scale.trials):
+                queue = initial_seeds + [queue_seed(rnd, scale, crash_sets)
+                                         for _ in range(scale.queue_seeds - len(initial_seeds))]
+                crashes = [rnd.choice(crash_contents) for _ in range(scale.crash_seeds)]
+                corpus_dir = os.path.join(root, 'exp', EXPERIMENT, 'experiment-folders', f'{benchmark}-{fuzzer}',
+                                          f'trial-{trial}', 'corpus')
+                write_archives(corpus_dir, fuzzer, queue, crashes, scale.snapshots)
+    build_stub(os.path.join(root, 'stub', FUZZ_TARGET), crash_sets)
+    return write_config(root, benchmarks, scale, values or {})
+
+
+# Returns disjoint crash sets of 1 to 3 random injections.
+def random_crash_sets(rnd: random.Random, scale: Scale) -> list:
+    injections = rnd.sample(range(scale.injections), min(scale.injections // 2, scale.crash_sets * 3))
+    crash_sets = []
+    for i in range(scale.crash_sets):
+        size = i % 3 + 1
+        if len(injections) < size:
+            break
+        crash_sets.append(sorted(injections[:size]))
+        injections = injections[size:]
+    return crash_sets
+
+
+# Returns a queue seed reaching random injections and triggering some that are in no crash set.
+def queue_seed(rnd: random.Random, scale: Scale, crash_sets: list) -> bytes:
+    crashing = {injection for crash_set in crash_sets for injection in crash_set}
+    safe = [injection for injection in range(scale.injections) if injection not in crashing]
+    data = [rnd.randrange(scale.injections) for _ in range(rnd.randint(1, 16))]
+    data += [TRIGGER_BASE + rnd.choice(safe) for _ in range(rnd.randint(0, 3))]
+    rnd.shuffle(data)
+    return bytes(data)
+
+
+# Returns a crash seed triggering `crash_set` and some other injections.
+def crash_seed(rnd: random.Random, scale: Scale, crash_set: list) -> bytes:
+    data = [rnd.randrange(scale.injections) for _ in range(rnd.randint(1, 16))]
+    data += [TRIGGER_BASE + injection for injection in crash_set]
+    data += [TRIGGER_BASE + rnd.randrange(scale.injections) for _ in range(rnd.randint(0, 3))]
+    rnd.shuffle(data)
+    return bytes(data)
+
+
+# Writes `snapshots` cumulative corpus archives of a trial, named and laid out like those of `fuzzer`.
+def write_archives(corpus_dir: str, fuzzer: str, queue: list, crashes: list, snapshots: int) -> None:
+    common.paths.mkdir(corpus_dir)
+    adapter = ADAPTERS[fuzzer]
+    seconds = FUZZING_HOURS * 3600
+    for snapshot in range(1, snapshots + 1):
+        with tarfile.open(os.path.join(corpus_dir, f'corpus-archive-{snapshot:04d}.tar.gz'), 'w:gz') as tar:
+            for seed_type, seed_dir, seeds in (('queue', adapter.queue_dirs[0], queue),
+                                               ('crash', adapter.crash_dirs[0], crashes)):
+                for i, data in enumerate(seeds[:len(seeds) * snapshot // snapshots]):
+                    seed_time = (i + 1) * seconds // (len(seeds) + 1)
+                    add_member(tar, f'corpus/{seed_dir}/{seed_name(fuzzer, seed_type, i, seed_time, data)}', data,
+                               seed_time)
+
+
+# Returns the name of the `i`-th seed of `seed_type`. libFuzzer names seeds by the SHA-1 of their content, which the
+# index follows, since seeds of a trial may share their content.
+def seed_name(fuzzer: str, seed_type: str, i: int, seed_time: int, data: bytes) -> str:
+    if fuzzer == 'libfuzzer':
+        digest = hashlib.sha1(data).hexdigest()
+        return f'{digest}-{i}' if seed_type == 'queue' else f'crash-{digest}-{i}'
+    if seed_type == 'crash':
+        return f'id:{i:06d},sig:06,src:000000,time:{seed_time * 1000}'
+    return f'id:{i:06d},time:{seed_time * 1000}'
+
+
+def add_member(tar: tarfile.TarFile, name: str, data: bytes, mtime: int) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = mtime
+    tar.addfile(info, io.BytesIO(data))
+
+
+# Compiles the stub target with fr_triage_driver to `path`, crashing on `crash_sets`. The compiler is taken from CC.
+def build_stub(path: str, crash_sets: list) -> None:
+    common.paths.mkdir(os.path.dirname(path))
+    crash_set_arg = ';'.join(','.join(str(injection) for injection in crash_set) for crash_set in crash_sets)
+    subprocess.run([os.environ.get('CC', 'cc'), '-O2', '-o', path, f'-DSTUB_CRASH_SETS="{crash_set_arg}"',
+                    STUB_SOURCE, DRIVER_SOURCE], check=True)
+
+
+def write_config(root: str, benchmarks: list, scale: Scale, values: dict) -> str:
+    values = {'cores': 'auto', 'timeout': FUZZING_HOURS, 'trials': scale.trials,
+              # Executions are measured rather than looked up in the cache of a previous run.
+              'execCache': 'no', **values}
+    config_path = os.path.join(root, 'config.ini')
+    with open(config_path, 'w') as f:
+        f.write(f'[paths]\n'
+                f'workDir = {os.path.join(root, "work")}\n'
+                f'outDir = {os.path.join(root, "out")}\n'
+                f'fuzzbenchDir = {os.path.join(root, "fuzzbench")}\n'
+                f'fuzzbenchExpDir = {os.path.join(root, "exp")}\n'
+                f'[experiments]\n{EXPERIMENT}\n'
+                '[benchmarks]\n' + ''.join(f'{benchmark}\n' for benchmark in benchmarks) +
+                '[fuzzers]\n' + ''.join(f'{fuzzer}\n' for fuzzer in ADAPTERS) +
+                '[values]\n' + ''.join(f'{key} = {value}\n' for key, value in values.items()))
+    return config_path
@@ -0,0 +1,228 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import time
+import traceback
+import types
+
+# Add the triage folder to PATH.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prettytable import PrettyTable
+
+from analysis.coverage_table import coverage_table
+from analysis.crash_search_table import crash_search_table
+from analysis.growth_plot import growth_plot
+from analysis.venn_diagram import venn_diagram
+from bench.generate import FUZZ_TARGET, SCALES, Scale, generate
+from common.confighelper import ConfigHelper
+from setup import precheck
+from setup.extract import extract_fuzzing_results
+from setup.manifest import SetupManifest
+from setup.triage_bin import build_triage_bins
+from triage.triage_seeds import triage_seeds
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# Stages of `main.py` run by the benchmark, in order.
+STAGES = ['setup', 'triage queue', 'triage crash', 'report']
+# Relative change of a measurement over its baseline which is reported as a regression.
+TOLERANCE = 0.25
+# Measurements where higher is better, the others are better lower.
+HIGHER_IS_BETTER = {'seeds_per_second', 'executions_per_second'}
+
+
+class StubDockerClient:
+    """Stands in for the docker client of `build_triage_bins`, copying the stub binary where the builder image of a
+    benchmark would copy its triage binary."""
+
+    def __init__(self, stub_binary: str):
+        self.images = self
+        self.containers = self
+        self.__stub_binary = stub_binary
+
+    def get(self, image: str):
+        return types.SimpleNamespace(id=f'stub:{image}')
+
+    def run(self, image: str, volumes: dict, **kwargs) -> None:
+        [triage_bin_dir] = volumes
+        shutil.copy(self.__stub_binary, os.path.join(triage_bin_dir, os.path.basename(self.__stub_binary)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark setup, triage and report of main.py on a generated '
+                                                 'FuzzBench experiment with a stub triage binary.')
+    parser.add_argument('--scale',
+                        help='Size of the generated experiment.',
+                        choices=list(SCALES),
+                        default='medium')
+    for field in Scale._fields:
+        parser.add_argument(f'--{field.replace("_", "-")}',
+                            help=f'Override the {field.replace("_", " ")} of the scale.',
+                            type=int)
+    parser.add_argument('--set',
+                        help='Set a [values] option of the generated config, e.g. `--set executionEngine=pool`.',
+                        action='append',
+                        default=[])
+    parser.add_argument('--dir',
+                        help='Directory the experiment is generated in, which is deleted first.',
+                        default=os.path.join('/tmp', 'revbugbench-bench'))
+    parser.add_argument('--baseline',
+                        help='Results to compare against.',
+                        default=BASELINE)
+    parser.add_argument('--save-baseline',
+                        help='Write the results to the baseline file instead of comparing against it.',
+                        action='store_true')
+    parser.add_argument('--check',
+                        help=f'Exit with 1 if a measurement regressed by more than {TOLERANCE:.0%} of its baseline.',
+                        action='store_true')
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(format='%(asctime)s %(levelname)-8s %(message)s', level=logging.INFO,
+                        datefmt='%Y-%m-%d %H:%M:%S')
+    args = parse_args()
+    scale = SCALES[args.scale]._replace(**{field: getattr(args, field) for field in Scale._fields
+                                           if getattr(args, field) is not None})
+    values = dict(option.split('=', 1) for option in args.set)
+    root = os.path.abspath(args.dir)
+    logging.info(f'generate an experiment of {scale} in {root}')
+    config_path = generate(root, scale, values=values)
+    results = {'scale': scale._asdict(), 'values': values, 'host': host_info(), 'stages': {}}
+    for stage in STAGES:
+        logging.info(f'benchmark {stage}')
+        results['stages'][stage] = measure(stage, config_path, os.path.join(root, 'stub', FUZZ_TARGET))
+    add_seed_rates(results['stages'], ConfigHelper(config_path))
+    with open(os.path.join(root, 'results.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        logging.info(f'saved the results as the baseline {args.baseline}')
+        print(results_table(results, None))
+        return 0
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline['scale'] != results['scale'] or baseline['values'] != results['values']:
+            logging.warning(f'the baseline {args.baseline} is of another scale or config, not comparing')
+            baseline = None
+    print(results_table(results, baseline))
+    regressions = [] if baseline is None else regressed(results, baseline)
+    for stage, measurement, change in regressions:
+        logging.warning(f'{stage}: {measurement} regressed by {change:.0%} of the baseline')
+    return 1 if args.check and regressions else 0
+
+
+def host_info() -> dict:
+    return {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+
+# Runs `stage` with the config at `config_path` in a child process and returns its measurements: wall time, peak RSS
+# of the child and the processes it waited for and, for triage stages, executions per second.
+def measure(stage: str, config_path: str, stub_binary: str) -> dict:
+    metrics_file = os.path.join(ConfigHelper(config_path).out_dir(), 'triage_metrics.json')
+    if os.path.exists(metrics_file):
+        os.remove(metrics_file)
+    start = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            run_stage(stage, ConfigHelper(config_path), stub_binary)
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            logging.shutdown()
+            os._exit(code)
+    _, status, usage = os.wait4(pid, 0)
+    wall_seconds = time.monotonic() - start
+    if os.waitstatus_to_exitcode(status) != 0:
+        logging.error(f'{stage} failed with {os.waitstatus_to_exitcode(status)}')
+        exit(1)
+    measurements = {'wall_seconds': round(wall_seconds, 3), 'peak_rss_mb': round(usage.ru_maxrss / 1024, 1)}
+    # Executions are counted by the triage metrics, unless metricsInterval turns them off.
+    if stage.startswith('triage') and os.path.exists(metrics_file):
+        with open(metrics_file, 'r') as f:
+            counters = json.load(f)['counters']
+        executions = int(sum(counter['value'] for counter in counters
+                             if counter['name'] == 'triage_executions_total'))
+        measurements['executions'] = executions
+        measurements['executions_per_second'] = round(executions / wall_seconds, 1)
+    return measurements
+
+
+# Runs `stage` like `main.py` does, with triage binaries copied from `stub_binary`.
+def run_stage(stage: str, helper: ConfigHelper, stub_binary: str) -> None:
+    if stage == 'setup':
+        exp_tuples = precheck.exp_tuples(helper.benchmarks(), helper.fuzzers(), helper.catalog())
+        manifest = SetupManifest(helper.setup_manifest())
+        extract_fuzzing_results(exp_tuples, helper, manifest)
+        build_triage_bins(helper, manifest, StubDockerClient(stub_binary))
+    elif stage.startswith('triage'):
+        triage_seeds(helper, stage.split()[1])
+    else:
+        coverage_table(helper)
+        crash_search_table(helper)
+        growth_plot(helper)
+        venn_diagram(helper)
+
+
+# Adds the seeds each stage went through and its seeds per second to `stages`: all seeds for setup and report, and
+# the seeds of their type for triage stages, as stored to parsed_seeds.
+def add_seed_rates(stages: dict, helper: ConfigHelper) -> None:
+    seeds = {}
+    for seed_type in ('queue', 'crash'):
+        seeds[seed_type] = 0
+        for benchmark in helper.benchmarks():
+            for fuzzer in helper.fuzzers():
+                for trial in helper.trials(benchmark, fuzzer):
+                    with open(helper.parsed_seeds_store(benchmark, fuzzer, trial, seed_type), 'r') as f:
+                        seeds[seed_type] += len(json.load(f))
+    for stage, measurements in stages.items():
+        stage_seeds = seeds[stage.split()[1]] if stage.startswith('triage') else sum(seeds.values())
+        measurements['seeds'] = stage_seeds
+        measurements['seeds_per_second'] = round(stage_seeds / measurements['wall_seconds'], 1)
+
+
+# Returns a table of the measurements of `results` per stage, with their change over `baseline` if given.
+def results_table(results: dict, baseline) -> PrettyTable:
+    table = PrettyTable()
+    table.field_names = ['stage', 'measurement', 'value'] + ([] if baseline is None else ['baseline', 'change'])
+    table.align = 'r'
+    for stage, measurements in results['stages'].items():
+        for measurement, value in measurements.items():
+            row = [stage, measurement, value]
+            if baseline is not None:
+                base = baseline['stages'].get(stage, {}).get(measurement)
+                row += [base, '' if not base else f'{(value - base) / base:+.0%}']
+            table.add_row(row)
+    return table
+
+
+# Returns (stage, measurement, relative change) of measurements that got worse by more than TOLERANCE.
+def regressed(results: dict, baseline: dict) -> list:
+    regressions = []
+    for stage, measurements in results['stages'].items():
+        for measurement, value in measurements.items():
+            base = baseline['stages'].get(stage, {}).get(measurement)
+            if not base or measurement in ('seeds', 'executions'):
+                continue
+            change = (value - base) / base
+            worse = -change if measurement in HIGHER_IS_BETTER else change
+            if worse > TOLERANCE:
+                regressions.append((stage, measurement, worse))
+    return regressions
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,84 @@
+// Stub fuzz target of the synthetic triage benchmark, linked with fr_triage_driver in place of a FixReverter
+// instrumented program.
+//
+// Each byte of a seed below STUB_INJECTIONS reaches the injection with that index, and each byte b from 128 on
+// reaches and triggers injection b - 128. Reached and triggered injections are logged when they are turned on by
+// FIXREVERTER, which is parsed like the FixReverter runtime does. The seed crashes with an AddressSanitizer-style
+// report when all injections of one of the crash sets in STUB_CRASH_SETS are triggered and turned on, e.g.
+// "0;1,2;3,4,5" crashes on injection 0, on 1 and 2 together, or on 3, 4 and 5 together.
+
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define STUB_INJECTIONS 128
+#define STUB_MAX_CRASH_SETS 64
+#define STUB_MAX_CRASH_SET_SIZE 8
+
+#ifndef STUB_CRASH_SETS
+#define STUB_CRASH_SETS "0;1,2;3,4,5"
+#endif
+
+static short FIXREVERTER[STUB_INJECTIONS];
+static int crash_sets[STUB_MAX_CRASH_SETS][STUB_MAX_CRASH_SET_SIZE];
+static int crash_set_sizes[STUB_MAX_CRASH_SETS];
+static int num_crash_sets = -1;
+
+static void parse_crash_sets(void) {
+  char *sets = strdup(STUB_CRASH_SETS);
+  char *set_end, *index_end;
+  num_crash_sets = 0;
+  for (char *set = strtok_r(sets, ";", &set_end); set && num_crash_sets < STUB_MAX_CRASH_SETS;
+       set = strtok_r(NULL, ";", &set_end)) {
+    int size = 0;
+    for (char *index = strtok_r(set, ",", &index_end); index && size < STUB_MAX_CRASH_SET_SIZE;
+         index = strtok_r(NULL, ",", &index_end)) {
+      crash_sets[num_crash_sets][size++] = atoi(index) % STUB_INJECTIONS;
+    }
+    crash_set_sizes[num_crash_sets++] = size;
+  }
+  free(sets);
+}
+
+static void parse_fixreverter(void) {
+  char *token = strtok(getenv("FIXREVERTER"), " ");
+  if (token == NULL) {
+    for (int i = 0; i < STUB_INJECTIONS; i++) { FIXREVERTER[i] = 1; }
+  } else if (!strcmp("on", token) || !strcmp("off", token)) {
+    // `on` turns on the listed injections only, and `off` turns on all but the listed injections.
+    short listed = !strcmp("on", token);
+    for (int i = 0; i < STUB_INJECTIONS; i++) { FIXREVERTER[i] = !listed; }
+    while ((token = strtok(NULL, " ")) != NULL) { FIXREVERTER[atoi(token) % STUB_INJECTIONS] = listed; }
+  } else {
+    fprintf(stderr, "[FIXREVERTER] - first token must be on or off\n");
+    exit(0);
+  }
+}
+
+int LLVMFuzzerTestOneInput(const uint8_t *data, size_t size) {
+  if (num_crash_sets < 0) { parse_crash_sets(); }
+  parse_fixreverter();
+  short triggered[STUB_INJECTIONS] = {0};
+  for (size_t i = 0; i < size; i++) {
+    int index = data[i] % STUB_INJECTIONS;
+    if (!FIXREVERTER[index]) { continue; }
+    if (data[i] >= 128) {
+      fprintf(stderr, "triggered bug index %d\n", index);
+      triggered[index] = 1;
+    } else {
+      fprintf(stderr, "reached bug index %d\n", index);
+    }
+  }
+  for (int set = 0; set < num_crash_sets; set++) {
+    int crashes = crash_set_sizes[set] > 0;
+    for (int i = 0; i < crash_set_sizes[set]; i++) { crashes &= triggered[crash_sets[set][i]]; }
+    if (crashes) {
+      fprintf(stderr, "==1==ERROR: AddressSanitizer: heap-buffer-overflow on address 0x602000000010\n"
+                      "    #0 0x4f1a2b in stub_crash_set_%d stub_target.c:%d\n"
+                      "    #1 0x4f1c3d in LLVMFuzzerTestOneInput stub_target.c:1\n", set, set);
+      abort();
+    }
+  }
+  return 0;
+}
@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import re
+
+from common import paths
+
+ARCHIVE_PATTERN = re.compile(r'corpus-archive-(\d+)\.tar\.gz$')
+
+
+def _scan_corpus_dir(corpus_dir: str) -> dict:
+    archives = {}
+    with os.scandir(corpus_dir) as it:
+        for entry in it:
+            match = ARCHIVE_PATTERN.match(entry.name)
+            if match:
+                stat = entry.stat()
+                archives[match.group(1)] = {'name': entry.name, 'size': stat.st_size, 'mtime': stat.st_mtime}
+    return archives
+
+
+def _mtime(path: str):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class ExperimentCatalog:
+    """Benchmark-fuzzer pairs, trials and corpus archives of FuzzBench experiments.
+
+    The catalog is built with one `os.scandir` pass per directory of interest and can be persisted to a file.
+    A persisted catalog is reused as long as the mtimes of the scanned directories are unchanged;
+    directories whose mtime changed are scanned again.
+    """
+
+    def __init__(self, raw_data_dir: str, exps: list, pair_names: dict, cache_file: str = None):
+        self.__raw_data_dir = raw_data_dir
+        # Maps pair directory names `benchmark-fuzzer` to (benchmark, fuzzer) tuples of interest.
+        self.__pair_names = pair_names
+        self.__cache_file = cache_file
+        self.__exps = {}
+        cached = self.__load(exps)
+        changed = False
+        for exp in exps:
+            exp_data, exp_changed = self.__refresh_exp(exp, cached.get(exp))
+            self.__exps[exp] = exp_data
+            changed = changed or exp_changed
+        self.__pairs = {}
+        for exp, exp_data in self.__exps.items():
+            for pair_name in exp_data['pairs']:
+                self.__pairs.setdefault(self.__pair_names[pair_name], []).append(exp)
+        if changed and cache_file:
+            self.__save()
+
+    def __load(self, exps: list) -> dict:
+        if not self.__cache_file or not os.path.exists(self.__cache_file):
+            return {}
+        with open(self.__cache_file, 'r') as f:
+            cached = json.load(f)
+        # Pairs of interest decide which directories were scanned.
+        if cached.get('pair_names') != sorted(self.__pair_names):
+            return {}
+        return {exp: data for exp, data in cached['exps'].items() if exp in exps}
+
+    def __save(self) -> None:
+        tmp_file = f'{self.__cache_file}.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'pair_names': sorted(self.__pair_names), 'exps': self.__exps}, f)
+        os.replace(tmp_file, self.__cache_file)
+
+    def __exp_dir(self, exp: str) -> str:
+        return os.path.join(self.__raw_data_dir, exp, 'experiment-folders')
+
+    def __refresh_exp(self, exp: str, cached: dict) -> tuple:
+        exp_dir = self.__exp_dir(exp)
+        mtime = _mtime(exp_dir)
+        if cached is None or cached['mtime'] != mtime:
+            cached_pairs = cached['pairs'] if cached else {}
+            pair_names = []
+            if mtime is not None:
+                with os.scandir(exp_dir) as it:
+                    pair_names = [e.name for e in it if e.name in self.__pair_names and e.is_dir()]
+            cached = {'mtime': mtime, 'pairs': {name: cached_pairs.get(name) for name in pair_names}}
+            changed = True
+        else:
+            changed = False
+        for pair_name, pair_data in cached['pairs'].items():
+            cached['pairs'][pair_name], pair_changed = self.__refresh_pair(os.path.join(exp_dir, pair_name), pair_data)
+            changed = changed or pair_changed
+        return cached, changed
+
+    def __refresh_pair(self, pair_dir: str, cached: dict) -> tuple:
+        mtime = _mtime(pair_dir)
+        changed = False
+        if cached is None or cached['mtime'] != mtime:
+            cached_trials = cached['trials'] if cached else {}
+            with os.scandir(pair_dir) as it:
+                trial_names = [e.name for e in it if e.is_dir()]
+            cached = {'mtime': mtime, 'trials': {name: cached_trials.get(name) for name in trial_names}}
+            changed = True
+        for trial_name, trial_data in cached['trials'].items():
+            corpus_dir = os.path.join(pair_dir, trial_name, 'corpus')
+            corpus_mtime = _mtime(corpus_dir)
+            if trial_data is None or trial_data['mtime'] != corpus_mtime:
+                archives = _scan_corpus_dir(corpus_dir) if corpus_mtime is not None else {}
+                cached['trials'][trial_name] = {'mtime': corpus_mtime, 'archives': archives}
+                changed = True
+        return cached, changed
+
+    def exps_of(self, benchmark: str, fuzzer: str) -> list:
+        """Returns the experiments containing the benchmark-fuzzer pair."""
+        return self.__pairs.get((benchmark, fuzzer), [])
+
+    def __pair_data(self, benchmark: str, fuzzer: str) -> dict:
+        exps = self.exps_of(benchmark, fuzzer)
+        if not exps:
+            logging.error(f'benchmark-fuzzer pair {benchmark}-{fuzzer} does not appear in any experiment')
+            exit(1)
+        return self.__exps[exps[0]]['pairs'][f'{benchmark}-{fuzzer}']
+
+    def trials(self, benchmark: str, fuzzer: str) -> list:
+        return sorted(self.__pair_data(benchmark, fuzzer)['trials'])
+
+    def snapshot_ids(self, benchmark: str, fuzzer: str, trial_name: str) -> list:
+        return sorted(int(i) for i in self.__pair_data(benchmark, fuzzer)['trials'][trial_name]['archives'])
+
+    def latest_archive(self, benchmark: str, fuzzer: str, trial_name: str) -> dict:
+        """Returns path, size, mtime and snapshot id of the latest corpus archive of a trial, or None."""
+        archives = self.__pair_data(benchmark, fuzzer)['trials'][trial_name]['archives']
+        if not archives:
+            return None
+        snapshot = max(archives, key=int)
+        exp = self.exps_of(benchmark, fuzzer)[0]
+        path = os.path.join(self.__exp_dir(exp), f'{benchmark}-{fuzzer}', trial_name, 'corpus',
+                            archives[snapshot]['name'])
+        return {'path': path, 'size': archives[snapshot]['size'], 'mtime': archives[snapshot]['mtime'],
+                'snapshot': int(snapshot)}
+
+
+def build_catalog(raw_data_dir: str, exps: list, benchmarks: list, fuzzers: list, cache_file: str = None):
+    pair_names = {f'{b}-{f}': (b, f) for b in benchmarks for f in fuzzers}
+    if cache_file:
+        paths.mkdir(os.path.dirname(cache_file))
+    return ExperimentCatalog(raw_data_dir, exps, pair_names, cache_file)
@@ -1,11 +1,13 @@
 import configparser
-import os
+import logging
 from pathlib import Path
 
 import yaml
 
 from os.path import join
 from common import paths
+from common.catalog import ExperimentCatalog, build_catalog
+from common.utils import EXECUTION_ENGINES, SANITIZER_PROFILES, SEARCH_MODES, available_cpus
 
 
 class ConfigHelper:
@@ -27,11 +29,57 @@ class ConfigHelper:
         self.__exps = list(config['experiments'].keys())
         self.__benchmarks = list(config['benchmarks'].keys())
         self.__fuzzers = list(config['fuzzers'].keys())
-        self.__cores = int(config.get('values', 'cores'))
+        cores = config.get('values', 'cores', fallback='auto')
+        self.__cores = available_cpus() if cores == 'auto' else int(cores)
         self.__timeout = int(config.get('values', 'timeout'))
         self.__num_trials = int(config.get('values', 'trials'))
+        self.__extract = config.getboolean('values', 'extract', fallback=True)
+        self.__cache_catalog = config.getboolean('values', 'cacheCatalog', fallback=True)
+        self.__batch_size = int(config.get('values', 'batchSize', fallback=1))
+        self.__fork_server = config.getboolean('values', 'forkServer', fallback=True)
+        self.__admission_control = config.getboolean('values', 'admissionControl', fallback=True)
+        self.__memory_reserve_mb = int(config.get('values', 'memoryReserveMb', fallback=1024))
+        self.__execution_engine = config.get('values', 'executionEngine', fallback='async')
+        if self.__execution_engine not in EXECUTION_ENGINES:
+            logging.error(f'executionEngine in config must be one of {EXECUTION_ENGINES}')
+            exit(1)
+        host, _, port = config.get('values', 'coordinatorAddress', fallback='127.0.0.1:7810').rpartition(':')
+        self.__coordinator_address = (host, int(port))
+        self.__coordinator_key = config.get('values', 'coordinatorKey', fallback=None)
+        if self.__execution_engine == 'distributed' and not self.__coordinator_key:
+            logging.error('coordinatorKey in config must be set for the distributed executionEngine')
+            exit(1)
+        self.__lease_timeout = float(config.get('values', 'leaseTimeout', fallback=60))
+        self.__metrics_interval = float(config.get('values', 'metricsInterval', fallback=10))
+        self.__exec_cache = config.getboolean('values', 'execCache', fallback=True)
+        self.__bucket_crashes = config.getboolean('values', 'bucketCrashes', fallback=True)
+        self.__bucket_frames = int(config.get('values', 'bucketFrames', fallback=3))
+        self.__bucket_representatives = int(config.get('values', 'bucketRepresentatives', fallback=1))
+        self.__bucket_verify_ratio = float(config.get('values', 'bucketVerifyRatio', fallback=0))
+        self.__timeout_percentile = float(config.get('values', 'timeoutPercentile', fallback=99))
+        self.__timeout_factor = float(config.get('values', 'timeoutFactor', fallback=3))
+        self.__timeout_floor = float(config.get('values', 'timeoutFloor', fallback=1))
+        self.__timeout_ceiling = float(config.get('values', 'timeoutCeiling', fallback=15))
+        self.__sanitizer_profile = config.get('values', 'sanitizerProfile', fallback='lean')
+        if self.__sanitizer_profile not in SANITIZER_PROFILES:
+            logging.error(f'sanitizerProfile in config must be one of {SANITIZER_PROFILES}')
+            exit(1)
+        self.__sanitizer_validation_ratio = float(config.get('values', 'sanitizerValidationRatio', fallback=0))
+        self.__comb_level = int(config.get('values', 'combLevel', fallback=3))
+        self.__crash_search = config.get('values', 'crashSearch', fallback='exhaustive')
+        if self.__crash_search not in SEARCH_MODES:
+            logging.error(f'crashSearch in config must be one of {SEARCH_MODES}')
+            exit(1)
 
         self.__fuzz_targets = self.__get_fuzz_targets(self.__benchmarks)
+        self.__catalog = None
+        self.__store_dirs = set()
+
+    def __getstate__(self) -> dict:
+        # Only the main process needs the catalog, and pool tasks pickle the helper.
+        state = self.__dict__.copy()
+        state['_ConfigHelper__catalog'] = None
+        return state
 
     def __get_fuzz_targets(self, benchmarks: list) -> dict:
         target_names = {}
@@ -42,6 +90,14 @@ class ConfigHelper:
                                                      .read_text())['fuzz_target']
         return target_names
 
+    def catalog(self) -> ExperimentCatalog:
+        """Returns the catalog of the configured experiments, built once per run."""
+        if self.__catalog is None:
+            cache_file = join(self.__work_dir, 'catalog.json') if self.__cache_catalog else None
+            self.__catalog = build_catalog(self.__raw_data_dir, self.__exps, self.__benchmarks, self.__fuzzers,
+                                           cache_file)
+        return self.__catalog
+
     def raw_data_dir(self) -> str:
         return self.__raw_data_dir
 
@@ -51,6 +107,72 @@ class ConfigHelper:
     def cores(self) -> int:
         return self.__cores
 
+    def batch_size(self) -> int:
+        return self.__batch_size
+
+    def fork_server(self) -> bool:
+        return self.__fork_server
+
+    def admission_control(self) -> bool:
+        return self.__admission_control
+
+    def memory_reserve_mb(self) -> int:
+        return self.__memory_reserve_mb
+
+    def execution_engine(self) -> str:
+        return self.__execution_engine
+
+    def coordinator_address(self) -> tuple:
+        return self.__coordinator_address
+
+    def coordinator_key(self) -> bytes:
+        return self.__coordinator_key.encode()
+
+    def lease_timeout(self) -> float:
+        return self.__lease_timeout
+
+    def metrics_interval(self) -> float:
+        return self.__metrics_interval
+
+    def exec_cache(self) -> bool:
+        return self.__exec_cache
+
+    def bucket_crashes(self) -> bool:
+        return self.__bucket_crashes
+
+    def bucket_frames(self) -> int:
+        return self.__bucket_frames
+
+    def bucket_representatives(self) -> int:
+        return self.__bucket_representatives
+
+    def bucket_verify_ratio(self) -> float:
+        return self.__bucket_verify_ratio
+
+    def timeout_percentile(self) -> float:
+        return self.__timeout_percentile
+
+    def timeout_factor(self) -> float:
+        return self.__timeout_factor
+
+    def timeout_floor(self) -> float:
+        return self.__timeout_floor
+
+    def timeout_ceiling(self) -> float:
+        return self.__timeout_ceiling
+
+    def sanitizer_profile(self) -> str:
+        return self.__sanitizer_profile
+
+    def sanitizer_validation_ratio(self) -> float:
+        return self.__sanitizer_validation_ratio
+
+    def comb_level(self) -> int:
+        return self.__comb_level
+
+    def crash_search(self) -> str:
+        return self.__crash_search
+
     def timeout(self) -> int:
         return self.__timeout
 
@@ -63,6 +185,9 @@ class ConfigHelper:
     def fuzzers(self) -> list:
         return self.__fuzzers
 
+    def extract(self) -> bool:
+        return self.__extract
+
     def fuzz_target(self, benchmark: str) -> str:
         return self.__fuzz_targets[benchmark]
 
@@ -75,9 +200,14 @@ class ConfigHelper:
     def trial_data_dir(self, benchmark: str, fuzzer: str, trial_name: str) -> str:
         return join(self.bf_data_dir(benchmark, fuzzer), trial_name)
 
+    def bf_seed_index_dir(self, benchmark: str, fuzzer: str) -> str:
+        return join(self.__work_dir, 'seed_index', benchmark, fuzzer)
+
+    def seed_index_file(self, benchmark: str, fuzzer: str, trial_name: str) -> str:
+        return join(self.bf_seed_index_dir(benchmark, fuzzer), f'{trial_name}.json')
+
     def trials(self, benchmark: str, fuzzer: str) -> list:
-        paths.error_if_not_exist(self.bf_data_dir(benchmark, fuzzer), 'cannot extract trial names')
-        return os.listdir(self.bf_data_dir(benchmark, fuzzer))
+        return self.catalog().trials(benchmark, fuzzer)
 
     def num_trials(self) -> int:
         return self.__num_trials
@@ -90,9 +220,23 @@ class ConfigHelper:
 
     def parsed_seeds_store(self, benchmark: str, fuzzer: str, trial_name: str, seed_type: str) -> str:
         store_dir = join(self.__work_dir, 'parsed_seeds', benchmark, fuzzer)
-        paths.mkdir(store_dir)
+        if store_dir not in self.__store_dirs:
+            paths.mkdir(store_dir)
+            self.__store_dirs.add(store_dir)
         return join(store_dir, f'{trial_name}_{seed_type}.json')
 
+    def exec_cache_file(self, host: str = None) -> str:
+        return join(self.__work_dir, 'exec_cache.sqlite' if host is None else f'exec_cache_{host}.sqlite')
+
+    def triage_journal(self, seed_type: str) -> str:
+        return join(self.__work_dir, f'triage_journal_{seed_type}.jsonl')
+
+    def setup_manifest(self) -> str:
+        return join(self.__work_dir, 'setup_manifest.json')
+
+    def profile_dir(self) -> str:
+        return join(self.__out_dir, 'profile')
+
     def tmp_running_dir(self, process_name: str) -> str:
         return join(self.__work_dir, 'tmp_running_dir', process_name)
 
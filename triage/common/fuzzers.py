@@ -0,0 +1,59 @@
+import logging
+import re
+
+ID_PATTERN = re.compile(r'id:(\d+)')
+
+
+class FuzzerAdapter:
+    """Where a fuzzer stores seeds in its corpus and how it names them.
+
+    Seed directories are relative to the `corpus/` directory of a FuzzBench corpus archive.
+    """
+
+    def __init__(self, queue_dirs: list, crash_dirs: list, time_pattern: str = None, time_unit: float = 1,
+                 crash_prefixes: tuple = None):
+        self.queue_dirs = queue_dirs
+        self.crash_dirs = crash_dirs
+        self.__time_pattern = re.compile(time_pattern) if time_pattern else None
+        # Seconds per unit of the time in seed names.
+        self.__time_unit = time_unit
+        # If set, only crash seeds with these name prefixes are kept.
+        self.__crash_prefixes = crash_prefixes
+
+    def seed_dirs(self, seed_type: str) -> list:
+        return self.queue_dirs if seed_type == 'queue' else self.crash_dirs
+
+    def accepts(self, seed_name: str, seed_type: str) -> bool:
+        if seed_name == 'README.txt':
+            return False
+        if seed_type == 'crash' and self.__crash_prefixes and not seed_name.startswith(self.__crash_prefixes):
+            return False
+        return True
+
+    # Returns the seed generation time in seconds encoded in the seed name, or None.
+    def seed_time(self, seed_name: str):
+        if self.__time_pattern is None:
+            return None
+        match = self.__time_pattern.search(seed_name)
+        return int(match.group(1)) * self.__time_unit if match else None
+
+    # Returns the seed id encoded in the seed name, or None.
+    def seed_id(self, seed_name: str):
+        match = ID_PATTERN.search(seed_name)
+        return int(match.group(1)) if match else None
+
+
+ADAPTERS = {'aflplusplus': FuzzerAdapter(['default/queue'], ['default/crashes'],
+                                         time_pattern=r'time:(\d+)', time_unit=1 / 1000),
+            'afl': FuzzerAdapter(['queue'], ['crashes']),
+            'libfuzzer': FuzzerAdapter(['corpus'], ['crashes'], crash_prefixes=('oom', 'crash')),
+            'eclipser': FuzzerAdapter(['afl-worker/queue', 'eclipser_output/queue'],
+                                      ['afl-worker/crashes', 'eclipser_output/crashes']),
+            'fairfuzz': FuzzerAdapter(['queue'], ['crashes'])}
+
+
+def fuzzer_adapter(fuzzer: str) -> FuzzerAdapter:
+    if fuzzer not in ADAPTERS:
+        logging.error(f'fuzzer {fuzzer} is not supported, add its adapter to common/fuzzers.py')
+        exit(1)
+    return ADAPTERS[fuzzer]
@@ -0,0 +1,183 @@
+import contextlib
+import cProfile
+import glob
+import json
+import multiprocessing.util
+import os
+import pstats
+import socket
+import sys
+import threading
+import time
+
+from common import paths
+
+# Every PROFILE_SAMPLE_INTERVAL-th task of a pool worker runs under cProfile, which bounds the overhead on workers.
+PROFILE_SAMPLE_INTERVAL = 10
+# Functions listed in the text summaries of cProfile stats, by cumulative time.
+SUMMARY_LINES = 50
+
+# Set by `start` or `start_worker` in processes that profile.
+_profile_dir = None
+_process_name = None
+_trace_file = None
+_lock = threading.Lock()
+# Profiles of the threads of a process started with `start`, or the profile sampling the tasks of a pool worker.
+_profiles = []
+_tasks = 0
+# Maps worker names to the thread ids of their spans in the trace.
+_tids = {}
+# Time `start` was called at, in microseconds. Older events of reused trace fragments are left out of the trace.
+_start_us = None
+
+
+# Starts profiling this process, named `process_name`, writing to `profile_dir`. The main thread is profiled from
+# now on, and threads running functions wrapped with `profiled`.
+def start(profile_dir: str, process_name: str) -> None:
+    global _start_us
+    _start_us = time.time_ns() / 1000
+    open_trace(profile_dir, process_name)
+    profile = cProfile.Profile()
+    _profiles.append(profile)
+    profile.enable()
+
+
+# Starts profiling a pool worker named `process_name` if `profile_dir` is set, sampling its tasks.
+def start_worker(profile_dir: str, process_name: str) -> None:
+    global _lock, _profiles, _tasks
+    # State of the parent process was copied by fork and is not this worker's, and its lock may be held.
+    _lock = threading.Lock()
+    # Workers forked by a profiled thread inherit its profile function.
+    sys.setprofile(None)
+    _profiles = [cProfile.Profile()] if profile_dir is not None else []
+    _tasks = 0
+    if profile_dir is not None:
+        open_trace(profile_dir, process_name)
+        # Pool workers exit without running atexit handlers, but run the finalizers of multiprocessing.
+        multiprocessing.util.Finalize(None, write_stats, (_profiles, os.path.join(profile_dir, process_name)),
+                                      exitpriority=0)
+
+
+def open_trace(profile_dir: str, process_name: str) -> None:
+    global _profile_dir, _process_name, _trace_file
+    paths.mkdir(profile_dir)
+    _profile_dir = profile_dir
+    _process_name = process_name
+    _tids.clear()
+    # Each process appends its events to its own fragment, line buffered so that killed processes lose none.
+    _trace_file = open(os.path.join(profile_dir, f'trace-{socket.gethostname()}-{os.getpid()}.jsonl'), 'a',
+                       buffering=1)
+    trace_event({'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'tid': 0, 'args': {'name': process_name}})
+
+
+# Returns the directory profiles are written to, or None if this process does not profile.
+def profile_dir():
+    return _profile_dir
+
+
+# Returns `function` wrapped to profile the thread running it, if this process was started with `start`.
+def profiled(function):
+    if _profile_dir is None:
+        return function
+
+    def run(*args, **kwargs):
+        profile = cProfile.Profile()
+        with _lock:
+            _profiles.append(profile)
+        profile.enable()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.disable()
+    return run
+
+
+# Runs `function(*args)` as a task of a pool worker, under cProfile for every PROFILE_SAMPLE_INTERVAL-th task.
+# The stats are written once the worker exits.
+def sampled(function, *args):
+    global _tasks
+    _tasks += 1
+    if not _profiles or _tasks % PROFILE_SAMPLE_INTERVAL != 1:
+        return function(*args)
+    _profiles[0].enable()
+    try:
+        return function(*args)
+    finally:
+        _profiles[0].disable()
+
+
+# Records the time spent in the context as a span of the trace on the track of `worker`. Args of the span may be added
+# to the dict bound by the context.
+@contextlib.contextmanager
+def span(name: str, worker: str = 'main', **args):
+    if _trace_file is None:
+        yield args
+        return
+    start_us = time.time_ns() / 1000
+    try:
+        yield args
+    finally:
+        trace_event({'name': name, 'ph': 'X', 'ts': start_us, 'dur': time.time_ns() / 1000 - start_us,
+                     'pid': os.getpid(), 'tid': worker_tid(worker), 'args': args})
+
+
+def worker_tid(worker: str) -> int:
+    with _lock:
+        if worker in _tids:
+            return _tids[worker]
+        _tids[worker] = len(_tids)
+    trace_event({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': _tids[worker],
+                 'args': {'name': worker}})
+    return _tids[worker]
+
+
+def trace_event(event: dict) -> None:
+    line = json.dumps(event) + '\n'
+    with _lock:
+        _trace_file.write(line)
+
+
+# Stops profiling this process and writes its cProfile stats. With `merge_trace`, the trace fragments of all
+# processes are merged into trace.json.
+def finish(merge_trace: bool) -> None:
+    for profile in _profiles:
+        profile.disable()
+    write_stats(_profiles, os.path.join(_profile_dir, _process_name))
+    _trace_file.flush()
+    if merge_trace:
+        write_trace()
+
+
+# Writes the combined stats of `profiles` to `path`.prof, and a summary of them to `path`.txt.
+def write_stats(profiles: list, path: str) -> None:
+    # Profiles of threads that did not run yet have no stats.
+    profiles = [profile for profile in profiles if profile.getstats()]
+    if not profiles:
+        return
+    with open(path + '.txt', 'w') as f:
+        stats = pstats.Stats(*profiles, stream=f)
+        stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+    stats.dump_stats(path + '.prof')
+
+
+# Merges the events of this run from the trace fragments in the profile dir into trace.json, which opens in Perfetto
+# or chrome://tracing.
+def write_trace() -> None:
+    events = []
+    metadata = {}
+    for fragment in glob.glob(os.path.join(_profile_dir, 'trace-*.jsonl')):
+        with open(fragment, 'r') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line of a killed process may be incomplete.
+                    continue
+                if event['ph'] == 'M':
+                    metadata[(event['name'], event['pid'], event['tid'])] = event
+                elif event['ts'] >= _start_us:
+                    events.append(event)
+    pids = {event['pid'] for event in events} | {os.getpid()}
+    events.extend(event for event in metadata.values() if event['pid'] in pids)
+    with open(os.path.join(_profile_dir, 'trace.json'), 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,130 @@
+import collections
+import gzip
+import hashlib
+import json
+import os
+import tarfile
+
+from common.confighelper import ConfigHelper
+
+# A seed file of a trial corpus.
+# `offset` is the position of the file data in the uncompressed archive stream, and is None for extracted corpora.
+# `digest` is the SHA-1 of the file content, identifying seeds with the same bytes across trials and fuzzers.
+SeedEntry = collections.namedtuple('SeedEntry', ['name', 'offset', 'size', 'mtime', 'digest'])
+
+# Keys added to seed dicts whose content lives in a corpus archive rather than on disk.
+ARCHIVE_KEYS = ['archive', 'offset', 'size']
+
+
+class DirSeedSource:
+    """Seeds of a trial corpus extracted to disk by `setup`."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, rel_dir: str, name: str = '') -> str:
+        return os.path.join(self.root, rel_dir, name)
+
+    def has_dir(self, rel_dir: str) -> bool:
+        return os.path.isdir(self.path(rel_dir))
+
+    def list_dir(self, rel_dir: str) -> list:
+        entries = []
+        with os.scandir(self.path(rel_dir)) as it:
+            for entry in it:
+                if entry.is_file():
+                    stat = entry.stat()
+                    with open(entry.path, 'rb') as f:
+                        digest = hashlib.sha1(f.read()).hexdigest()
+                    entries.append(SeedEntry(entry.name, None, stat.st_size, stat.st_mtime, digest))
+        return entries
+
+    def seed_location(self, rel_dir: str, entry: SeedEntry) -> dict:
+        return {'path': self.path(rel_dir, entry.name)}
+
+
+class TarSeedSource:
+    """Seeds of a trial corpus read on demand from the member index of its latest corpus archive.
+
+    Seed paths are reported as if the corpus was extracted to `root`, so triage results do not
+    depend on whether the corpus was extracted.
+    """
+
+    def __init__(self, root: str, archive: str, dirs: dict):
+        self.root = root
+        self.archive = archive
+        # Maps directories relative to `corpus/` to lists of SeedEntry.
+        self.dirs = dirs
+
+    @classmethod
+    def build(cls, root: str, archive: str) -> 'TarSeedSource':
+        # Maps member paths to (dir, SeedEntry). Like extraction, a later member with the same path replaces the
+        # earlier one.
+        members = {}
+        # Streams through the archive once without extracting any member.
+        with tarfile.open(archive, 'r|gz') as tar:
+            for member in tar:
+                if member.isfile() and member.path.startswith('corpus/'):
+                    # len("corpus/") is 7
+                    rel_dir, name = os.path.split(member.path[7:])
+                    digest = hashlib.sha1(tar.extractfile(member).read()).hexdigest()
+                    members.pop(member.path, None)
+                    # Extracted files have float mtimes.
+                    members[member.path] = (rel_dir, SeedEntry(name, member.offset_data, member.size,
+                                                               float(member.mtime), digest))
+        dirs = {}
+        for rel_dir, entry in members.values():
+            dirs.setdefault(rel_dir, []).append(entry)
+        return cls(root, archive, dirs)
+
+    @classmethod
+    def load(cls, root: str, index_file: str) -> 'TarSeedSource':
+        with open(index_file, 'r') as f:
+            index = json.load(f)
+        return cls(root, index['archive'], {d: [SeedEntry(*e) for e in entries] for d, entries in index['dirs'].items()})
+
+    def save(self, index_file: str) -> None:
+        with open(index_file, 'w') as f:
+            json.dump({'archive': self.archive, 'dirs': self.dirs}, f)
+
+    def path(self, rel_dir: str, name: str = '') -> str:
+        return os.path.join(self.root, rel_dir, name)
+
+    def has_dir(self, rel_dir: str) -> bool:
+        return rel_dir in self.dirs
+
+    def list_dir(self, rel_dir: str) -> list:
+        return self.dirs[rel_dir]
+
+    def seed_location(self, rel_dir: str, entry: SeedEntry) -> dict:
+        return {'path': self.path(rel_dir, entry.name), 'archive': self.archive,
+                'offset': entry.offset, 'size': entry.size}
+
+
+# Returns the seed source of a trial, preferring the archive index built by a setup without extraction.
+def trial_seed_source(benchmark: str, fuzzer: str, trial: str, helper: ConfigHelper):
+    root = helper.trial_data_dir(benchmark, fuzzer, trial)
+    index_file = helper.seed_index_file(benchmark, fuzzer, trial)
+    if os.path.exists(index_file):
+        return TarSeedSource.load(root, index_file)
+    return DirSeedSource(root)
+
+
+class ArchiveReader:
+    """Reads member data of a gzipped tar archive by offset.
+
+    Reads at increasing offsets continue decompressing from the current position,
+    so a worker reading the seeds of a trial in order decompresses the archive at most once.
+    """
+
+    def __init__(self, archive: str):
+        self.archive = archive
+        self.__stream = gzip.open(archive, 'rb')
+
+    def read(self, offset: int, size: int) -> bytes:
+        # GzipFile rewinds and decompresses from the start for backward seeks.
+        self.__stream.seek(offset)
+        return self.__stream.read(size)
+
+    def close(self) -> None:
+        self.__stream.close()
@@ -3,28 +3,30 @@ import os
 import pathlib
 import shutil
 
+from common.fuzzers import fuzzer_adapter
+
 SCRIPT_DIR = os.path.dirname(os.path.dirname(__file__))
+# Engines running triage binaries, see executionEngine in config.ini.
+EXECUTION_ENGINES = ['async', 'pool', 'distributed']
+# Profiles of sanitizer options for triage runs, see triage/common/sanitizer.py.
+SANITIZER_PROFILES = ['lean', 'full']
+# Modes of the crash search, see triage/crash_search.py.
+SEARCH_MODES = ['adaptive', 'exhaustive', 'verify']
+
 
-CORPUS_QUEUE_STORE = {'aflplusplus': ['corpus/default/queue'],
-                      'afl': ['corpus/queue'],
-                      'libfuzzer': ['corpus/corpus'],
-                      'eclipser': ['corpus/afl-worker/queue', 'corpus/eclipser_output/queue'],
-                      'fairfuzz': ['corpus/queue']}
-CORPUS_CRASH_STORE = {'aflplusplus': ['corpus/default/crashes'],
-                      'afl': ['corpus/crashes'],
-                      'libfuzzer': ['corpus/crashes'],
-                      'eclipser': ['corpus/afl-worker/crashes', 'corpus/eclipser_output/crashes'],
-                      'fairfuzz': ['corpus/crashes']}
+# Returns the number of CPUs this process may run on.
+def available_cpus() -> int:
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count()
 
 
 def fuzzer_queue_store(fuzzer: str) -> list:
-    return CORPUS_QUEUE_STORE[fuzzer]
+    return [os.path.join('corpus', d) for d in fuzzer_adapter(fuzzer).queue_dirs]
 
 
 def fuzzer_crash_store(fuzzer: str) -> list:
-    return CORPUS_CRASH_STORE[fuzzer]
-
-
+    return [os.path.join('corpus', d) for d in fuzzer_adapter(fuzzer).crash_dirs]
 
 
 # Returns the coverage binary name of a benchmark.
@@ -1,17 +1,20 @@
 import argparse
 import logging
 import os
+import socket
 import sys
 
 from analysis.coverage_table import coverage_table
+from analysis.crash_search_table import crash_search_table
 from analysis.growth_plot import growth_plot
 from analysis.venn_diagram import venn_diagram
-from triage.triage_seeds import triage_seeds
+from triage.triage_seeds import triage_seeds, triage_worker
 
 # Add the triage folder to PATH.
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 import common.confighelper
+import common.profiling
 import common.utils
 from setup import setup
 
@@ -28,6 +31,25 @@ def parse_args():
                         help='Run triage binary on the fuzzing results and triage individual and/or combined causes.',
                         required=False,
                         action='store_true')
+    parser.add_argument('--resume',
+                        help='With --triage, keep the results of an interrupted triage and only triage the rest.',
+                        required=False,
+                        action='store_true')
+    parser.add_argument('--incremental',
+                        help='With --triage, only triage seeds that are new or changed since the last triage and '
+                             'merge them into the existing results.',
+                        required=False,
+                        action='store_true')
+    parser.add_argument('--worker',
+                        help='Run a worker-only process for the distributed triage coordinator at coordinatorAddress '
+                             'in config.',
+                        required=False,
+                        action='store_true')
+    parser.add_argument('--profile',
+                        help='Record cProfile stats of this process and of sampled pool worker tasks, and a Chrome '
+                             'trace of stages and seed executions, to the profile directory in out directory.',
+                        required=False,
+                        action='store_true')
     parser.add_argument('-r',
                         '--report',
                         help='Generate performance plots/tables/figures on out directory.',
@@ -54,15 +76,30 @@ def main():
 
     helper = common.confighelper.ConfigHelper(args.config)
 
+    if args.profile:
+        common.profiling.start(helper.profile_dir(),
+                               f'worker-{socket.gethostname()}-{os.getpid()}' if args.worker else 'driver')
+
     if args.setup:
-        setup.setup(helper)
+        with common.profiling.span('setup'):
+            setup.setup(helper)
+    if args.worker:
+        triage_worker(helper)
     if args.triage:
-        triage_seeds(helper, 'queue')
-        triage_seeds(helper, 'crash')
+        with common.profiling.span('triage queue seeds'):
+            triage_seeds(helper, 'queue', args.resume, args.incremental)
+        with common.profiling.span('triage crash seeds'):
+            triage_seeds(helper, 'crash', args.resume, args.incremental)
     if args.report:
-        coverage_table(helper)
-        growth_plot(helper)
-        venn_diagram(helper)
+        with common.profiling.span('report'):
+            coverage_table(helper)
+            crash_search_table(helper)
+            growth_plot(helper)
+            venn_diagram(helper)
+
+    if args.profile:
+        # Traces of workers are merged by the process they ran tasks for.
+        common.profiling.finish(merge_trace=not args.worker)
 
 
 if __name__ == '__main__':
@@ -1,35 +1,120 @@
+import itertools
 import logging
+import multiprocessing
 import os
-import re
 import tarfile
 
-import common.utils
+import tqdm
+
 import common.paths
+import include.istarmap
 import setup.utils
 from common.confighelper import ConfigHelper
+from common.seed_source import TarSeedSource
+from setup.manifest import SetupManifest, archive_record, trial_key
+
+
+# Extracts (or indexes, if extraction is turned off in the config) the corpus archives of all trials
+# of the given (benchmark, fuzzer, experiment) tuples in parallel.
+# Each trial archive is a separate task so that decompression of large experiments spreads over all cores.
+# Trials whose latest archive is unchanged since the last setup according to `manifest` are skipped.
+def extract_fuzzing_results(exp_tuples: list, helper: ConfigHelper, manifest: SetupManifest) -> None:
+    tasks = []
+    failed = 0
+    for benchmark, fuzzer, exp_name in exp_tuples:
+        # Stores extracted fuzzing results or archive indexes for each trial.
+        # Results of the other mode are stale and would shadow the ones produced here.
+        if helper.extract():
+            common.paths.rm_if_exist(helper.bf_seed_index_dir(benchmark, fuzzer))
+            common.paths.mkdir(helper.bf_data_dir(benchmark, fuzzer))
+        else:
+            common.paths.rm_if_exist(helper.bf_data_dir(benchmark, fuzzer))
+            common.paths.mkdir(helper.bf_seed_index_dir(benchmark, fuzzer))
+        trial_names = helper.catalog().trials(benchmark, fuzzer)
+        remove_stale_trials(benchmark, fuzzer, trial_names, helper, manifest)
+        for trial_name in trial_names:
+            archive = helper.catalog().latest_archive(benchmark, fuzzer, trial_name)
+            if archive is None:
+                corpus_dir = os.path.join(setup.utils.fuzzbench_data_dir(helper.raw_data_dir(), exp_name,
+                                                                         benchmark, fuzzer), trial_name, 'corpus')
+                logging.error(f'{benchmark}-{fuzzer}-{trial_name}: corpus archive file not found in {corpus_dir}')
+                failed += 1
+                continue
+            record = archive_record(archive, helper.extract())
+            key = trial_key(benchmark, fuzzer, trial_name)
+            if manifest.corpus.get(key) == record and trial_result_exists(benchmark, fuzzer, trial_name, helper):
+                continue
+            # Forget the trial until it is extracted again, in case this setup is interrupted.
+            manifest.corpus.pop(key, None)
+            tasks.append((benchmark, fuzzer, trial_name, archive['path']))
+    manifest.save()
+    logging.info(f'{"extracting" if helper.extract() else "indexing"} {len(tasks)} new or changed corpus archives '
+                 f'with {helper.cores()} parallel jobs')
+    multiprocessing.pool.Pool.istarmap = include.istarmap.istarmap
+    with multiprocessing.Pool(processes=helper.cores()) as p:
+        errors = tqdm.tqdm(p.istarmap(extract_worker, zip(tasks, itertools.repeat(helper))), total=len(tasks))
+        for (benchmark, fuzzer, trial_name, _), error in zip(tasks, errors):
+            if error:
+                logging.error(f'{benchmark}-{fuzzer}-{trial_name}: {error}')
+                failed += 1
+            else:
+                archive = helper.catalog().latest_archive(benchmark, fuzzer, trial_name)
+                manifest.corpus[trial_key(benchmark, fuzzer, trial_name)] = archive_record(archive, helper.extract())
+    manifest.save()
+    if failed:
+        logging.error(f'{failed} corpus archives failed to {"extract" if helper.extract() else "index"}')
+        exit(1)
+
+
+# Returns an error message instead of raising so that one broken archive does not abort the whole pool.
+def extract_worker(task: tuple, helper: ConfigHelper) -> str:
+    try:
+        if helper.extract():
+            extract_fuzzing_result(*task, helper)
+        else:
+            index_fuzzing_result(*task, helper)
+    except Exception as e:
+        return str(e)
+    return None
+
+
+# Removes results of trials that no longer exist in the experiment.
+def remove_stale_trials(benchmark: str, fuzzer: str, trial_names: list, helper: ConfigHelper,
+                        manifest: SetupManifest) -> None:
+    prefix = trial_key(benchmark, fuzzer, '')
+    for key in [k for k in manifest.corpus if k.startswith(prefix)]:
+        trial_name = key[len(prefix):]
+        if trial_name not in trial_names:
+            common.paths.rm_if_exist(helper.trial_data_dir(benchmark, fuzzer, trial_name))
+            if os.path.exists(helper.seed_index_file(benchmark, fuzzer, trial_name)):
+                os.remove(helper.seed_index_file(benchmark, fuzzer, trial_name))
+            manifest.corpus.pop(key)
+
+
+def trial_result_exists(benchmark: str, fuzzer: str, trial_name: str, helper: ConfigHelper) -> bool:
+    if helper.extract():
+        return os.path.exists(helper.trial_data_dir(benchmark, fuzzer, trial_name))
+    return os.path.exists(helper.seed_index_file(benchmark, fuzzer, trial_name))
+
+
+def extract_fuzzing_result(benchmark: str, fuzzer: str, trial_name: str, archive: str, helper: ConfigHelper) -> None:
+    # Stores fuzzing results of a trial in data_dir.
+    trial_data_dir = helper.trial_data_dir(benchmark, fuzzer, trial_name)
+    common.paths.rm_before_mkdir(trial_data_dir)
+    try:
+        with tarfile.open(archive) as tar:
+            tar.extractall(path=trial_data_dir, members=corpus_members(tar))
+    except (OSError, EOFError, tarfile.TarError) as e:
+        raise RuntimeError(f'cannot extract corpus archive {archive}: {e}') from e
 
 
-def extract_fuzzing_result(benchmark: str, fuzzer: str, exp_name: str, helper: ConfigHelper) -> None:
-    # Stores extracted fuzzing results for each trial.
-    bf_data_dir = helper.bf_data_dir(benchmark, fuzzer)
-    common.paths.rm_before_mkdir(bf_data_dir)
-    fuzzbench_data_dir = setup.utils.fuzzbench_data_dir(helper.raw_data_dir(), exp_name, benchmark, fuzzer)
-    max_snap_id = 0
-    last_gz_file = None
-    for trial_name in os.listdir(fuzzbench_data_dir):
-        fuzzbench_corpus_dir = os.path.join(fuzzbench_data_dir, trial_name, 'corpus')
-        for file_name in os.listdir(fuzzbench_corpus_dir):
-            match = re.search(r'corpus-archive-(\d+).tar.gz', file_name)
-            assert match, f'corpus archive file not found in {fuzzbench_corpus_dir}'
-            snap_id = int(match.group(1))
-            if snap_id > max_snap_id:
-                max_snap_id = snap_id
-                last_gz_file = file_name
-        logging.info(f'{fuzzbench_corpus_dir}: Latest snapshot number is {max_snap_id}')
-
-        # Stores fuzzing results of a trial in data_dir.
-        with tarfile.open(os.path.join(fuzzbench_corpus_dir, last_gz_file)) as tar:
-            tar.extractall(path=helper.trial_data_dir(benchmark, fuzzer, trial_name), members=corpus_members(tar))
+# Stores the member index of the latest corpus archive of a trial so that seeds can be read without extraction.
+def index_fuzzing_result(benchmark: str, fuzzer: str, trial_name: str, archive: str, helper: ConfigHelper) -> None:
+    try:
+        source = TarSeedSource.build(helper.trial_data_dir(benchmark, fuzzer, trial_name), archive)
+    except (OSError, EOFError, tarfile.TarError) as e:
+        raise RuntimeError(f'cannot index corpus archive {archive}: {e}') from e
+    source.save(helper.seed_index_file(benchmark, fuzzer, trial_name))
 
 
 # Only extracts files in `corpus/` and removes `corpus/` from path.
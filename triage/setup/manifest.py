@@ -0,0 +1,41 @@
+import json
+import os
+
+
+class SetupManifest:
+    """Records what previous setups produced in workDir so that unchanged work can be skipped.
+
+    `corpus` maps `benchmark/fuzzer/trial` to the corpus archive extracted (or indexed) for the trial,
+    `triage_bin` maps benchmarks to the ID of the builder image their triage binary was copied from.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.corpus = {}
+        self.triage_bin = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                data = json.load(f)
+            self.corpus = data.get('corpus', {})
+            self.triage_bin = data.get('triage_bin', {})
+
+    def save(self) -> None:
+        # Writes to a temporary file first so that an interrupted setup never leaves a truncated manifest.
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'corpus': self.corpus, 'triage_bin': self.triage_bin}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def trial_key(benchmark: str, fuzzer: str, trial_name: str) -> str:
+    return f'{benchmark}/{fuzzer}/{trial_name}'
+
+
+# Describes a corpus archive listed by the experiment catalog and how it was unpacked.
+# An archive is considered unchanged as long as its path, size, mtime and snapshot id stay the same.
+def archive_record(archive: dict, extract: bool) -> dict:
+    return {'archive': archive['path'],
+            'size': archive['size'],
+            'mtime': archive['mtime'],
+            'snapshot': archive['snapshot'],
+            'extract': extract}
@@ -1,25 +1,15 @@
 import logging
-import os
 
-import common.paths
-import setup.utils
-from common.confighelper import ConfigHelper
+from common.catalog import ExperimentCatalog
 
 
 # Returns a list of benchmrak-experiment pair.
 # Throws error when a benchmark is not mapped to exactly one experiment.
 # Throws error when a benchmark-fuzzer pair is not mapped to exactly one experiment.
 
-def exp_tuples(benchmarks: list, fuzzers: list, exps: list, raw_data_dir: str) -> list:
+def exp_tuples(benchmarks: list, fuzzers: list, catalog: ExperimentCatalog) -> list:
     # Stores experiment names for benchmark-fuzzer pairs.
-    exp_map = {(b, f): [] for b in benchmarks for f in fuzzers}
-    for e in exps:
-        for b in benchmarks:
-            for f in fuzzers:
-                # Checks if the benchmark-fuzzer pair `(b, f)` exists in the experiment `e`.
-                data_dir = setup.utils.fuzzbench_data_dir(raw_data_dir, e, b, f)
-                if os.path.exists(data_dir):
-                    exp_map[(b, f)].append(e)
+    exp_map = {(b, f): catalog.exps_of(b, f) for b in benchmarks for f in fuzzers}
     ret = []
     # Make sure each benchmark-fuzzer pair only appears in one experiment.
     for b in benchmarks:
@@ -1,13 +1,12 @@
 from common.confighelper import ConfigHelper
 from setup import precheck
-from setup.extract import extract_fuzzing_result
-from setup.triage_bin import build_triage_bin
+from setup.extract import extract_fuzzing_results
+from setup.manifest import SetupManifest
+from setup.triage_bin import build_triage_bins
 
 
 def setup(helper: ConfigHelper) -> None:
-    exp_tuples = precheck.exp_tuples(helper.benchmarks(), helper.fuzzers(), helper.exps(), helper.raw_data_dir())
-    for benchmark, fuzzer, exp_name in exp_tuples:
-        extract_fuzzing_result(benchmark, fuzzer, exp_name, helper)
-    for benchmark in helper.benchmarks():
-        build_triage_bin(benchmark, helper)
-        
\ No newline at end of file
+    exp_tuples = precheck.exp_tuples(helper.benchmarks(), helper.fuzzers(), helper.catalog())
+    manifest = SetupManifest(helper.setup_manifest())
+    extract_fuzzing_results(exp_tuples, helper, manifest)
+    build_triage_bins(helper, manifest)
@@ -1,13 +1,45 @@
+import concurrent.futures
 import getpass
+import logging
 import os
 
 import docker
 
 import common.paths
 from common.confighelper import ConfigHelper
+from setup.manifest import SetupManifest
 
 
-def build_triage_bin(benchmark: str, helper: ConfigHelper):
+# Copies the triage binaries of all configured benchmarks concurrently with one docker client.
+# The client can be passed in, e.g. a mock for testing.
+def build_triage_bins(helper: ConfigHelper, manifest: SetupManifest, client=None) -> None:
+    if client is None:
+        client = docker.from_env()
+    failed = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=helper.cores()) as executor:
+        futures = {executor.submit(build_triage_bin, benchmark, helper, manifest, client): benchmark
+                   for benchmark in helper.benchmarks()}
+        for future in concurrent.futures.as_completed(futures):
+            benchmark = futures[future]
+            try:
+                manifest.triage_bin[benchmark] = future.result()
+            except Exception as e:
+                logging.error(f'cannot set up triage binary of benchmark {benchmark}: {e}')
+                failed += 1
+    manifest.save()
+    if failed:
+        exit(1)
+
+
+# Copies the triage binary out of the builder image of `benchmark` and returns its cache key.
+# Skipped when the binary was already copied from an image with the same ID for the same fuzz target.
+def build_triage_bin(benchmark: str, helper: ConfigHelper, manifest: SetupManifest, client) -> dict:
+    image = f'gcr.io/fuzzbench/builders/fr_triage_driver/{benchmark}'
+    cache_key = {'image_id': client.images.get(image).id, 'fuzz_target': helper.fuzz_target(benchmark)}
+    if manifest.triage_bin.get(benchmark) == cache_key and os.path.exists(helper.benchmark_triage_binary(benchmark)):
+        logging.info(f'triage binary of benchmark {benchmark} is up to date with image {cache_key["image_id"]}')
+        return cache_key
+
     benchmark_triage_dir = helper.benchmark_triage_bin_dir(benchmark)
     common.paths.mkdir(benchmark_triage_dir)
     host_user = getpass.getuser()
@@ -23,12 +55,13 @@ def build_triage_bin(benchmark: str, helper: ConfigHelper):
     chown  {uid} /triage_bin_dir/{helper.fuzz_target(benchmark)}
     chgrp {gid} /triage_bin_dir/{helper.fuzz_target(benchmark)}"
     '''
-    client = docker.from_env()
-    client.containers.run(f'gcr.io/fuzzbench/builders/fr_triage_driver/{benchmark}',
+    client.containers.run(image,
                             remove=True,
                             entrypoint='/bin/bash -c',
                             working_dir='/src',
                             command=command,
                             volumes={benchmark_triage_dir: {'bind': '/triage_bin_dir', 'mode': 'rw'}})
-    common.paths.error_if_not_exist(helper.benchmark_triage_binary(benchmark),
-                                    f'triage binary of benchmark {benchmark} is not successfully extracted')
+    if not os.path.exists(helper.benchmark_triage_binary(benchmark)):
+        raise RuntimeError(f'triage binary is not successfully extracted: {helper.benchmark_triage_binary(benchmark)}')
+    logging.info(f'extracted triage binary of benchmark {benchmark} from image {cache_key["image_id"]}')
+    return cache_key
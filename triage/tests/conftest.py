@@ -0,0 +1,14 @@
+import types
+
+import pytest
+
+
+# Returns a stand-in of ConfigHelper whose options return `options`. Callable options answer options with arguments.
+def make_helper(**options):
+    return types.SimpleNamespace(**{name: value if callable(value) else (lambda value=value: value)
+                                    for name, value in options.items()})
+
+
+@pytest.fixture
+def fake_helper():
+    return make_helper
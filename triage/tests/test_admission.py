@@ -0,0 +1,19 @@
+import asyncio
+
+from triage.common import admission
+from triage.common.admission import AdmissionControl
+
+
+async def admit_two(control: AdmissionControl) -> None:
+    async with control.admit('bench'):
+        async with control.admit('bench'):
+            pass
+
+
+def test_admits_when_available_memory_cannot_be_read(fake_helper, monkeypatch):
+    monkeypatch.setattr(admission, 'available_memory_mb', lambda: 1 << 20)
+    monkeypatch.setattr(admission.os, 'getloadavg', lambda: (0, 0, 0))
+    control = AdmissionControl(fake_helper(admission_control=True, memory_reserve_mb=0))
+    # /proc/meminfo became unreadable after triage started.
+    monkeypatch.setattr(admission, 'available_memory_mb', lambda: None)
+    asyncio.run(asyncio.wait_for(admit_two(control), 10))
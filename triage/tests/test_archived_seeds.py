@@ -0,0 +1,33 @@
+import io
+import tarfile
+
+from triage.triage_seeds import SeedTask, write_archived_seeds
+
+SEEDS = {'crashes/a': b'first', 'crashes/b': b'second seed', 'crashes/c': b'third'}
+
+
+# Writes a corpus archive holding SEEDS and returns its path and the (offset, size) of each seed.
+def corpus_archive(tmp_path) -> tuple:
+    path = str(tmp_path / 'corpus.tar.gz')
+    with tarfile.open(path, 'w:gz') as tar:
+        for name, data in SEEDS.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    with tarfile.open(path, 'r:gz') as tar:
+        return path, {member.name: (member.offset_data, member.size) for member in tar}
+
+
+def test_writes_archived_seeds_to_files(fake_helper, tmp_path):
+    archive, locations = corpus_archive(tmp_path)
+    trials = [('bench', 'fuzzer', 'trial-0', archive), ('bench', 'fuzzer', 'trial-1', None)]
+    # Listed out of the order of their members, along with a seed extracted to disk.
+    tasks = [SeedTask(i, 0, name, *locations[name], None, str(i)) for i, name in enumerate(reversed(SEEDS))]
+    tasks.append(SeedTask(3, 1, 'crashes/d', None, None, None, '3'))
+    helper = fake_helper(tmp_running_dir=lambda name: str(tmp_path / 'tmp' / name))
+    written = write_archived_seeds(tasks, trials, helper)
+    assert [task.content_id for task in written] == [0, 1, 2, 3]
+    for task in written[:3]:
+        with open(task.path, 'rb') as f:
+            assert f.read() == SEEDS[task.rel_path]
+    assert written[3].path is None
@@ -0,0 +1,48 @@
+import asyncio
+import os
+import sys
+
+from triage.common import async_executor
+from triage.common.async_executor import AsyncExecutor
+
+
+class NullParser:
+    def feed(self, chunk: bytes) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+# Runs a child writing its pid to `pid_file` and sleeping for a minute.
+async def run_child(slot: str, pid_file: str, cwd: str):
+    args = [sys.executable, '-c', f'import os, time; open({pid_file!r}, "w").write(str(os.getpid())); time.sleep(60)']
+    return await async_executor.execute(args, dict(os.environ), cwd, 60, NullParser())
+
+
+def read_pid(executor: AsyncExecutor, pid_file: str) -> int:
+    while not os.path.exists(pid_file) or not os.path.getsize(pid_file):
+        executor.run(asyncio.sleep(0.05))
+    with open(pid_file) as f:
+        return int(f.read())
+
+
+def test_close_kills_running_children_and_closes_every_slot(tmp_path):
+    closed = []
+
+    async def close_slot(slot: str) -> None:
+        closed.append(slot)
+
+    executor = AsyncExecutor(['slot-0', 'slot-1', 'slot-2'], close_slot)
+    errors = []
+    pid_files = [str(tmp_path / f'pid-{i}') for i in range(2)]
+    for pid_file in pid_files:
+        executor.apply_async(run_child, (pid_file, str(tmp_path)), error_callback=errors.append)
+    pids = [read_pid(executor, pid_file) for pid_file in pid_files]
+    # Closed while tasks still run, e.g. after another task failed.
+    executor.close()
+    assert sorted(closed) == ['slot-0', 'slot-1', 'slot-2']
+    assert not errors
+    for pid in pids:
+        # The children were killed and reaped.
+        assert not os.path.exists(f'/proc/{pid}')
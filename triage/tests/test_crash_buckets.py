@@ -0,0 +1,76 @@
+import pytest
+
+from triage.crash_buckets import CrashBuckets
+from triage.triage_seeds import SeedTask
+
+TRIALS = [('bench-a', 'fuzzer', 'trial-0', None), ('bench-b', 'fuzzer', 'trial-0', None)]
+
+
+@pytest.fixture
+def bucket_helper(fake_helper):
+    def make(bucket_crashes: bool = True, representatives: int = 1, verify_ratio: float = 0):
+        return fake_helper(bucket_crashes=bucket_crashes, bucket_representatives=representatives,
+                           bucket_verify_ratio=verify_ratio)
+    return make
+
+
+def task(content_id: int, trial_id: int = 0) -> SeedTask:
+    return SeedTask(content_id, trial_id, f'crashes/{content_id}', None, None, None, f'{content_id:040x}')
+
+
+# Returns (reaches, triggers, signature, hang) logs of a crash seed.
+def logs(triggers: list, signature='sig', hang: bool = False) -> tuple:
+    return triggers, triggers, signature, hang
+
+
+def searched_ids(buckets: CrashBuckets) -> list:
+    return sorted(searched.content_id for searched in buckets.searched_tasks())
+
+
+def test_searches_one_representative_per_bucket(bucket_helper):
+    tasks = [task(i) for i in range(4)] + [task(4, trial_id=1)]
+    seed_logs = {0: logs([1, 2]), 1: logs([1, 2]), 2: logs([1, 2], 'other'), 3: logs([1]), 4: logs([1, 2])}
+    buckets = CrashBuckets(tasks, seed_logs, TRIALS, bucket_helper())
+    # 0 and 1 share their bucket, while 2 has another signature, 3 other triggers and 4 another benchmark.
+    assert searched_ids(buckets) == [0, 2, 3, 4]
+
+
+def test_hangs_and_seeds_without_signature_are_searched_alone(bucket_helper):
+    tasks = [task(i) for i in range(4)]
+    seed_logs = {0: logs([1]), 1: logs([1], hang=True), 2: logs([1], None), 3: logs([1], None)}
+    buckets = CrashBuckets(tasks, seed_logs, TRIALS, bucket_helper())
+    assert searched_ids(buckets) == [0, 1, 2, 3]
+
+
+def test_bucketing_turned_off(bucket_helper):
+    tasks = [task(i) for i in range(3)]
+    buckets = CrashBuckets(tasks, {i: logs([1]) for i in range(3)}, TRIALS, bucket_helper(bucket_crashes=False))
+    assert searched_ids(buckets) == [0, 1, 2]
+
+
+def test_verify_ratio_searches_a_sample_of_the_others(bucket_helper):
+    tasks = [task(i) for i in range(10)]
+    buckets = CrashBuckets(tasks, {i: logs([1]) for i in range(10)}, TRIALS,
+                           bucket_helper(representatives=2, verify_ratio=0.25))
+    # 2 representatives and a quarter of the other 8 seeds, the first ones by content hash.
+    assert searched_ids(buckets) == [0, 1, 2, 3]
+
+
+def test_others_take_the_crash_sets_of_the_searched_seeds(bucket_helper):
+    tasks = [task(i) for i in range(4)]
+    buckets = CrashBuckets(tasks, {i: logs([1, 2]) for i in range(4)}, TRIALS, bucket_helper(representatives=2))
+    assert buckets.finish(0, ((1,),)) == ([], [])
+    propagated, unresolved = buckets.finish(1, ((1,),))
+    assert [(other.content_id, crashes) for other, crashes in propagated] == [(2, ((1,),)), (3, ((1,),))]
+    assert unresolved == []
+
+
+def test_others_are_searched_when_searched_seeds_disagree(bucket_helper):
+    tasks = [task(i) for i in range(4)]
+    buckets = CrashBuckets(tasks, {i: logs([1, 2]) for i in range(4)}, TRIALS, bucket_helper(representatives=2))
+    buckets.finish(0, ((1,),))
+    propagated, unresolved = buckets.finish(1, ((2,),))
+    assert propagated == []
+    assert [other.content_id for other in unresolved] == [2, 3]
+    # Seeds searched after the disagreement are not bucketed.
+    assert buckets.finish(2, ((1,),)) == ([], [])
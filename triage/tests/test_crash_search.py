@@ -0,0 +1,119 @@
+import itertools
+import random
+
+import pytest
+
+from triage.crash_search import CrashSearchMismatch, exhaustive_executions, find_crash_sets
+
+LEVEL = 3
+
+
+# Runs `find_crash_sets` with subsets crashing as told by `crashes`, and returns its crash sets and executions.
+def run_search(triggers: list, mode: str, crashes, level: int = LEVEL):
+    search = find_crash_sets(triggers, level, mode)
+    try:
+        subsets = next(search)
+        while True:
+            subsets = search.send([crashes(frozenset(subset)) for subset in subsets])
+    except StopIteration as e:
+        return e.value
+
+
+# Returns an oracle crashing when all injections of one of `crash_sets` are turned on.
+def monotone_oracle(crash_sets: list):
+    return lambda subset: any(subset >= set(crash_set) for crash_set in crash_sets)
+
+
+def random_case(rnd: random.Random) -> tuple:
+    triggers = rnd.sample(range(100), rnd.randint(1, 8))
+    crash_sets = [rnd.sample(triggers, rnd.randint(1, min(LEVEL, len(triggers)))) for _ in range(rnd.randint(0, 3))]
+    return sorted(triggers), crash_sets
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_modes_agree_on_monotone_crashes(seed):
+    triggers, crash_sets = random_case(random.Random(seed))
+    oracle = monotone_oracle(crash_sets)
+    exhaustive_sets, executions = run_search(triggers, 'exhaustive', oracle)
+    assert run_search(triggers, 'adaptive', oracle)[0] == exhaustive_sets
+    assert run_search(triggers, 'verify', oracle)[0] == exhaustive_sets
+    assert exhaustive_executions(len(triggers), exhaustive_sets, LEVEL) == executions
+
+
+def test_exhaustive_finds_min_crash_sets():
+    crash_sets, executions = run_search([1, 2, 3, 4], 'exhaustive', monotone_oracle([[2], [1, 3], [1, 2, 4]]))
+    assert crash_sets == ((2,), (1, 3))
+    # All 4 singles, the 3 pairs without 2, and {1, 3, 4} is skipped as a superset of (1, 3).
+    assert executions == 4 + 3
+
+
+def test_adaptive_runs_fewer_subsets_than_exhaustive():
+    triggers = list(range(12))
+    oracle = monotone_oracle([[5]])
+    adaptive_sets, adaptive = run_search(triggers, 'adaptive', oracle)
+    exhaustive_sets, exhaustive = run_search(triggers, 'exhaustive', oracle)
+    assert adaptive_sets == exhaustive_sets == ((5,),)
+    assert adaptive < exhaustive
+
+
+def test_crash_sets_above_level_are_dropped():
+    assert run_search([1, 2, 3, 4], 'adaptive', monotone_oracle([[1, 2, 3, 4]]))[0] == ()
+
+
+@pytest.mark.parametrize('crashes', [
+    # All triggers together do not crash, since 3 stops the crash of 1 and 2.
+    lambda subset: {1, 2} <= subset and 3 not in subset,
+    # 4 crashes alone, but not with 1 and 3.
+    lambda subset: subset in {frozenset(crash_set) for crash_set in [(4,), (1, 3), (2, 3), (2, 4), (1, 2, 3),
+                                                                      (1, 2, 4), (1, 2, 3, 4)]},
+    # Only an odd number of injections crashes.
+    lambda subset: len(subset) % 2 == 1,
+])
+def test_adaptive_falls_back_to_exhaustive_on_non_monotone_crashes(crashes):
+    triggers = [1, 2, 3, 4]
+    exhaustive_sets, _ = run_search(triggers, 'exhaustive', crashes)
+    assert run_search(triggers, 'adaptive', crashes)[0] == exhaustive_sets
+
+
+# Non-monotone seeds which the runs of the adaptive search do not contradict.
+@pytest.mark.parametrize('triggers, crashes, crash_sets', [
+    # Single injections crash, pairs do not, and all of them together crash again.
+    ([1, 2, 3], lambda subset: len(subset) != 2, ((1,), (2,), (3,))),
+    ([1, 2], lambda subset: len(subset) == 1, ((1,), (2,))),
+])
+def test_adaptive_searches_few_triggers_exhaustively(triggers, crashes, crash_sets):
+    assert run_search(triggers, 'exhaustive', crashes)[0] == crash_sets
+    assert run_search(triggers, 'adaptive', crashes)[0] == crash_sets
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_modes_agree_on_random_crashes_of_few_triggers(seed):
+    rnd = random.Random(seed)
+    triggers = sorted(rnd.sample(range(100), rnd.randint(1, LEVEL)))
+    crashing = {subset for n in range(1, len(triggers) + 1) for subset in itertools.combinations(triggers, n)
+                if rnd.random() < 0.5}
+
+    def crashes(subset):
+        return tuple(sorted(subset)) in crashing
+    assert run_search(triggers, 'adaptive', crashes)[0] == run_search(triggers, 'exhaustive', crashes)[0]
+
+
+def test_verify_raises_on_mismatch():
+    def crashes(subset):
+        return {1, 2} <= subset and 3 not in subset
+    with pytest.raises(CrashSearchMismatch) as e:
+        run_search([1, 2, 3], 'verify', crashes)
+    assert e.value.exhaustive_sets == ((1, 2),)
+
+
+@pytest.mark.parametrize('num_triggers, crash_sets', [
+    (5, []),
+    (5, [(1,)]),
+    (6, [(1,), (2, 3)]),
+    (7, [(1, 2), (2, 3), (4, 5, 6)]),
+])
+def test_exhaustive_executions_counts_subsets_run(num_triggers, crash_sets):
+    triggers = list(range(num_triggers))
+    run = [subset for n in range(1, LEVEL + 1) for subset in itertools.combinations(triggers, n)
+           if not any(set(subset) > set(crash_set) for crash_set in crash_sets)]
+    assert exhaustive_executions(num_triggers, crash_sets, LEVEL) == len(run)
@@ -0,0 +1,74 @@
+import collections
+
+import pytest
+
+from triage.common.exec_cache import Execution
+from triage.triage_seeds import SeedTask, crash_seed_search
+
+TRIALS = [('bench', 'fuzzer', 'trial-0', None)]
+TASK = SeedTask(0, 0, 'crashes/seed', None, None, None, '0' * 40)
+
+
+@pytest.fixture
+def helper(fake_helper):
+    return fake_helper(sanitizer_profile='lean', sanitizer_validation_ratio=0, comb_level=3, crash_search='adaptive')
+
+
+def execution(retcode: int, timed_out: bool = False) -> Execution:
+    return Execution(retcode, timed_out, [], [], 0.1, None)
+
+
+# Runs the crash set search of a seed triggering `triggers`, with `logs_hang` for its logging run and executions
+# returned by `run` for each FIXREVERTER value and sanitizer profile. Returns the result and the FIXREVERTER values run.
+def run_search(helper, triggers: list, run, logs_hang: bool = False):
+    search = crash_seed_search(TASK, (triggers, triggers, None, logs_hang), TRIALS, helper, collections.Counter())
+    ran = []
+    try:
+        runs = next(search)
+        while True:
+            ran.extend(fixreverter for fixreverter, _ in runs)
+            runs = search.send([run(fixreverter, profile) for fixreverter, profile in runs])
+    except StopIteration as e:
+        return e.value, ran
+
+
+# Runs of a seed crashing when injection 2 is turned on, timing out with any of `timed_out` turned on or with the
+# sanitizer options of `timed_out_profile`.
+def crashes_on_2(timed_out: set = frozenset(), timed_out_profile: str = None):
+    def run(fixreverter, profile):
+        turned_on = {int(i) for i in fixreverter.split()[1:]}
+        if turned_on & timed_out or profile == timed_out_profile:
+            return execution(-9, timed_out=True)
+        return execution(1 if 2 in turned_on else 0)
+    return run
+
+
+def test_finds_crash_sets(helper):
+    result, _ = run_search(helper, [1, 2, 3], crashes_on_2())
+    assert result[3] == ((2,),)
+    assert not result[5]
+
+
+def test_timed_out_logging_run_quarantines_the_seed(helper):
+    result, ran = run_search(helper, [1, 2, 3], crashes_on_2(), logs_hang=True)
+    assert ran == []
+    assert result[3] == ()
+    assert result[5]
+
+
+def test_timeout_with_no_injections_is_a_hang(helper):
+    result, ran = run_search(helper, [1, 2, 3], lambda fixreverter, profile: execution(-9, timed_out=True))
+    assert ran == ['on ']
+    assert result[3] == ()
+    assert result[5]
+
+
+def test_timed_out_runs_do_not_crash(helper):
+    result, _ = run_search(helper, [1, 2, 3], crashes_on_2(timed_out={3}))
+    assert result[3] == ((2,),)
+
+
+def test_crash_sets_timing_out_with_the_full_profile_are_dropped(helper):
+    result, ran = run_search(helper, [1, 2, 3], crashes_on_2(timed_out_profile='full'))
+    assert ran[-1] == 'on 2'
+    assert result[3] == ()
@@ -0,0 +1,21 @@
+import os
+
+from common.fuzzers import fuzzer_adapter
+from triage.get_seeds import get_trial_seeds
+
+
+def test_seeds_without_time_in_their_name_get_relative_mtimes(fake_helper, tmp_path):
+    queue_dir = tmp_path / 'corpus' / 'default' / 'queue'
+    queue_dir.mkdir(parents=True)
+    # Seeds of the initial corpus have no time in their name.
+    for name, mtime in [('id:000002,time:3000', 1), ('id:000000,orig:a', 1_700_000_010), ('id:000001,time:500', 1),
+                        ('id:000003,orig:b', 1_700_000_000)]:
+        (queue_dir / name).write_bytes(name.encode())
+        os.utime(queue_dir / name, (mtime, mtime))
+    helper = fake_helper(trial_data_dir=lambda *_: str(tmp_path / 'corpus'),
+                         seed_index_file=lambda *_: str(tmp_path / 'index.json'))
+    seeds = get_trial_seeds('bench', 'aflplusplus', 'trial-0', 'queue', fuzzer_adapter('aflplusplus'), helper)
+    assert [(os.path.basename(seed['path']), seed['time'], seed['id']) for seed in seeds] == [
+        ('id:000003,orig:b', 0, 3), ('id:000001,time:500', 0.5, 1), ('id:000002,time:3000', 3, 2),
+        ('id:000000,orig:a', 10, 0)]
+    assert not any('mtime' in seed for seed in seeds)
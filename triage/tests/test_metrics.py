@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from triage.common import metrics
+from triage.common.metrics import Metrics, MetricsExport
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = Metrics()
+    monkeypatch.setattr(metrics, 'REGISTRY', registry)
+    return registry
+
+
+@pytest.fixture
+def export_helper(fake_helper, tmp_path):
+    def make(execution_engine: str = 'async'):
+        return fake_helper(metrics_interval=0, cores=2, out_dir=str(tmp_path), execution_engine=execution_engine)
+    return make
+
+
+def write(helper) -> tuple:
+    MetricsExport(helper).write()
+    with open(f'{helper.out_dir()}/triage_metrics.json') as f:
+        exported = json.load(f)
+    with open(f'{helper.out_dir()}/triage_metrics.prom') as f:
+        return exported, f.read()
+
+
+# Returns the metric names of the samples of a Prometheus textfile, in order.
+def sample_names(text: str) -> list:
+    names = []
+    for line in text.splitlines():
+        if not line.startswith('#'):
+            names.append(line.split('{')[0].split(' ')[0].rsplit('_bucket', 1)[0])
+    return names
+
+
+def test_samples_of_each_metric_are_contiguous(registry, export_helper):
+    registry.start_stage('queue', 1, 10)
+    registry.start_stage('crash', 1, 5)
+    registry.update_stage('queue', done=2)
+    registry.update_stage('crash', done=1)
+    registry.count('triage_executions_total', benchmark='a', result='ok')
+    registry.observe('triage_execution_seconds', 0.2, benchmark='a')
+    _, text = write(export_helper())
+    names = sample_names(text)
+    runs = [name for i, name in enumerate(names) if i == 0 or names[i - 1] != name]
+    assert len(runs) == len(set(runs))
+    assert names.count('triage_stage_done') == 2
+
+
+def test_json_buckets_hold_the_overflow_bucket(registry, export_helper):
+    registry.observe('triage_ipc_seconds', 0.001)
+    registry.observe('triage_ipc_seconds', 5)
+    exported, _ = write(export_helper())
+    [histogram] = exported['histograms']
+    assert histogram['buckets'][-1] == ['+Inf', 1]
+    assert sum(count for _, count in histogram['buckets']) == histogram['count'] == 2
+
+
+def test_utilization_of_distributed_workers(registry, export_helper):
+    registry.add_slots(8)
+    exported, _ = write(export_helper('distributed'))
+    assert 'triage_worker_utilization' in [gauge['name'] for gauge in exported['gauges']]
+    registry.add_slots(-8)
+    # No workers are connected.
+    exported, text = write(export_helper('distributed'))
+    assert 'triage_worker_utilization' not in [gauge['name'] for gauge in exported['gauges']]
+    assert 'triage_worker_utilization' not in text
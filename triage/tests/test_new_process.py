@@ -0,0 +1,27 @@
+import sys
+
+from triage.common import new_process
+
+
+class ChunkParser:
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def feed(self, chunk: bytes) -> None:
+        self.chunks.append(chunk)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_stderr_is_fed_to_the_parser_while_stdout_is_discarded():
+    parser = ChunkParser()
+    # More than a pipe buffer is written to each stream.
+    script = 'import sys; sys.stdout.write("o" * 200000); sys.stderr.write("e" * 200000)'
+    result = new_process.execute([sys.executable, '-c', script], timeout=60, stderr_parser=parser)
+    assert result.retcode == 0
+    assert result.output is None
+    assert not result.timed_out
+    assert parser.closed
+    assert b''.join(parser.chunks) == b'e' * 200000
@@ -0,0 +1,65 @@
+import pytest
+
+from triage.common import timeouts
+from triage.common.exec_cache import ExecCache, Execution
+from triage.common.timeouts import ExecutionTimeouts
+
+
+@pytest.fixture
+def timeouts_helper(fake_helper):
+    def make(percentile: float = 99, factor: float = 3, floor: float = 1, ceiling: float = 15):
+        return fake_helper(timeout_percentile=percentile, timeout_factor=factor, timeout_floor=floor,
+                           timeout_ceiling=ceiling, benchmarks=['bench'])
+    return make
+
+
+def add_durations(execution_timeouts: ExecutionTimeouts, profile: str, durations: list) -> None:
+    for duration in durations:
+        execution_timeouts.add('bench', profile, duration)
+
+
+def test_ceiling_until_enough_durations(timeouts_helper):
+    execution_timeouts = ExecutionTimeouts(timeouts_helper(), {}, None)
+    assert execution_timeouts.timeout('bench', 'lean') == 15
+    add_durations(execution_timeouts, 'lean', [0.1] * (timeouts.UPDATE_INTERVAL - 1))
+    assert execution_timeouts.timeout('bench', 'lean') == 15
+
+
+@pytest.mark.parametrize('percentile, factor, expected', [
+    (50, 3, 0.75),
+    (90, 3, 1.35),
+    (100, 3, 1.5),
+    (100, 2, 1.0),
+])
+def test_percentile_times_factor(timeouts_helper, percentile, factor, expected):
+    execution_timeouts = ExecutionTimeouts(timeouts_helper(percentile=percentile, factor=factor, floor=0.1), {}, None)
+    # 0.01 to 0.5 seconds.
+    add_durations(execution_timeouts, 'lean', [i / 100 for i in range(1, timeouts.UPDATE_INTERVAL + 1)])
+    assert execution_timeouts.timeout('bench', 'lean') == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('duration, expected', [(0.01, 1), (1, 3), (10, 15)])
+def test_clamped_to_floor_and_ceiling(timeouts_helper, duration, expected):
+    execution_timeouts = ExecutionTimeouts(timeouts_helper(), {}, None)
+    add_durations(execution_timeouts, 'lean', [duration] * timeouts.UPDATE_INTERVAL)
+    assert execution_timeouts.timeout('bench', 'lean') == expected
+
+
+def test_profiles_have_their_own_timeouts(timeouts_helper):
+    execution_timeouts = ExecutionTimeouts(timeouts_helper(), {}, None)
+    add_durations(execution_timeouts, 'lean', [0.1] * timeouts.UPDATE_INTERVAL)
+    assert execution_timeouts.timeout('bench', 'lean') == 1
+    assert execution_timeouts.timeout('bench', 'full') == 15
+
+
+def test_starts_from_cached_durations_of_the_profile(timeouts_helper, tmp_path):
+    exec_cache_file = str(tmp_path / 'cache.sqlite')
+    exec_cache = ExecCache(exec_cache_file)
+    for i in range(timeouts.MIN_SAMPLES):
+        exec_cache.put('digest', f'seed{i}', 'off ', 'lean', Execution(0, False, [], [], 2, None))
+        exec_cache.put('digest', f'seed{i}', 'off ', 'full', Execution(0, False, [], [], 4, None))
+    # Executions that timed out are not cached.
+    exec_cache.put('digest', 'hang', 'off ', 'lean', Execution(-9, True, [], [], 15, None))
+    execution_timeouts = ExecutionTimeouts(timeouts_helper(), {'bench': 'digest'}, exec_cache_file)
+    assert execution_timeouts.timeout('bench', 'lean') == 6
+    assert execution_timeouts.timeout('bench', 'full') == 12
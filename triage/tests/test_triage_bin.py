@@ -0,0 +1,80 @@
+import json
+import os
+from unittest import mock
+
+import pytest
+
+from setup.manifest import SetupManifest
+from setup.triage_bin import build_triage_bins
+
+BENCHMARKS = ['bench-a', 'bench-b']
+FUZZ_TARGET = 'fuzz_target'
+
+
+@pytest.fixture
+def helper(fake_helper, tmp_path):
+    def triage_bin_dir(benchmark):
+        return str(tmp_path / 'triage_binaries' / benchmark)
+    return fake_helper(cores=2, benchmarks=BENCHMARKS, fuzz_target=lambda _: FUZZ_TARGET,
+                       benchmark_triage_bin_dir=triage_bin_dir,
+                       benchmark_triage_binary=lambda benchmark: os.path.join(triage_bin_dir(benchmark), FUZZ_TARGET))
+
+
+# Returns a docker client whose builder images have the ids of `image_ids` and copy their triage binary to the
+# mounted directory, except for images of `broken` benchmarks.
+def fake_client(image_ids: dict, broken: tuple = ()):
+    client = mock.MagicMock()
+    client.images.get.side_effect = lambda image: mock.Mock(id=image_ids[image.rsplit('/', 1)[1]])
+
+    def run(image, volumes, **kwargs):
+        [triage_bin_dir] = volumes
+        if image.rsplit('/', 1)[1] not in broken:
+            with open(os.path.join(triage_bin_dir, FUZZ_TARGET), 'w') as f:
+                f.write(image)
+    client.containers.run.side_effect = run
+    return client
+
+
+def copied_images(client) -> list:
+    return sorted(call.args[0] for call in client.containers.run.call_args_list)
+
+
+def test_copies_the_binary_of_each_benchmark(helper, tmp_path):
+    manifest = SetupManifest(str(tmp_path / 'manifest.json'))
+    client = fake_client({'bench-a': 'sha256:a', 'bench-b': 'sha256:b'})
+    build_triage_bins(helper, manifest, client)
+    assert copied_images(client) == [f'gcr.io/fuzzbench/builders/fr_triage_driver/{benchmark}'
+                                     for benchmark in BENCHMARKS]
+    for benchmark in BENCHMARKS:
+        assert os.path.exists(helper.benchmark_triage_binary(benchmark))
+    with open(manifest.path, 'r') as f:
+        assert json.load(f)['triage_bin'] == {'bench-a': {'image_id': 'sha256:a', 'fuzz_target': FUZZ_TARGET},
+                                              'bench-b': {'image_id': 'sha256:b', 'fuzz_target': FUZZ_TARGET}}
+
+
+def test_only_copies_binaries_of_changed_images(helper, tmp_path):
+    build_triage_bins(helper, SetupManifest(str(tmp_path / 'manifest.json')),
+                      fake_client({'bench-a': 'sha256:a', 'bench-b': 'sha256:b'}))
+    client = fake_client({'bench-a': 'sha256:a', 'bench-b': 'sha256:b2'})
+    build_triage_bins(helper, SetupManifest(str(tmp_path / 'manifest.json')), client)
+    assert copied_images(client) == ['gcr.io/fuzzbench/builders/fr_triage_driver/bench-b']
+    assert SetupManifest(str(tmp_path / 'manifest.json')).triage_bin['bench-b']['image_id'] == 'sha256:b2'
+
+
+def test_copies_missing_binaries_again(helper, tmp_path):
+    image_ids = {'bench-a': 'sha256:a', 'bench-b': 'sha256:b'}
+    build_triage_bins(helper, SetupManifest(str(tmp_path / 'manifest.json')), fake_client(image_ids))
+    os.remove(helper.benchmark_triage_binary('bench-a'))
+    client = fake_client(image_ids)
+    build_triage_bins(helper, SetupManifest(str(tmp_path / 'manifest.json')), client)
+    assert copied_images(client) == ['gcr.io/fuzzbench/builders/fr_triage_driver/bench-a']
+
+
+def test_exits_when_a_binary_is_not_copied(helper, tmp_path):
+    manifest = SetupManifest(str(tmp_path / 'manifest.json'))
+    with pytest.raises(SystemExit) as e:
+        build_triage_bins(helper, manifest, fake_client({'bench-a': 'sha256:a', 'bench-b': 'sha256:b'},
+                                                        broken=('bench-b',)))
+    assert e.value.code == 1
+    # Binaries of the other benchmarks are kept for the next setup.
+    assert list(SetupManifest(manifest.path).triage_bin) == ['bench-a']
@@ -0,0 +1,138 @@
+import queue
+import socket
+import threading
+import time
+
+import pytest
+
+from triage.common import work_queue
+from triage.common.work_queue import Coordinator, connect, serve
+
+KEY = b'test'
+# Seconds to wait for results, well above the lease timeout of the tests.
+RESULT_TIMEOUT = 30
+
+
+def square(x: int) -> int:
+    return x * x
+
+
+class ThreadEngine:
+    """Runs each task of a worker in its own thread."""
+
+    def apply_async(self, function, args: tuple = (), callback=None, error_callback=None) -> None:
+        def run():
+            try:
+                result = function(*args)
+            except Exception as e:
+                error_callback(e)
+                return
+            callback(result)
+        threading.Thread(target=run, daemon=True).start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+@pytest.fixture(autouse=True)
+def short_heartbeats(monkeypatch):
+    # Workers are checked for expired leases at least once per heartbeat interval.
+    monkeypatch.setattr(work_queue, 'HEARTBEAT_INTERVAL', 0.1)
+
+
+@pytest.fixture
+def address() -> tuple:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()
+
+
+# Starts a worker serving tasks of the coordinator at `address` in a thread.
+def start_worker(address: tuple, name: str) -> threading.Thread:
+    connection = connect(address, KEY)
+    thread = threading.Thread(target=serve, args=(connection, name, 1, ThreadEngine), daemon=True)
+    thread.start()
+    return thread
+
+
+# Connects a worker with `slots` slots which never answers. Returns its connection and leased task ids once leased.
+def connect_stuck_worker(address: tuple, slots: int):
+    connection = connect(address, KEY)
+    connection.recv()
+    connection.send(('stuck', slots))
+    assert connection.poll(RESULT_TIMEOUT)
+    message = connection.recv()
+    assert message[0] == 'tasks'
+    return connection, [task_id for task_id, _, _ in message[1]]
+
+
+# Submits square tasks of `items` and returns a queue receiving (result, error) of each.
+def submit(coordinator: Coordinator, items) -> queue.Queue:
+    results = queue.Queue()
+    for item in items:
+        coordinator.apply_async(square, (item,), callback=lambda result: results.put((result, None)),
+                                error_callback=lambda e: results.put((None, e)))
+    return results
+
+
+def collect(results: queue.Queue, count: int) -> list:
+    return [results.get(timeout=RESULT_TIMEOUT) for _ in range(count)]
+
+
+def test_workers_run_all_tasks(address):
+    with Coordinator(address, KEY, 10, ()) as coordinator:
+        workers = [start_worker(address, f'worker-{i}') for i in range(2)]
+        assert sorted(coordinator.imap_unordered(square, range(20))) == [i * i for i in range(20)]
+    for worker in workers:
+        # Workers return once the coordinator is done.
+        worker.join(RESULT_TIMEOUT)
+        assert not worker.is_alive()
+
+
+def test_silent_workers_do_not_hold_up_others(address):
+    with Coordinator(address, KEY, 60, ()) as coordinator:
+        results = submit(coordinator, range(3))
+        # Connects but never answers the hello of the coordinator, which waits for it until the lease timeout.
+        silent = connect(address, KEY)
+        start = time.monotonic()
+        start_worker(address, 'healthy')
+        assert sorted(collect(results, 3)) == [(i * i, None) for i in range(3)]
+        assert time.monotonic() - start < RESULT_TIMEOUT
+        silent.close()
+
+
+def test_expired_leases_go_to_other_workers(address):
+    with Coordinator(address, KEY, 1, ()) as coordinator:
+        results = submit(coordinator, range(4))
+        stuck, leased = connect_stuck_worker(address, 2)
+        assert len(leased) == 4
+        start_worker(address, 'healthy')
+        assert sorted(collect(results, 4)) == [(i * i, None) for i in range(4)]
+        # The coordinator dropped the stuck worker.
+        assert stuck.poll(RESULT_TIMEOUT)
+        with pytest.raises((EOFError, OSError)):
+            stuck.recv()
+
+
+def test_tasks_of_disconnected_workers_go_to_other_workers(address):
+    with Coordinator(address, KEY, 60, ()) as coordinator:
+        results = submit(coordinator, range(3))
+        lost, leased = connect_stuck_worker(address, 2)
+        assert len(leased) == 3
+        lost.close()
+        start_worker(address, 'healthy')
+        assert sorted(collect(results, 3)) == [(i * i, None) for i in range(3)]
+
+
+def test_tasks_are_given_up_after_max_attempts(address):
+    with Coordinator(address, KEY, 60, ()) as coordinator:
+        results = submit(coordinator, [7])
+        for _ in range(work_queue.MAX_ATTEMPTS):
+            lost, _ = connect_stuck_worker(address, 1)
+            lost.close()
+        [(result, error)] = collect(results, 1)
+        assert result is None
+        assert isinstance(error, RuntimeError)
@@ -0,0 +1,84 @@
+import asyncio
+import collections
+import contextlib
+import logging
+import os
+
+from common.confighelper import ConfigHelper
+from common.utils import available_cpus
+from triage.common.utils import RSS_LIMIT_MB
+
+# Max RSS of children kept per benchmark, the most recent ones replacing older ones.
+MAX_SAMPLES = 100
+# Seconds between checks of waiting executions.
+ADMISSION_INTERVAL = 0.05
+# Executions wait while the 1-minute load average is above this many times the CPUs available.
+MAX_LOAD_PER_CPU = 1.5
+
+
+class AdmissionControl:
+    """Admits executions of triage binaries while the host has memory and CPU time for them.
+
+    Each execution reserves the memory that children of its benchmark recently peaked at, or RSS_LIMIT_MB before any
+    of them finished. An execution is admitted if the reserved memory fits into the memory available when triage
+    started, the memory available now still fits its reservation, and the host is not overloaded. Executions are
+    always admitted when none is running, which guarantees progress. Memory kept free for the host is
+    memoryReserveMb of the config.
+    """
+
+    def __init__(self, helper: ConfigHelper):
+        self.__enabled = helper.admission_control()
+        self.__memory_reserve = helper.memory_reserve_mb()
+        self.__cpus = available_cpus()
+        available = available_memory_mb()
+        self.__budget = None if available is None else available - self.__memory_reserve
+        self.__rss = collections.defaultdict(lambda: collections.deque(maxlen=MAX_SAMPLES))
+        self.__reserved = 0
+        self.__running = 0
+        self.__waited = False
+
+    # Reserves memory for an execution of `benchmark` while in the context, waiting until it is admitted.
+    @contextlib.asynccontextmanager
+    async def admit(self, benchmark: str):
+        reservation = max(self.__rss[benchmark], default=RSS_LIMIT_MB)
+        while not self.__admissible(reservation):
+            if not self.__waited:
+                logging.info(f'executions wait for memory or CPU time, {self.__running} running with '
+                             f'{self.__reserved:.0f} MB reserved')
+                self.__waited = True
+            await asyncio.sleep(ADMISSION_INTERVAL)
+        self.__reserved += reservation
+        self.__running += 1
+        try:
+            yield
+        finally:
+            self.__reserved -= reservation
+            self.__running -= 1
+
+    # Records the max RSS of a finished child of `benchmark`.
+    def add(self, benchmark: str, max_rss_mb: float) -> None:
+        self.__rss[benchmark].append(max_rss_mb)
+
+    def __admissible(self, reservation: float) -> bool:
+        if not self.__enabled or self.__running == 0:
+            return True
+        if self.__budget is not None:
+            if self.__reserved + reservation > self.__budget:
+                return False
+            # Memory that cannot be read now does not limit executions, like when triage started.
+            available = available_memory_mb()
+            if available is not None and available - self.__memory_reserve < reservation:
+                return False
+        return os.getloadavg()[0] <= self.__cpus * MAX_LOAD_PER_CPU
+
+
+# Returns MemAvailable of /proc/meminfo in MB, or None if it cannot be read.
+def available_memory_mb():
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
@@ -0,0 +1,187 @@
+import asyncio
+import os
+import queue
+import signal
+import subprocess
+import threading
+
+from common import profiling
+from triage.common.new_process import ProcessResult, READ_SIZE
+
+# Seconds between polls for the exit of a child, on kernels without pidfd.
+POLL_INTERVAL = 0.01
+
+
+class AsyncExecutor:
+    """Runs coroutine functions on one event loop in a background thread, in place of a pool of worker processes.
+
+    Each coroutine gets a free slot, e.g. the state of a pool worker, as its first argument and holds it until it
+    returns, so that `len(slots)` coroutines run at a time. `close_slot` is a coroutine function releasing the
+    resources of a slot once the executor is closed. `apply_async` and `imap_unordered` are called like their
+    `multiprocessing.Pool` counterparts, and their callbacks run in the loop thread. Closing the executor cancels the
+    coroutines still running, e.g. after a task failed, so that every slot is released and closed.
+    """
+
+    def __init__(self, slots: list, close_slot=None):
+        self.__close_slot = close_slot
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=profiling.profiled(self.__loop.run_forever), daemon=True)
+        self.__thread.start()
+        self.__slots = self.run(self.__make_slots(slots))
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.__loop).result()
+
+    def apply_async(self, function, args: tuple = (), callback=None, error_callback=None) -> None:
+        future = asyncio.run_coroutine_threadsafe(self.__in_slot(function, args), self.__loop)
+
+        def done(future):
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                if error_callback is not None:
+                    error_callback(future.exception())
+            elif callback is not None:
+                callback(future.result())
+        future.add_done_callback(done)
+
+    def imap_unordered(self, function, iterable):
+        return imap_unordered(self.apply_async, function, iterable)
+
+    def close(self) -> None:
+        self.run(self.__shutdown())
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    async def __make_slots(self, slots: list) -> asyncio.Queue:
+        free = asyncio.Queue()
+        for slot in slots:
+            free.put_nowait(slot)
+        return free
+
+    async def __in_slot(self, function, args: tuple):
+        slot = await self.__slots.get()
+        try:
+            return await function(slot, *args)
+        finally:
+            self.__slots.put_nowait(slot)
+
+    # Cancels the coroutines still running, which kill their children and release their slots, and closes all slots.
+    async def __shutdown(self) -> None:
+        running = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        if self.__close_slot is not None:
+            for _ in range(self.__slots.qsize()):
+                await self.__close_slot(self.__slots.get_nowait())
+
+
+# Yields the results of `function` for each item of `iterable` as they finish, submitting them with `apply_async` of an
+# execution engine. Items are listed by a feeding thread, so that `iterable` may block until results are consumed.
+def imap_unordered(apply_async, function, iterable):
+    results = queue.Queue()
+    # Number of items submitted and results yielded, and whether all items are submitted.
+    counts = [0, 0, False]
+
+    def feed():
+        try:
+            for item in iterable:
+                counts[0] += 1
+                apply_async(function, (item,), lambda result: results.put((result, None)),
+                            lambda e: results.put((None, e)))
+        except Exception as e:
+            results.put((None, e))
+        counts[2] = True
+        # Wakes up the consumer in case all results were yielded before.
+        results.put(None)
+
+    # Listing items, e.g. reading seed indexes and hashing seeds, is profiled like the consuming thread.
+    threading.Thread(target=profiling.profiled(feed), daemon=True).start()
+    while not counts[2] or counts[1] < counts[0]:
+        entry = results.get()
+        if entry is None:
+            continue
+        result, error = entry
+        if error is not None:
+            raise error
+        counts[1] += 1
+        yield result
+
+
+# Runs `args` as a child in a new process group and feeds its stderr to `log_parser`, like `new_process.execute`
+# with `kill_children` and a `stderr_parser`. The process group is killed after `timeout` seconds by a timer of the
+# event loop, and afterwards in any case. Results also hold the max RSS of the child.
+async def execute(args: list, env: dict, cwd: str, timeout: float, log_parser) -> ProcessResult:
+    loop = asyncio.get_running_loop()
+    process = subprocess.Popen(args, env=env, cwd=cwd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE, start_new_session=True)
+    timed_out = False
+
+    def kill():
+        nonlocal timed_out
+        timed_out = True
+        kill_process_group(process.pid)
+    timer = loop.call_later(timeout, kill)
+    try:
+        await read_chunks(process.stderr.fileno(), log_parser.feed)
+        log_parser.close()
+        await wait_exit(process.pid)
+    finally:
+        timer.cancel()
+        # The child is reaped only afterwards, so that its process group id is not reused yet.
+        kill_process_group(process.pid)
+        process.stderr.close()
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    return ProcessResult(process.returncode, None, timed_out, usage.ru_maxrss / 1024)
+
+
+def kill_process_group(process_group_id: int) -> None:
+    try:
+        os.killpg(process_group_id, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+# Returns a future done once `fd` is readable.
+def readable(fd: int) -> asyncio.Future:
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    loop.add_reader(fd, lambda: future.done() or future.set_result(None))
+    future.add_done_callback(lambda _: loop.remove_reader(fd))
+    return future
+
+
+# Passes chunks read from `fd` to `consume` until EOF.
+async def read_chunks(fd: int, consume) -> None:
+    os.set_blocking(fd, False)
+    while True:
+        await readable(fd)
+        try:
+            chunk = os.read(fd, READ_SIZE)
+        except BlockingIOError:
+            continue
+        if not chunk:
+            return
+        consume(chunk)
+
+
+# Waits for the child `pid` to exit, without reaping it.
+async def wait_exit(pid: int) -> None:
+    if hasattr(os, 'pidfd_open'):
+        pidfd = os.pidfd_open(pid)
+        try:
+            await readable(pidfd)
+        finally:
+            os.close(pidfd)
+        return
+    while os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is None:
+        await asyncio.sleep(POLL_INTERVAL)
@@ -0,0 +1,66 @@
+import collections
+import hashlib
+import json
+import sqlite3
+
+# Outcome of running a seed with a triage binary.
+# `duration` is in seconds, or None for seeds run in a batch. `signature` identifies the sanitizer report, if any.
+Execution = collections.namedtuple('Execution', ['retcode', 'timed_out', 'reaches', 'triggers', 'duration',
+                                                 'signature'])
+
+# Columns of the executions table.
+COLUMNS = ('binary TEXT, seed TEXT, fixreverter TEXT, profile TEXT, retcode INTEGER, timed_out INTEGER, reaches TEXT, '
+           'triggers TEXT, duration REAL, signature TEXT, PRIMARY KEY (binary, seed, fixreverter, profile)')
+
+
+class ExecCache:
+    """Executions of triage binaries stored in SQLite, keyed by binary digest, seed hash, FIXREVERTER value and
+    sanitizer profile.
+
+    Each worker opens its own connection. Workers of the async executor open it in the main thread and use it in the
+    thread of the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.__db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        # Write-ahead logging lets workers read while another worker writes.
+        self.__db.execute('PRAGMA journal_mode=WAL')
+        self.__db.execute('PRAGMA synchronous=NORMAL')
+        self.__db.execute(f'CREATE TABLE IF NOT EXISTS executions ({COLUMNS}) WITHOUT ROWID')
+        self.__db.commit()
+
+    def get(self, binary: str, seed: str, fixreverter: str, profile: str):
+        row = self.__db.execute('SELECT retcode, timed_out, reaches, triggers, duration, signature FROM executions '
+                                'WHERE binary = ? AND seed = ? AND fixreverter = ? AND profile = ?',
+                                (binary, seed, fixreverter, profile)).fetchone()
+        if row is None:
+            return None
+        return Execution(row[0], bool(row[1]), json.loads(row[2]), json.loads(row[3]), row[4], row[5])
+
+    # Returns durations of at most `limit` executions of `binary` with the sanitizer options of `profile` that did not
+    # time out.
+    def durations(self, binary: str, profile: str, limit: int) -> list:
+        return [row[0] for row in self.__db.execute('SELECT duration FROM executions WHERE binary = ? AND profile = ? '
+                                                    'AND timed_out = 0 AND duration IS NOT NULL LIMIT ?',
+                                                    (binary, profile, limit))]
+
+    # Stores `execution` unless it timed out, since whether a seed times out depends on the timeout it ran with.
+    def put(self, binary: str, seed: str, fixreverter: str, profile: str, execution: Execution) -> None:
+        if execution.timed_out:
+            return
+        with self.__db:
+            self.__db.execute('INSERT OR REPLACE INTO executions (binary, seed, fixreverter, profile, retcode, '
+                              'timed_out, reaches, triggers, duration, signature) '
+                              'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                              (binary, seed, fixreverter, profile, execution.retcode, execution.timed_out,
+                               json.dumps(list(execution.reaches)), json.dumps(list(execution.triggers)),
+                               execution.duration, execution.signature))
+
+
+# Returns the SHA-1 digest of the file at `path`.
+def file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import struct
+import subprocess
+import time
+
+from triage.common.async_executor import kill_process_group, read_chunks, readable, wait_exit
+from triage.common.new_process import ProcessResult, READ_SIZE
+
+# Written by triage binaries once their fork server is ready, see FR_FORKSERVER_HELLO in FRFuzzingDriver.c.
+HELLO = 0x32465246
+# Seconds to wait for the hello of a starting fork server.
+START_TIMEOUT = 10
+
+
+class ForkServerError(Exception):
+    """The triage binary does not support fork-server mode or its fork server died."""
+
+
+class ForkServer:
+    """Client of the fork server of a triage binary.
+
+    The binary is started once by `start` and forks a child per execution, with FIXREVERTER and the seed sent over a
+    pipe. Executions are coroutines of the event loop that started the server, and run one at a time. Results have
+    the same form as `async_executor.execute`: the stderr of the child is fed to the parser as it is written, and
+    children killed by a signal have a negative retcode.
+    Children write their stderr into a log pipe inherited by the fork server, which they open as their log path, so
+    that their logs are never written to disk.
+    """
+
+    def __init__(self, process: subprocess.Popen, ctl_fd: int, st_fd: int, log_fd: int, log_path: str):
+        self.__process = process
+        self.__ctl_fd = ctl_fd
+        self.__st_fd = st_fd
+        self.__log_fd = log_fd
+        self.__log_path = log_path
+        os.set_blocking(st_fd, False)
+        os.set_blocking(log_fd, False)
+
+    @classmethod
+    async def start(cls, binary: str, env: dict, cwd: str):
+        ctl_read, ctl_fd = os.pipe()
+        st_fd, st_write = os.pipe()
+        log_fd, log_write = os.pipe()
+        env = dict(env)
+        env['FR_FORKSERVER'] = f'{ctl_read},{st_write}'
+        try:
+            process = subprocess.Popen([binary], env=env, cwd=cwd, pass_fds=(ctl_read, st_write, log_write),
+                                       stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.DEVNULL, start_new_session=True)
+        except OSError as e:
+            os.close(ctl_fd)
+            os.close(st_fd)
+            os.close(log_fd)
+            raise ForkServerError(f'cannot start {binary}: {e}')
+        finally:
+            os.close(ctl_read)
+            os.close(st_write)
+            os.close(log_write)
+        # The fork server keeps the write end of the log pipe open, where its children open their stderr.
+        server = cls(process, ctl_fd, st_fd, log_fd, f'/dev/fd/{log_write}')
+        # Binaries without fork-server mode run no files and exit, closing the status pipe.
+        if await server.__read_int(START_TIMEOUT) != HELLO:
+            await server.close()
+            raise ForkServerError(f'{binary} does not support fork-server mode')
+        return server
+
+    # Runs `seed_path` with FIXREVERTER set to `fixreverter`, killing the child after `timeout` seconds.
+    # The stderr of the child is fed to `log_parser` while it runs.
+    async def execute(self, seed_path: str, fixreverter: str, timeout: float, log_parser) -> ProcessResult:
+        # Drops logs written after the status of the previous child, e.g. by processes it spawned.
+        self.__read_logs(lambda chunk: None)
+        request = b''.join(struct.pack('I', len(s)) + s
+                           for s in (fixreverter.encode(), os.fsencode(seed_path), os.fsencode(self.__log_path)))
+        try:
+            os.write(self.__ctl_fd, request)
+        except OSError as e:
+            raise ForkServerError(f'fork server is gone: {e}')
+        pid = await self.__read_int(START_TIMEOUT)
+        if pid is None or pid < 0:
+            raise ForkServerError('fork server cannot fork')
+        # The log pipe is read while the child runs, so that the child does not block on a full pipe. The fork
+        # server holds its write end, so reading only stops once the status of the child is read.
+        reader = asyncio.ensure_future(read_chunks(self.__log_fd, log_parser.feed))
+        try:
+            status = await self.__read_int(timeout)
+        except asyncio.CancelledError:
+            # The child did not report its status, so it is not reaped yet.
+            kill_process_group(pid)
+            raise
+        finally:
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+        timed_out = status is None
+        if timed_out:
+            # The fork server reaps the child once it exits, after which its pid may belong to another process. The
+            # process group of the child is therefore only killed while the child has not reported its status.
+            kill_process_group(pid)
+            status = await self.__read_int(START_TIMEOUT)
+            if status is None:
+                raise ForkServerError('fork server does not reap a timed out child')
+        max_rss = await self.__read_int(START_TIMEOUT)
+        if max_rss is None:
+            raise ForkServerError('fork server does not report the max RSS of its child')
+        # The child exited, so the rest of its logs is in the pipe.
+        self.__read_logs(log_parser.feed)
+        log_parser.close()
+        retcode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        return ProcessResult(retcode, None, timed_out, max_rss / 1024)
+
+    async def close(self) -> None:
+        # Closing the control pipe makes the fork server exit.
+        os.close(self.__ctl_fd)
+        os.close(self.__st_fd)
+        os.close(self.__log_fd)
+        try:
+            await asyncio.wait_for(wait_exit(self.__process.pid), START_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.__process.kill()
+            await wait_exit(self.__process.pid)
+        # The fork server exited, so reaping it does not block.
+        self.__process.wait()
+
+    # Passes the chunks in the log pipe to `consume`, without waiting for more.
+    def __read_logs(self, consume) -> None:
+        while True:
+            try:
+                chunk = os.read(self.__log_fd, READ_SIZE)
+            except BlockingIOError:
+                return
+            if not chunk:
+                return
+            consume(chunk)
+
+    # Reads an int32 from the status pipe, or returns None on timeout or EOF.
+    async def __read_int(self, timeout: float):
+        data = b''
+        deadline = time.monotonic() + timeout
+        while len(data) < 4:
+            try:
+                await asyncio.wait_for(readable(self.__st_fd), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                return None
+            try:
+                chunk = os.read(self.__st_fd, 4 - len(data))
+            except BlockingIOError:
+                continue
+            if not chunk:
+                return None
+            data += chunk
+        return struct.unpack('i', data)[0]
@@ -0,0 +1,272 @@
+import bisect
+import collections
+import json
+import math
+import os
+import threading
+import time
+
+from common.confighelper import ConfigHelper
+
+# Upper bounds of the buckets of each histogram.
+BUCKETS = {
+    'triage_execution_seconds': (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+    'triage_crash_search_executions': (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000),
+    'triage_ipc_seconds': (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1),
+}
+# Help texts of the metrics in the Prometheus textfile.
+HELP = {
+    'triage_executions_total': 'Executions of triage binaries by retcode class: ok, exit, signal or timeout.',
+    'triage_cached_executions_total': 'Executions found in the execution cache.',
+    'triage_execution_seconds': 'Durations of executions of triage binaries, with batches as one execution.',
+    'triage_crash_search_executions': 'Subsets of triggers run per crash seed by the crash set search and by an '
+                                      'exhaustive search.',
+    'triage_ipc_seconds': 'Time spent passing tasks and results between processes.',
+    'triage_executions_per_second': 'Executions per second since the last export.',
+    'triage_worker_utilization': 'Share of the time of the execution slots spent running triage binaries since the '
+                                 'last export.',
+    'triage_stage_elapsed_seconds': 'Time since the start of the triage stage.',
+    'triage_stage_done': 'Seed contents triaged in the triage stage.',
+    'triage_stage_total': 'Seed contents to triage in the triage stage, estimated while seeds are listed.',
+    'triage_stage_eta_seconds': 'Estimated time until the triage stage is done.',
+}
+
+
+class Metrics:
+    """Counters and histograms of the triage pipeline, keyed by name and labels.
+
+    Each process records into its own `REGISTRY`. Processes running tasks for another process hand their records
+    over with `take`, and the receiving process adds them with `merge`. Stages, and the slots of distributed workers
+    connected to the coordinator, are only tracked by the process running `triage_seeds`.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        # Map (name, sorted label items) to counter values, and to the bucket counts and sum of histograms.
+        self.__counters = collections.Counter()
+        self.__histograms = {}
+        # Maps stages to their progress, see `start_stage`.
+        self.__stages = {}
+        # Slots of distributed workers, and the seconds they were connected for until `slots_changed`.
+        self.__slots = 0
+        self.__slot_seconds = 0
+        self.__slots_changed = time.monotonic()
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        with self.__lock:
+            self.__counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            histogram = self.__histograms.setdefault(key, [0] * (len(BUCKETS[name]) + 2))
+            # The last two entries are the bucket above all bounds and the sum.
+            histogram[bisect.bisect_left(BUCKETS[name], value)] += 1
+            histogram[-1] += value
+
+    # Returns the counters and histograms recorded since the last call, and starts over.
+    def take(self) -> tuple:
+        with self.__lock:
+            records = (self.__counters, self.__histograms)
+            self.__counters = collections.Counter()
+            self.__histograms = {}
+        return records
+
+    def merge(self, records: tuple) -> None:
+        counters, histograms = records
+        with self.__lock:
+            self.__counters.update(counters)
+            for key, values in histograms.items():
+                histogram = self.__histograms.setdefault(key, [0] * len(values))
+                for i, value in enumerate(values):
+                    histogram[i] += value
+
+    # Starts tracking `stage`, which lists the seeds of `trials` trials, and has `total` contents if known upfront.
+    def start_stage(self, stage: str, trials: int, total: int = None) -> None:
+        with self.__lock:
+            self.__stages[stage] = {'start': time.monotonic(), 'end': None, 'trials': trials, 'trials_listed': 0,
+                                    'listed': 0, 'done': 0, 'total': total}
+
+    # Adds to the trials listed, contents listed and contents done of `stage`.
+    def update_stage(self, stage: str, trials_listed: int = 0, listed: int = 0, done: int = 0) -> None:
+        with self.__lock:
+            progress = self.__stages[stage]
+            progress['trials_listed'] += trials_listed
+            progress['listed'] += listed
+            progress['done'] += done
+
+    def finish_stage(self, stage: str) -> None:
+        with self.__lock:
+            progress = self.__stages[stage]
+            progress['end'] = time.monotonic()
+            progress['total'] = progress['done']
+
+    # Adds `count` slots of distributed workers, which leave with a negative count.
+    def add_slots(self, count: int) -> None:
+        with self.__lock:
+            now = time.monotonic()
+            self.__slot_seconds += self.__slots * (now - self.__slots_changed)
+            self.__slots += count
+            self.__slots_changed = now
+
+    # Returns the seconds distributed workers were connected for until `now`, summed over their slots.
+    def slot_seconds(self, now: float) -> float:
+        with self.__lock:
+            return self.__slot_seconds + self.__slots * (now - self.__slots_changed)
+
+    # Returns copies of the counters, histograms and stage progress.
+    def snapshot(self) -> tuple:
+        with self.__lock:
+            return (collections.Counter(self.__counters),
+                    {key: list(values) for key, values in self.__histograms.items()},
+                    {stage: dict(progress) for stage, progress in self.__stages.items()})
+
+
+# Records of the current process.
+REGISTRY = Metrics()
+
+
+# Returns the class of the retcode of an execution, as a label of triage_executions_total.
+def retcode_class(retcode: int, timed_out: bool) -> str:
+    if timed_out:
+        return 'timeout'
+    if retcode == 0:
+        return 'ok'
+    return 'signal' if retcode < 0 else 'exit'
+
+
+class MetricsExport:
+    """Writes the metrics of `REGISTRY` to triage_metrics.json and triage_metrics.prom in outDir every
+    metricsInterval seconds while in the context, and once more when leaving it.
+
+    The Prometheus file is meant for the textfile collector of the node exporter. Rates and ETAs are computed from
+    the difference to the previous export. Utilization is relative to `cores` slots, or to the slots of the workers
+    connected since the previous export with distributed triage.
+    """
+
+    def __init__(self, helper: ConfigHelper):
+        self.__interval = helper.metrics_interval()
+        self.__cores = helper.cores()
+        self.__distributed = helper.execution_engine() == 'distributed'
+        self.__json_path = os.path.join(helper.out_dir(), 'triage_metrics.json')
+        self.__prom_path = os.path.join(helper.out_dir(), 'triage_metrics.prom')
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        # Executions per benchmark, seconds spent executing, slot seconds and the time of the previous export.
+        # Earlier stages of the same process are left out.
+        now = time.monotonic()
+        self.__previous = (*execution_totals(*REGISTRY.snapshot()[:2]), self.__slot_seconds(now), now)
+
+    def __enter__(self):
+        if self.__interval > 0:
+            self.__thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        if self.__interval > 0:
+            self.__stopped.set()
+            self.__thread.join()
+            self.write()
+
+    def __slot_seconds(self, now: float) -> float:
+        return REGISTRY.slot_seconds(now) if self.__distributed else self.__cores * now
+
+    def __run(self) -> None:
+        while not self.__stopped.wait(self.__interval):
+            self.write()
+
+    def write(self) -> None:
+        counters, histograms, stages = REGISTRY.snapshot()
+        now = time.monotonic()
+        executions, busy = execution_totals(counters, histograms)
+        slot_seconds = self.__slot_seconds(now)
+        previous_executions, previous_busy, previous_slot_seconds, previous_time = self.__previous
+        self.__previous = (executions, busy, slot_seconds, now)
+        elapsed = max(now - previous_time, 1e-9)
+        gauges = [('triage_executions_per_second', (('benchmark', benchmark),),
+                   (executions[benchmark] - previous_executions[benchmark]) / elapsed) for benchmark in executions]
+        if slot_seconds > previous_slot_seconds:
+            gauges.append(('triage_worker_utilization', (),
+                           (busy - previous_busy) / (slot_seconds - previous_slot_seconds)))
+        stage_info = {}
+        for stage, progress in stages.items():
+            stage_info[stage] = stage_progress(progress, now)
+            for key in ('elapsed_seconds', 'done', 'total', 'eta_seconds'):
+                if stage_info[stage][key] is not None:
+                    gauges.append((f'triage_stage_{key}', (('stage', stage),), stage_info[stage][key]))
+        write_file(self.__json_path, json.dumps({
+            'time': time.time(),
+            'stages': stage_info,
+            'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                         for (name, labels), value in sorted(counters.items())],
+            'histograms': [{'name': name, 'labels': dict(labels),
+                            'buckets': list(zip([*BUCKETS[name], '+Inf'], values)),
+                            'count': sum(values[:-1]), 'sum': values[-1]}
+                           for (name, labels), values in sorted(histograms.items())],
+            'gauges': [{'name': name, 'labels': dict(labels), 'value': value} for name, labels, value in gauges],
+        }, indent=2))
+        write_file(self.__prom_path, prometheus_text(counters, histograms, gauges))
+
+
+# Returns the executions per benchmark and the seconds spent executing recorded in `counters` and `histograms`.
+def execution_totals(counters: collections.Counter, histograms: dict) -> tuple:
+    executions = collections.Counter()
+    for (name, labels), value in counters.items():
+        if name == 'triage_executions_total':
+            executions[dict(labels)['benchmark']] += value
+    busy = sum(values[-1] for (name, _), values in histograms.items() if name == 'triage_execution_seconds')
+    return executions, busy
+
+
+# Returns the elapsed time, contents done, total contents and ETA of a stage from its `progress`.
+# While seeds are listed, the total is extrapolated from the contents per trial listed so far.
+def stage_progress(progress: dict, now: float) -> dict:
+    elapsed = (progress['end'] or now) - progress['start']
+    total = progress['total']
+    if total is None and progress['trials_listed'] > 0:
+        total = max(round(progress['listed'] / progress['trials_listed'] * progress['trials']), progress['listed'])
+    eta = None
+    if progress['end'] is not None:
+        eta = 0
+    elif total is not None and progress['done'] > 0:
+        eta = (total - progress['done']) * elapsed / progress['done']
+    return {'elapsed_seconds': elapsed, 'done': progress['done'], 'total': total, 'eta_seconds': eta,
+            'finished': progress['end'] is not None}
+
+
+# Returns the metrics in the Prometheus text exposition format, where the samples of each metric are contiguous.
+def prometheus_text(counters: collections.Counter, histograms: dict, gauges: list) -> str:
+    lines = []
+    entries = ([(name, 'counter', labels, value) for (name, labels), value in sorted(counters.items())]
+               + [(name, 'histogram', labels, values) for (name, labels), values in sorted(histograms.items())]
+               + [(name, 'gauge', labels, value) for name, labels, value in sorted(gauges, key=lambda gauge: gauge[0])])
+    described = set()
+    for name, kind, labels, value in entries:
+        if name not in described:
+            described.add(name)
+            lines.append(f'# HELP {name} {HELP[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+        if kind != 'histogram':
+            lines.append(f'{name}{label_text(labels)} {value}')
+            continue
+        cumulative = 0
+        for bound, count in zip([*BUCKETS[name], math.inf], value[:-1]):
+            cumulative += count
+            lines.append(f'{name}_bucket{label_text((*labels, ("le", "+Inf" if bound == math.inf else bound)))} '
+                         f'{cumulative}')
+        lines.append(f'{name}_sum{label_text(labels)} {value[-1]}')
+        lines.append(f'{name}_count{label_text(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def label_text(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+# Writes `text` to `path` through a temporary file, so that readers never see a partial file.
+def write_file(path: str, text: str) -> None:
+    with open(path + '.tmp', 'w') as f:
+        f.write(text)
+    os.replace(path + '.tmp', path)
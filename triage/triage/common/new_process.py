@@ -20,6 +20,7 @@ import threading
 from typing import List
 
 LOG_LIMIT_FIELD = 10 * 1024  # 10 KB.
+READ_SIZE = 64 * 1024  # 64 KB.
 
 
 class WrappedPopen:
@@ -62,8 +63,11 @@ def _start_kill_thread(process: WrappedPopen, kill_children: bool,
     return timer
 
 
+# |max_rss_mb| is the peak resident memory of the process, if measured.
 ProcessResult = collections.namedtuple('ProcessResult',
-                                       ['retcode', 'output', 'timed_out'])
+                                       ['retcode', 'output', 'timed_out',
+                                        'max_rss_mb'],
+                                       defaults=[None])
 
 
 def execute(  # pylint: disable=too-many-locals,too-many-branches
@@ -76,6 +80,9 @@ def execute(  # pylint: disable=too-many-locals,too-many-branches
         output_file=None,
         # Not True by default because we can't always set group on processes.
         kill_children: bool = False,
+        # If set, stdout is discarded and stderr is fed to it while |command|
+        # runs instead of being returned as the output.
+        stderr_parser=None,
         **kwargs) -> ProcessResult:
     """Execute |command| and return the returncode and the output"""
     if write_to_stdout:
@@ -85,7 +92,8 @@ def execute(  # pylint: disable=too-many-locals,too-many-branches
     elif not output_file:
         output_file = subprocess.PIPE
 
-    kwargs['stdout'] = subprocess.PIPE
+    kwargs['stdout'] = (subprocess.PIPE
+                        if stderr_parser is None else subprocess.DEVNULL)
     kwargs['stderr'] = subprocess.PIPE
     if kill_children:
         kwargs['preexec_fn'] = os.setsid
@@ -97,7 +105,15 @@ def execute(  # pylint: disable=too-many-locals,too-many-branches
     if timeout is not None:
         kill_thread = _start_kill_thread(wrapped_process, kill_children,
                                          timeout)
-    _, err = process.communicate()
+    if stderr_parser is None:
+        _, err = process.communicate()
+    else:
+        err = None
+        for chunk in iter(lambda: process.stderr.read1(READ_SIZE), b''):
+            stderr_parser.feed(chunk)
+        stderr_parser.close()
+        process.stderr.close()
+        process.wait()
 
     if timeout is not None:
         kill_thread.cancel()
@@ -1,21 +1,130 @@
 import re
 
+from triage.common.new_process import LOG_LIMIT_FIELD
 
-# Parse FixReverter logs into reached (program execution reaches the injection)  injection ids
-# and triggered (program execution meets the injected condition(s)) injection ids.
-def parse_log(output: str) -> tuple:
-    lines = output.split('\n')
-    reaches = set()
-    triggers = set()
-    for line in lines:
-        reach_match = re.search(r'reached bug index (\d+)', line)
-        if reach_match:
-            reaches.add(int(reach_match.group(1)))
-        else:
-            trigger_match = re.search(r'triggered bug index (\d+)', line)
-            if trigger_match:
+
+# Matches, on one line of stderr of a triage binary, a FixReverter log of a reached (program execution reaches the
+# injection) or triggered (program execution meets the injected condition(s)) injection id, a batch marker of the
+# driver, or the start of a sanitizer report.
+LOG_PATTERN = re.compile(rb'(reached|triggered) bug index (\d+)'
+                         rb'|^\[FRDRIVER\] (ready|start|end)(?: (\d+))?'
+                         rb'|^(?:==\d+== ?ERROR: |.*runtime error: )', re.MULTILINE)
+
+
+class LogParser:
+    """Parses stderr of a triage binary incrementally, as chunks of bytes arrive.
+
+    Injection ids are collected into sets, so that noisy seeds do not keep their logs in memory. Only the last
+    `limit` bytes of the output, or the first `limit` bytes of the sanitizer report if there is one, are kept as
+    `output`.
+    In batch mode, the logs of each file are also kept apart by the markers of the driver.
+    """
+
+    def __init__(self, limit: int = LOG_LIMIT_FIELD):
+        self.reaches = set()
+        self.triggers = set()
+        # Maps argv indices of executed files to (reaches, triggers) in batch mode.
+        self.files = {}
+        # Argv index of the file that is running, and whether the driver supports batch mode.
+        self.running = None
+        self.ready = False
+        self.__limit = limit
+        self.__file_reaches = set()
+        self.__file_triggers = set()
+        self.__partial = b''
+        self.__tail = bytearray()
+        self.__report = None
+
+    def feed(self, data: bytes) -> None:
+        data = self.__partial + data
+        # Only complete lines are parsed, the rest waits for the next chunk. Lines are cut to `limit` bytes.
+        end = data.rfind(b'\n') + 1
+        self.__partial = data[end:][-self.__limit:]
+        self.__parse(data[:end])
+
+    # Parses the last line, which has no newline.
+    def close(self) -> None:
+        self.__parse(self.__partial)
+        self.__partial = b''
+
+    # Sorted lists of reached and triggered injection ids.
+    def log(self) -> tuple:
+        return sorted(self.reaches), sorted(self.triggers)
+
+    @property
+    def output(self) -> str:
+        kept = self.__tail if self.__report is None else self.__report
+        return kept.decode('utf-8', errors='ignore')
+
+    def __parse(self, data: bytes) -> None:
+        matches = LOG_PATTERN.findall(data)
+        # Noisy seeds repeat the same logs, which are parsed once unless batch markers split them between files.
+        if b'[FRDRIVER] ' not in data:
+            matches = set(matches)
+        report_start = None
+        for kind, injection, marker, index in matches:
+            if injection:
+                injection = int(injection)
                 # Logging of `trigger` suppresses logging of `reach`.
-                reaches.add(int(trigger_match.group(1)))
-                triggers.add(int(trigger_match.group(1)))
-    # Sort and convert to list.
-    return sorted(reaches), sorted(triggers)
+                self.reaches.add(injection)
+                self.__file_reaches.add(injection)
+                if kind == b'triggered':
+                    self.triggers.add(injection)
+                    self.__file_triggers.add(injection)
+            elif marker:
+                self.__marker(marker, index)
+            elif report_start is None and self.__report is None:
+                report_start = next(match.start() for match in LOG_PATTERN.finditer(data)
+                                    if match.group(2) is None and match.group(3) is None)
+        if report_start is not None:
+            self.__report = bytearray(data[report_start:report_start + self.__limit])
+        elif self.__report is not None:
+            self.__report += data[:self.__limit - len(self.__report)]
+        else:
+            self.__tail += data
+            del self.__tail[:-self.__limit]
+
+    def __marker(self, marker: bytes, index: bytes) -> None:
+        if marker == b'ready':
+            self.ready = True
+        elif marker == b'start':
+            self.running = int(index)
+            self.__file_reaches = set()
+            self.__file_triggers = set()
+        elif marker == b'end' and self.running is not None:
+            self.files[self.running] = (sorted(self.__file_reaches), sorted(self.__file_triggers))
+            self.running = None
+
+
+SANITIZER_ERROR_PATTERN = re.compile(r'ERROR: (\w+): ([\w-]+)')
+UBSAN_ERROR_PATTERN = re.compile(r'runtime error: (.+)')
+FRAME_PATTERN = re.compile(r'#(\d+) 0x[0-9a-fA-F]+ in (\S+)')
+
+
+# Returns the signature of the sanitizer report in `output`: the crash type followed by the functions of the top
+# `num_frames` stack frames. Returns None if there is no report.
+def parse_signature(output: str, num_frames: int):
+    crash_type = None
+    frames = []
+    for line in output.split('\n'):
+        if crash_type is None:
+            error_match = SANITIZER_ERROR_PATTERN.search(line)
+            if error_match:
+                crash_type = f'{error_match.group(1)}: {error_match.group(2)}'
+            else:
+                ubsan_match = UBSAN_ERROR_PATTERN.search(line)
+                if ubsan_match:
+                    # Values in UBSan messages differ between inputs hitting the same bug.
+                    crash_type = 'runtime error: ' + re.sub(r'-?\d+', 'N', ubsan_match.group(1))
+            continue
+        frame_match = FRAME_PATTERN.search(line)
+        if frame_match:
+            # Only the first stack trace of the report, e.g. not the allocation stack, is part of the signature.
+            if frame_match.group(1) == '0' and frames:
+                break
+            frames.append(frame_match.group(2))
+            if len(frames) == num_frames:
+                break
+    if crash_type is None:
+        return None
+    return ' '.join([crash_type, *frames])
@@ -43,6 +43,25 @@ ADDITIONAL_UBSAN_OPTIONS = {
     'print_stacktrace': 1,
 }
 
+# Profiles of sanitizer options for triage runs, listed in SANITIZER_PROFILES
+# of common/utils.py. `full` is the ClusterFuzz configuration above. `lean` is
+# for runs that only need FixReverter logs and exit codes, so it skips
+# symbolization, leak detection and stack use after return detection, and keeps
+# less freed memory in quarantine.
+LEAN_SANITIZER_OPTIONS = {
+    'symbolize': 0,
+}
+LEAN_ASAN_OPTIONS = {
+    'detect_leaks': 0,
+    'detect_stack_use_after_return': 0,
+    'fast_unwind_on_fatal': 1,
+    'malloc_context_size': 0,
+    'quarantine_size_mb': 16,
+}
+LEAN_UBSAN_OPTIONS = {
+    'print_stacktrace': 0,
+}
+
 
 def _join_memory_tool_options(options):
     """Joins a dict holding memory tool options into a string that can be set in
@@ -51,10 +70,15 @@ def _join_memory_tool_options(options):
         '%s=%s' % (key, str(value)) for key, value in sorted(options.items()))
 
 
-def set_sanitizer_options(env, is_fuzz_run=False):
-    """Sets sanitizer options in |env|."""
+def set_sanitizer_options(env, is_fuzz_run=False, profile='full'):
+    """Sets sanitizer options of |profile| in |env|."""
     sanitizer_options_filtered = dict(SANITIZER_OPTIONS)
+    additional_asan_options_filtered = dict(ADDITIONAL_ASAN_OPTIONS)
     additional_ubsan_options_filtered = dict(ADDITIONAL_UBSAN_OPTIONS)
+    if profile == 'lean':
+        sanitizer_options_filtered.update(LEAN_SANITIZER_OPTIONS)
+        additional_asan_options_filtered.update(LEAN_ASAN_OPTIONS)
+        additional_ubsan_options_filtered.update(LEAN_UBSAN_OPTIONS)
     if is_fuzz_run:
         # This is needed for fuzzing speed, also a requirement for AFL.
         sanitizer_options_filtered['symbolize'] = 0
@@ -64,7 +88,7 @@ def set_sanitizer_options(env, is_fuzz_run=False):
 
     env['ASAN_OPTIONS'] = _join_memory_tool_options({
         **sanitizer_options_filtered,
-        **ADDITIONAL_ASAN_OPTIONS
+        **additional_asan_options_filtered
     })
     env['UBSAN_OPTIONS'] = _join_memory_tool_options({
         **sanitizer_options_filtered,
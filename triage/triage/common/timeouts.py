@@ -0,0 +1,65 @@
+import collections
+import logging
+import math
+
+from common.confighelper import ConfigHelper
+from common.utils import SANITIZER_PROFILES
+from triage.common.exec_cache import ExecCache
+
+# Durations kept per benchmark and sanitizer profile, the most recent ones replacing older ones.
+MAX_SAMPLES = 1000
+# Timeouts fall back to the ceiling until a benchmark has this many durations with a sanitizer profile.
+MIN_SAMPLES = 20
+# Timeouts are recomputed after this many new durations of a benchmark with a sanitizer profile.
+UPDATE_INTERVAL = 50
+
+
+class ExecutionTimeouts:
+    """Timeouts of executions per benchmark and sanitizer profile, derived from the durations of its executions that
+    did not time out.
+
+    Executions with the full profile symbolize their reports and take longer than lean ones, so each profile learns
+    its own timeouts. The timeout is a percentile of the durations times a safety factor, between the floor and the
+    ceiling of the config. Durations start with the ones of executions cached in `exec_cache_file`, and are added as
+    seeds are run.
+    """
+
+    def __init__(self, helper: ConfigHelper, binary_digests: dict, exec_cache_file: str):
+        self.__percentile = helper.timeout_percentile()
+        self.__factor = helper.timeout_factor()
+        self.__floor = helper.timeout_floor()
+        self.__ceiling = helper.timeout_ceiling()
+        # Maps (benchmark, sanitizer profile) to durations.
+        self.__durations = {(benchmark, profile): collections.deque(maxlen=MAX_SAMPLES)
+                            for benchmark in helper.benchmarks() for profile in SANITIZER_PROFILES}
+        # Numbers of durations added since the timeouts were computed.
+        self.__added = collections.Counter()
+        self.__timeouts = {}
+        if binary_digests:
+            exec_cache = ExecCache(exec_cache_file)
+            for (benchmark, profile), durations in self.__durations.items():
+                if benchmark in binary_digests:
+                    durations.extend(exec_cache.durations(binary_digests[benchmark], profile, MAX_SAMPLES))
+        for benchmark, profile in self.__durations:
+            self.__update(benchmark, profile)
+            logging.info(f'execution timeout of benchmark {benchmark} with the {profile} sanitizer profile is '
+                         f'{self.__timeouts[(benchmark, profile)]:.2f}s from '
+                         f'{len(self.__durations[(benchmark, profile)])} durations')
+
+    def timeout(self, benchmark: str, profile: str) -> float:
+        return self.__timeouts[(benchmark, profile)]
+
+    def add(self, benchmark: str, profile: str, duration: float) -> None:
+        self.__durations[(benchmark, profile)].append(duration)
+        self.__added[(benchmark, profile)] += 1
+        if self.__added[(benchmark, profile)] == UPDATE_INTERVAL:
+            self.__update(benchmark, profile)
+
+    def __update(self, benchmark: str, profile: str) -> None:
+        durations = sorted(self.__durations[(benchmark, profile)])
+        self.__added[(benchmark, profile)] = 0
+        if len(durations) < MIN_SAMPLES:
+            self.__timeouts[(benchmark, profile)] = self.__ceiling
+            return
+        percentile = durations[max(math.ceil(len(durations) * self.__percentile / 100) - 1, 0)]
+        self.__timeouts[(benchmark, profile)] = min(max(percentile * self.__factor, self.__floor), self.__ceiling)
@@ -0,0 +1,306 @@
+import collections
+import itertools
+import logging
+import pickle
+import socket
+import threading
+import time
+from multiprocessing.connection import Client, Listener, Pipe, wait
+
+from triage.common import metrics
+from triage.common.async_executor import imap_unordered
+
+# Tasks a worker asks for per slot of its engine, so that it has the next ones at hand when a task finishes.
+TASKS_PER_SLOT = 2
+# Tasks are given up once this many workers were lost while running them, e.g. because the task kills its worker.
+MAX_ATTEMPTS = 3
+# Seconds between messages of a worker which tell the coordinator that it is alive.
+HEARTBEAT_INTERVAL = 5
+# Seconds between attempts of a worker to connect to the coordinator, and until it stops trying.
+CONNECT_INTERVAL = 1
+CONNECT_TIMEOUT = 300
+
+
+class Coordinator:
+    """Serves tasks of an execution engine to worker processes connecting over TCP, in place of running them locally.
+
+    `apply_async` and `imap_unordered` are called like their `AsyncExecutor` counterparts. Tasks are leased to
+    workers, which ask for as many tasks as they have room for and send back their results. Tasks of a worker that
+    disconnects or is not heard from for `lease_timeout` seconds are leased to other workers again. Workers get
+    `context` when they connect, and run tasks with their own engine. Callbacks run in the dispatching thread.
+    Connections are authenticated with `key`, and messages are pickled, so workers must be trusted.
+    """
+
+    def __init__(self, address: tuple, key: bytes, lease_timeout: float, context: tuple):
+        self.__context = context
+        self.__lease_timeout = lease_timeout
+        try:
+            self.__listener = Listener(address, family='AF_INET', authkey=key)
+        except OSError as e:
+            logging.error(f'cannot serve triage tasks at {address[0]}:{address[1]}: {e}')
+            exit(1)
+        self.__lock = threading.Lock()
+        # Maps task ids to [function, args, callback, error_callback, attempts] of tasks not finished yet.
+        self.__tasks = {}
+        # Ids of tasks waiting for a worker.
+        self.__pending = collections.deque()
+        self.__task_ids = itertools.count()
+        # Workers connected but not yet dispatched to, as (connection, name, slots).
+        self.__connected = []
+        # Whether the dispatching thread stopped, after which connecting workers are told that the coordinator is done.
+        self.__dispatched = False
+        # A pipe waking up the dispatching thread, which holds at most one message.
+        self.__wake_reader, self.__wake_writer = Pipe(duplex=False)
+        self.__woken = False
+        self.__closed = False
+        logging.info(f'serve triage tasks to workers at {address[0]}:{address[1]}')
+        self.__threads = [threading.Thread(target=self.__accept, daemon=True),
+                          threading.Thread(target=self.__dispatch, daemon=True)]
+        for thread in self.__threads:
+            thread.start()
+
+    def apply_async(self, function, args: tuple = (), callback=None, error_callback=None) -> None:
+        with self.__lock:
+            task_id = next(self.__task_ids)
+            self.__tasks[task_id] = [function, args, callback, error_callback, 0]
+            self.__pending.append(task_id)
+        self.__wake()
+
+    def imap_unordered(self, function, iterable):
+        return imap_unordered(self.apply_async, function, iterable)
+
+    def close(self) -> None:
+        self.__closed = True
+        # Closing the listener does not interrupt a pending accept, so a connection does.
+        host, port = self.__listener.address
+        socket.create_connection(('127.0.0.1' if host == '0.0.0.0' else host, port)).close()
+        self.__threads[0].join()
+        # Workers reconnect once they are done, and wait for the next coordinator instead.
+        self.__listener.close()
+        self.__wake()
+        self.__threads[1].join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __wake(self) -> None:
+        with self.__lock:
+            if not self.__woken:
+                self.__woken = True
+                self.__wake_writer.send(None)
+
+    # Accepts workers until the coordinator is closed. Each worker is greeted in its own thread, so that workers
+    # which are slow to answer do not hold up the others.
+    def __accept(self) -> None:
+        while True:
+            try:
+                connection = self.__listener.accept()
+            except Exception as e:
+                if not self.__closed:
+                    logging.warning(f'rejected a triage worker: {e}')
+                    continue
+            if self.__closed:
+                return
+            threading.Thread(target=self.__greet, args=(connection,), daemon=True).start()
+
+    # Sends the context to the worker of `connection` and hands it to the dispatching thread once it answers.
+    def __greet(self, connection) -> None:
+        try:
+            connection.send(('hello', self.__context))
+            # Workers answer once their engine is ready.
+            if not connection.poll(self.__lease_timeout):
+                raise TimeoutError('no answer')
+            name, slots = connection.recv()
+        except (EOFError, OSError) as e:
+            logging.warning(f'triage worker disconnected before it started: {str(e) or "EOF"}')
+            connection.close()
+            return
+        with self.__lock:
+            dispatched = self.__dispatched
+            if not dispatched:
+                self.__connected.append((connection, name, slots))
+        if dispatched:
+            # The coordinator finished while the worker was starting.
+            with connection:
+                try:
+                    connection.send(('done',))
+                except OSError:
+                    pass
+            return
+        logging.info(f'triage worker {name} connected with {slots} slots')
+        self.__wake()
+
+    # Sends tasks to workers and receives their results, until the coordinator is closed.
+    def __dispatch(self) -> None:
+        # Maps connections of workers to [name, tasks they ask for, ids of tasks leased to them, last message time,
+        # slots].
+        workers = {}
+        while not self.__closed:
+            for connection in wait([self.__wake_reader, *workers], HEARTBEAT_INTERVAL):
+                if connection is self.__wake_reader:
+                    with self.__lock:
+                        self.__wake_reader.recv()
+                        self.__woken = False
+                    continue
+                try:
+                    start = time.monotonic()
+                    message = connection.recv()
+                    metrics.REGISTRY.observe('triage_ipc_seconds', time.monotonic() - start, engine='distributed')
+                    self.__receive(workers[connection], message)
+                except (EOFError, OSError) as e:
+                    self.__lose(workers, connection, f'disconnected: {str(e) or "EOF"}')
+            with self.__lock:
+                connected, self.__connected = self.__connected, []
+            for connection, name, slots in connected:
+                workers[connection] = [name, slots * TASKS_PER_SLOT, set(), time.monotonic(), slots]
+                metrics.REGISTRY.add_slots(slots)
+            for connection in list(workers):
+                if time.monotonic() - workers[connection][3] > self.__lease_timeout:
+                    self.__lose(workers, connection, f'not heard from for {self.__lease_timeout}s')
+                else:
+                    self.__lease(workers, connection)
+        metrics.REGISTRY.add_slots(-sum(worker[4] for worker in workers.values()))
+        # Workers connected since the last dispatch are told as well.
+        with self.__lock:
+            self.__dispatched = True
+            connected, self.__connected = self.__connected, []
+        for connection in [*workers, *[connection for connection, _, _ in connected]]:
+            try:
+                connection.send(('done',))
+            except OSError:
+                pass
+            connection.close()
+
+    def __receive(self, worker: list, message: tuple) -> None:
+        worker[3] = time.monotonic()
+        if message[0] == 'heartbeat':
+            return
+        _, task_id, result, error, records = message
+        # Workers send the metrics they recorded since their previous result.
+        metrics.REGISTRY.merge(records)
+        worker[1] += 1
+        worker[2].discard(task_id)
+        with self.__lock:
+            task = self.__tasks.pop(task_id, None)
+        if task is None:
+            return
+        _, _, callback, error_callback, _ = task
+        if error is not None:
+            if error_callback is not None:
+                error_callback(error)
+        elif callback is not None:
+            callback(result)
+
+    # Sends as many pending tasks to the worker of `connection` as it asks for.
+    def __lease(self, workers: dict, connection) -> None:
+        worker = workers[connection]
+        with self.__lock:
+            leased = [self.__pending.popleft() for _ in range(min(worker[1], len(self.__pending)))]
+            messages = [(task_id, *self.__tasks[task_id][:2]) for task_id in leased]
+        if not leased:
+            return
+        worker[1] -= len(leased)
+        worker[2].update(leased)
+        try:
+            start = time.monotonic()
+            connection.send(('tasks', messages))
+            metrics.REGISTRY.observe('triage_ipc_seconds', time.monotonic() - start, engine='distributed')
+        except OSError as e:
+            self.__lose(workers, connection, f'disconnected: {e}')
+
+    # Leases the tasks of a lost worker to other workers, or gives them up after MAX_ATTEMPTS lost workers.
+    def __lose(self, workers: dict, connection, reason: str) -> None:
+        name, _, leased, _, slots = workers.pop(connection)
+        connection.close()
+        metrics.REGISTRY.add_slots(-slots)
+        logging.warning(f'triage worker {name} {reason}, leasing its {len(leased)} tasks to other workers')
+        failed = []
+        with self.__lock:
+            for task_id in leased:
+                task = self.__tasks[task_id]
+                task[4] += 1
+                if task[4] < MAX_ATTEMPTS:
+                    self.__pending.appendleft(task_id)
+                else:
+                    failed.append(self.__tasks.pop(task_id))
+        for _, args, _, error_callback, attempts in failed:
+            if error_callback is not None:
+                error_callback(RuntimeError(f'{attempts} triage workers were lost running a task with {args}'))
+
+
+# Runs tasks of the coordinator at `address` with engines made by `make_engine(*context)`, until the coordinator
+# cannot be reached for CONNECT_TIMEOUT seconds. Each stage of the triage connects once and gets its own engine.
+def run_worker(address: tuple, key: bytes, name: str, slots: int, make_engine) -> None:
+    while True:
+        connection = connect(address, key)
+        if connection is None:
+            logging.info(f'no triage coordinator at {address[0]}:{address[1]} for {CONNECT_TIMEOUT}s, stopping')
+            return
+        logging.info(f'triage worker {name} connected to the coordinator at {address[0]}:{address[1]}')
+        with connection:
+            try:
+                serve(connection, name, slots, make_engine)
+            except (EOFError, OSError) as e:
+                logging.warning(f'lost the triage coordinator: {str(e) or "EOF"}')
+
+
+# Connects to the coordinator at `address`, retrying until CONNECT_TIMEOUT. Returns None if it cannot be reached.
+def connect(address: tuple, key: bytes):
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while True:
+        try:
+            return Client(address, family='AF_INET', authkey=key)
+        except OSError:
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(CONNECT_INTERVAL)
+
+
+# Runs the tasks of one stage sent over `connection`, returning once the coordinator is done.
+def serve(connection, name: str, slots: int, make_engine) -> None:
+    _, context = connection.recv()
+    lock = threading.Lock()
+    stopped = threading.Event()
+
+    def send(message: tuple) -> None:
+        with lock:
+            if message[0] == 'result':
+                message = (*message, metrics.REGISTRY.take())
+            try:
+                connection.send(message)
+            except OSError:
+                # The coordinator is gone, which the receiving thread finds out as well.
+                stopped.set()
+
+    def heartbeat() -> None:
+        while not stopped.wait(HEARTBEAT_INTERVAL):
+            send(('heartbeat',))
+
+    with make_engine(*context) as engine:
+        send((name, slots))
+        threading.Thread(target=heartbeat, daemon=True).start()
+        try:
+            while True:
+                message = connection.recv()
+                if message[0] == 'done':
+                    logging.info('triage coordinator is done')
+                    return
+                for task_id, function, args in message[1]:
+                    engine.apply_async(function, args,
+                                       callback=lambda result, task_id=task_id: send(('result', task_id, result, None)),
+                                       error_callback=lambda e, task_id=task_id: send(('result', task_id, None,
+                                                                                       remote_error(e))))
+        finally:
+            stopped.set()
+
+
+# Returns `error` if it can be pickled, or a RuntimeError describing it otherwise.
+def remote_error(error: Exception) -> Exception:
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return RuntimeError(repr(error))
@@ -0,0 +1,62 @@
+import logging
+import math
+
+from common.confighelper import ConfigHelper
+
+
+class CrashBuckets:
+    """Crash seeds grouped by benchmark, sanitizer report signature and triggers.
+
+    Seeds of a bucket are expected to have the same crash sets. Crash sets are only searched for the representatives
+    of each bucket and a sample of the other seeds to verify them. Once all of them are searched, the other seeds
+    take their crash sets if they agree, or are searched as well otherwise. Hangs and seeds without a signature, e.g.
+    seeds reusing the logs of a queue seed, are buckets of their own.
+    """
+
+    def __init__(self, tasks: list, logs: dict, trials: list, helper: ConfigHelper):
+        buckets = {}
+        for task in tasks:
+            _, triggers, signature, hang = logs[task.content_id]
+            if helper.bucket_crashes() and signature is not None and not hang:
+                key = (trials[task.trial_id][0], signature, tuple(triggers))
+            else:
+                key = task.content_id
+            buckets.setdefault(key, []).append(task)
+        # Maps content ids of searched seeds to their bucket.
+        self.__bucket_of = {}
+        self.__searched = []
+        num_propagated = 0
+        for bucket_tasks in buckets.values():
+            # Ordered by content hash, so that the verified sample does not depend on fuzzers or trials.
+            bucket_tasks.sort(key=lambda task: task.hash)
+            num_representatives = helper.bucket_representatives()
+            num_verified = math.ceil((len(bucket_tasks) - num_representatives) * helper.bucket_verify_ratio())
+            searched = bucket_tasks[:num_representatives + max(num_verified, 0)]
+            bucket = {'pending': len(searched), 'crashes': set(), 'others': bucket_tasks[len(searched):]}
+            for task in searched:
+                self.__bucket_of[task.content_id] = bucket
+            self.__searched.extend(searched)
+            num_propagated += len(bucket['others'])
+        logging.info(f'bucketed {len(tasks)} crash contents into {len(buckets)} buckets, searching crash sets of '
+                     f'{len(self.__searched)} for the other {num_propagated} to take')
+
+    def searched_tasks(self) -> list:
+        return self.__searched
+
+    # Records the crash sets of a searched seed. Once all searched seeds of its bucket are done, returns the other
+    # seeds with the crash sets they take, and the seeds which need to be searched since the searched ones disagree.
+    def finish(self, content_id: int, crashes: tuple) -> tuple:
+        bucket = self.__bucket_of.pop(content_id, None)
+        # Seeds searched after a disagreement have no bucket.
+        if bucket is None:
+            return [], []
+        bucket['pending'] -= 1
+        bucket['crashes'].add(crashes)
+        if bucket['pending'] > 0:
+            return [], []
+        if len(bucket['crashes']) == 1:
+            return [(task, crashes) for task in bucket['others']], []
+        logging.warning(f'crash seeds with the same signature and triggers have different crash sets '
+                        f'{[list(crashes) for crashes in bucket["crashes"]]}, searching the other '
+                        f'{len(bucket["others"])} seeds')
+        return [], bucket['others']
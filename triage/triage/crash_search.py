@@ -0,0 +1,151 @@
+import itertools
+import math
+
+# Searches below are generators which yield lists of subsets of triggers to run and receive whether each of them
+# crashes the program with only its injections turned on. Subsets yielded together are independent of each other,
+# so they can be run in parallel. Searches return their results when they stop.
+
+
+# Searches the minimal crash sets of `triggers` with at most `level` injections.
+# Returns the crash sets, sorted by size then injection ids, and the number of subsets run.
+# `adaptive` narrows down crash sets by group testing, `exhaustive` runs combinations of triggers one size after another,
+# and `verify` runs both and returns the exhaustive results.
+# The adaptive search only finds the exhaustive results if turning on more injections never stops a crash. In `adaptive`
+# mode, the exhaustive search takes over when the runs contradict this: all triggers together do not crash, a crash set
+# found does not crash, or a set crashes while one of its supersets does not. Runs of the adaptive search do not cover
+# every subset, so it can still miss crash sets of seeds which do not contradict it. Seeds with at most `level`
+# triggers are searched exhaustively in `adaptive` mode, which takes at most 2^level - 1 runs.
+def find_crash_sets(triggers: list, level: int, mode: str):
+    cache = {}
+    if mode == 'exhaustive' or (mode == 'adaptive' and len(triggers) <= level):
+        crash_sets = yield from cached(exhaustive_search(triggers, level), cache)
+        return crash_sets, len(cache)
+    crash_sets = yield from cached(adaptive_search(triggers, level), cache)
+    if mode == 'adaptive':
+        # Crash sets narrowed down without running them are run now.
+        reproduced = yield from cached(run_subsets([frozenset(crashset) for crashset in crash_sets]), cache)
+        if not all(reproduced) or not cache.get(frozenset(triggers), True) or not monotone(cache):
+            crash_sets = yield from cached(exhaustive_search(triggers, level), cache)
+        return crash_sets, len(cache)
+    if mode == 'verify':
+        # Subsets already run by the adaptive search are not run again.
+        exhaustive_sets = yield from cached(exhaustive_search(triggers, level), cache)
+        if crash_sets != exhaustive_sets:
+            raise CrashSearchMismatch(crash_sets, exhaustive_sets, len(cache))
+        return exhaustive_sets, len(cache)
+    return crash_sets, len(cache)
+
+
+class CrashSearchMismatch(Exception):
+    """The adaptive search found different crash sets than the exhaustive search in `verify` mode."""
+
+    def __init__(self, adaptive_sets: tuple, exhaustive_sets: tuple, executions: int):
+        super().__init__(f'adaptive search found {list(adaptive_sets)}, exhaustive search found {list(exhaustive_sets)}')
+        self.exhaustive_sets = exhaustive_sets
+        self.executions = executions
+
+
+# Runs `search` with each subset run only once, recording results in `cache`.
+# Yields the subsets as sorted tuples.
+def cached(search, cache: dict):
+    try:
+        subsets = next(search)
+        while True:
+            uncached = list(dict.fromkeys(subset for subset in subsets if subset not in cache))
+            if uncached:
+                results = yield [tuple(sorted(subset)) for subset in uncached]
+                cache.update(zip(uncached, results))
+            subsets = search.send([cache[subset] for subset in subsets])
+    except StopIteration as e:
+        return e.value
+
+
+# Runs `subsets` together and returns whether each of them crashed.
+def run_subsets(subsets: list):
+    crashed = yield subsets
+    return crashed
+
+
+# Returns whether no set in `cache`, mapping sets to whether they crashed, crashed while one of its supersets did not.
+def monotone(cache: dict) -> bool:
+    crashing = [subset for subset, crash in cache.items() if crash]
+    return not any(not crash and subset > crashset for subset, crash in cache.items() for crashset in crashing)
+
+
+# Finds min crash sets by iterating the power set of triggers up to `level` injections.
+# All sets of the same size are run together, as none of them can be a superset of another.
+def exhaustive_search(triggers: list, level: int):
+    min_crashsets = []
+    for n in range(1, min(len(triggers), level) + 1):
+        # Skip if current set is superset of a crash set.
+        currsets = [frozenset(currset) for currset in itertools.combinations(triggers, n)
+                    if not any(set(currset).issuperset(crashset) for crashset in min_crashsets)]
+        crashed = yield currsets
+        min_crashsets.extend(tuple(sorted(currset)) for currset, crash in zip(currsets, crashed) if crash)
+    return tuple(sorted(min_crashsets, key=lambda crashset: (len(crashset), crashset)))
+
+
+# Finds min crash sets by group testing, assuming that turning on more injections never stops a crash.
+# If a set of injections does not crash, none of its subsets is run. Otherwise one min crash set within it is
+# narrowed down by halving, and every other min crash set misses at least one of its injections, so the search
+# continues on the set without each of them. Sets on the same search depth are run together.
+def adaptive_search(triggers: list, level: int):
+    found = set()
+    searched = set()
+    universes = [frozenset(triggers)]
+    while universes:
+        expanded = []
+        unknown = []
+        for universe in dict.fromkeys(universes):
+            # Running no injections does not crash, which callers check first.
+            if universe in searched or not universe:
+                continue
+            known = next((crashset for crashset in found if crashset <= universe), None)
+            if known is not None:
+                expanded.append((universe, known))
+            else:
+                unknown.append(universe)
+        crashed = (yield unknown) if unknown else []
+        crashing = [universe for universe, crash in zip(unknown, crashed) if crash]
+        if crashing:
+            # Only one crash set is narrowed down at a time, since the other crashing sets mostly contain it.
+            # They are searched again on the next depth, where their results are already known.
+            crashset = frozenset((yield from narrow_down(frozenset(), sorted(crashing[0]), False)))
+            found.add(crashset)
+            expanded.append((crashing[0], crashset))
+        searched.update(universe for universe, _ in expanded)
+        universes = [universe - {injection} for universe, crashset in expanded for injection in sorted(crashset)]
+        universes.extend(crashing[1:])
+    return tuple(sorted((tuple(sorted(crashset)) for crashset in found if len(crashset) <= level),
+                        key=lambda crashset: (len(crashset), crashset)))
+
+
+# Returns a min subset of `candidates` which crashes together with `base`, given that `base` with all candidates
+# crashes (QuickXplain). `check_base` tells whether `base` alone has to be run first.
+def narrow_down(base: frozenset, candidates: list, check_base: bool):
+    if check_base:
+        crashed = yield [base]
+        if crashed[0]:
+            return []
+    if len(candidates) == 1:
+        return candidates
+    first, second = candidates[:len(candidates) // 2], candidates[len(candidates) // 2:]
+    second_part = yield from narrow_down(base | set(first), second, True)
+    first_part = yield from narrow_down(base | set(second_part), first, len(second_part) > 0)
+    return first_part + second_part
+
+
+# Returns the number of subsets the exhaustive search runs to find `crash_sets` among `num_triggers` triggers.
+# Sets of `n` injections are run unless they contain a smaller crash set, counted by inclusion-exclusion.
+def exhaustive_executions(num_triggers: int, crash_sets: list, level: int) -> int:
+    executions = 0
+    for n in range(1, min(num_triggers, level) + 1):
+        smaller = [set(crashset) for crashset in crash_sets if len(crashset) < n]
+        skipped = 0
+        for k in range(1, len(smaller) + 1):
+            for group in itertools.combinations(smaller, k):
+                union = len(set().union(*group))
+                if union <= n:
+                    skipped += (-1) ** (k + 1) * math.comb(num_triggers - union, n - union)
+        executions += math.comb(num_triggers, n) - skipped
+    return executions
@@ -1,77 +1,66 @@
-import os
-import re
 import logging
 
 from common.confighelper import ConfigHelper
+from common.fuzzers import FuzzerAdapter, fuzzer_adapter
+from common.seed_source import trial_seed_source
 
-CORPUS_QUEUE_STORE = {'aflplusplus': ['default/queue'],
-                      'afl': ['queue'],
-                      'libfuzzer': ['corpus'],
-                      'eclipser': ['afl-worker/queue', 'eclipser_output/queue'],
-                      'fairfuzz': ['queue']}
-CORPUS_CRASH_STORE = {'aflplusplus': ['default/crashes'],
-                      'afl': ['crashes'],
-                      'libfuzzer': ['crashes'],
-                      'eclipser': ['afl-worker/crashes', 'eclipser_output/crashes'],
-                      'fairfuzz': ['crashes']}
 
-# Returns seeds organized by trial.
-def get_seeds(seed_type: str, helper: ConfigHelper) -> list:
+# Yields (benchmark, fuzzer, trial) and the seeds of each trial, except for trials in `skip_trials`.
+# Seeds are yielded as soon as their trial is enumerated, so consumers can start triage before all trials are listed.
+def get_seeds(seed_type: str, helper: ConfigHelper, skip_trials: set = frozenset()):
     logging.info('extracting seeds from FuzzBench results')
-    seeds = []
-    # TODO: Make `corpus_store` configurable to ease the trouble of extending more fuzzers.
-    corpus_store = CORPUS_QUEUE_STORE if seed_type == 'queue' else CORPUS_CRASH_STORE
     for benchmark in helper.benchmarks():
         for fuzzer in helper.fuzzers():
+            adapter = fuzzer_adapter(fuzzer)
             trials = helper.trials(benchmark, fuzzer)
             if len(trials) != helper.num_trials():
                 logging.warning(f'{benchmark}-{fuzzer}: config file specifies {helper.num_trials()} trials '
                                 f'but the experiment has {len(trials)}')
             for trial in trials:
-                queues = corpus_store[fuzzer]
-                trial_seeds = []
-                for queue in queues:
-                    queue_dir = os.path.join(helper.trial_data_dir(benchmark, fuzzer, trial), queue)
-                    if not os.path.exists(queue_dir):
-                        logging.warning(f'{benchmark}-{fuzzer}-{trial}: queue directory does not exist {queue_dir}')
-                        continue
-                    for seed_name in os.listdir(queue_dir):
-                        file_path = os.path.join(queue_dir, seed_name)
-                        # TODO: Make following checks configurable.
-                        if seed_name == 'README.txt' or os.path.isdir(file_path):
-                            continue
-                        if fuzzer == 'libfuzzer' and seed_type == 'crash' \
-                                and not seed_name.startswith('oom') and not seed_name.startswith('crash'):
-                            continue
-        
-                        seed = {'path': file_path, 'type': seed_type,
-                                'benchmark': benchmark, 'fuzzer': fuzzer,
-                                'trial': trial}
-                        trial_seeds.append(seed)
-                        time_match = re.search(fr'time:(\d+)', seed_name)
-                        if time_match:
-                            if fuzzer == 'aflplusplus':
-                                seed['time'] = int(time_match.group(1)) / 1000
-                            else:
-                                logging.error(f'unsupported time in seed name with fuzzer {fuzzer}')
-                                exit(0)
-                        else:
-                            # Using mtime to represent the seed generation time. It may be inaccurate.
-                            seed['mtime'] = os.path.getmtime(file_path)
-                        id_match = re.search(fr'id:(\d+)', seed_name)
-                        # Re-index seeds generated by fuzzers with multiple queues.
-                        if id_match and len(queues) == 1:
-                            seed['id'] = int(id_match.group(1))
-                if len(trial_seeds) > 0 and ('id' not in trial_seeds[0] or 'mtime' in trial_seeds[0]):
-                    trial_seeds.sort(key=lambda x: x['mtime'])
-                    if 'id' not in trial_seeds[0]:
-                        for i in range(len(trial_seeds)):
-                            trial_seeds[i]['id'] = i
-                    if 'mtime' in trial_seeds[0]:
-                        init_time = trial_seeds[0]['mtime']
-                        for seed in trial_seeds:
-                            seed['time'] = seed['mtime'] - init_time
-                            # Delete the `mtime` entry.
-                            seed.pop('mtime')
-                seeds.extend(trial_seeds)
-    return seeds
+                if (benchmark, fuzzer, trial) not in skip_trials:
+                    yield (benchmark, fuzzer, trial), get_trial_seeds(benchmark, fuzzer, trial, seed_type, adapter,
+                                                                      helper)
+
+
+def get_trial_seeds(benchmark: str, fuzzer: str, trial: str, seed_type: str, adapter: FuzzerAdapter,
+                    helper: ConfigHelper) -> list:
+    source = trial_seed_source(benchmark, fuzzer, trial, helper)
+    seed_dirs = adapter.seed_dirs(seed_type)
+    trial_seeds = []
+    for seed_dir in seed_dirs:
+        if not source.has_dir(seed_dir):
+            logging.warning(f'{benchmark}-{fuzzer}-{trial}: queue directory does not exist {source.path(seed_dir)}')
+            continue
+        for entry in source.list_dir(seed_dir):
+            if not adapter.accepts(entry.name, seed_type):
+                continue
+            seed = {**source.seed_location(seed_dir, entry), 'type': seed_type,
+                    'benchmark': benchmark, 'fuzzer': fuzzer,
+                    'trial': trial, 'hash': entry.digest}
+            trial_seeds.append(seed)
+            seed_time = adapter.seed_time(entry.name)
+            if seed_time is not None:
+                seed['time'] = seed_time
+            else:
+                # Using mtime to represent the seed generation time. It may be inaccurate.
+                seed['mtime'] = entry.mtime
+            seed_id = adapter.seed_id(entry.name)
+            # Re-index seeds generated by fuzzers with multiple queues.
+            if seed_id is not None and len(seed_dirs) == 1:
+                seed['id'] = seed_id
+    # Seeds without a time in their name get the time of their mtime relative to the earliest one, so that all seeds
+    # of a trial can be sorted by time, even if only some of them have a time in their name.
+    mtimes = [seed['mtime'] for seed in trial_seeds if 'mtime' in seed]
+    if mtimes:
+        init_time = min(mtimes)
+        for seed in trial_seeds:
+            if 'mtime' in seed:
+                # Delete the `mtime` entry.
+                seed['time'] = seed.pop('mtime') - init_time
+    missing_ids = any('id' not in seed for seed in trial_seeds)
+    if mtimes or missing_ids:
+        trial_seeds.sort(key=lambda seed: seed['time'])
+        if missing_ids:
+            for i in range(len(trial_seeds)):
+                trial_seeds[i]['id'] = i
+    return trial_seeds
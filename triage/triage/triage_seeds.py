@@ -1,90 +1,775 @@
+import array
+import collections
 import json
 import os
 
+import asyncio
+import functools
 import logging
 import itertools
 import multiprocessing
+import queue
+import shutil
+import socket
+import threading
+import time
 import tqdm
 
 import common.paths
+import common.profiling
+import common.seed_source
 from common.confighelper import ConfigHelper
-import include.istarmap
+from common.utils import SANITIZER_PROFILES
 from triage.common.new_process import ProcessResult
-from triage.common.parse_log import parse_log
-from triage.common import new_process, sanitizer
+from triage.common.parse_log import LogParser, parse_signature
+from triage.common import async_executor, metrics, sanitizer
+from triage.common.async_executor import AsyncExecutor
+from triage.common.exec_cache import ExecCache, Execution, file_digest
+from triage.common.fork_server import ForkServer, ForkServerError
+from triage.common.metrics import MetricsExport
+from triage.common.timeouts import ExecutionTimeouts
+from triage.common.admission import AdmissionControl
+from triage.common.work_queue import Coordinator, run_worker
+from triage.crash_buckets import CrashBuckets
+from triage.crash_search import CrashSearchMismatch, exhaustive_executions, find_crash_sets
 from triage.get_seeds import get_seeds
+from triage.trial_stores import StoredSeeds, TriageJournal, TrialStores
 from triage.common.utils import UNIT_TIMEOUT, RSS_LIMIT_MB
 
+# A unit of triage work run by the workers of the execution engine.
+# `content_id` identifies the seed content within a stage and `trial_id` indexes the trial table of the workers.
+# `rel_path` is relative to the trial data dir, `offset` and `size` locate seeds read from corpus archives
+# (None for extracted seeds), `logs` holds (reaches, triggers, hang) of the content if already known, and `hash` is the
+# digest of the content. `path` is the file an archived seed was written to by the driver, if any.
+SeedTask = collections.namedtuple('SeedTask', ['content_id', 'trial_id', 'rel_path', 'offset', 'size', 'logs', 'hash',
+                                               'path'], defaults=(None,))
 
-def triage_seeds(helper: ConfigHelper, seed_type: str) -> None:
-    seeds = get_seeds(seed_type, helper)
-    logging.info(f'triage seeds on {len(seeds)} {seed_type} entries with {helper.cores()} parallel jobs')
-    multiprocessing.pool.Pool.istartmap = include.istarmap.istarmap
-    with multiprocessing.Pool(processes=helper.cores()) as p:
-        seeds = list(tqdm.tqdm(p.istartmap(triage_worker,
-                                           zip(seeds, itertools.repeat(helper), itertools.repeat(seed_type))),
-                               total=len(seeds)))
-    logging.info(f'store {seed_type} seeds to parsed_seeds')
 
-    # seeds is contiguous w.r.t (fuzzer, benchmark).
-    for k, v in itertools.groupby(seeds, lambda x: (x['benchmark'], x['fuzzer'], x['trial'])):
-        with open(helper.parsed_seeds_store(k[0], k[1], k[2], seed_type), 'w+') as f:
-            json.dump(list(v), f, indent=2)
+# Tasks listed ahead of the results per core, which bounds the queue seeds held in memory.
+TASK_WINDOW = 256
 
 
-def triage_worker(seed: dict, helper: ConfigHelper, seed_type: str) -> dict:
-    worker_name = multiprocessing.current_process().name
-    common.paths.mkdir(helper.tmp_running_dir(worker_name))
-    seed_env = os.environ.copy()
-    sanitizer.set_sanitizer_options(seed_env)
+# Triages the seeds of `seed_type` of all trials and writes them to their parsed_seeds stores. With `resume`, the
+# results of an interrupted triage are kept. With `incremental`, seeds whose trial store has a seed with the same
+# path and content keep its result, and only new or changed seeds are triaged.
+def triage_seeds(helper: ConfigHelper, seed_type: str, resume: bool = False, incremental: bool = False) -> None:
+    trials = trial_table(helper)
+    journal = TriageJournal(helper.triage_journal(seed_type), resume, helper, seed_type)
+    stores = TrialStores(helper, seed_type, journal)
+    stored = StoredSeeds(helper, seed_type, incremental)
+    trial_iter = get_seeds(seed_type, helper, journal.trials)
+    known_logs = {}
+    total = None
+    window = None
+    if seed_type == 'crash':
+        # Crash seeds are few, so they are listed upfront to look up queue seeds with the same content.
+        trial_iter = list(trial_iter)
+        wanted = {(seed['benchmark'], seed['hash']) for _, trial_seeds in trial_iter for seed in trial_seeds}
+        known_logs = queue_logs(wanted, helper)
+        reused = {(seed['benchmark'], seed['hash']) for trial, trial_seeds in trial_iter for seed in trial_seeds
+                  if stored.result(trial, seed) is not None}
+        total = len(wanted.difference(journal.contents, reused))
+    else:
+        # Released for each result, so that listing seeds stays a bounded number of tasks ahead of triage.
+        window = threading.BoundedSemaphore(TASK_WINDOW * helper.cores())
+    tasks = seed_tasks(trial_iter, trials, stores, journal, stored, known_logs, window, helper, seed_type)
+    logging.info(f'triage {seed_type} seeds with {helper.cores()} parallel jobs')
+    digests = binary_digests(helper) if helper.exec_cache() else {}
+    metrics.REGISTRY.start_stage(seed_type, len(trials) - len(journal.trials), total)
+    with MetricsExport(helper), execution_engine(helper, trials, digests) as engine:
+        if seed_type == 'crash':
+            result_iter = triage_crash_seeds(tasks, trials, engine, helper)
+        elif helper.batch_size() > 1 and not helper.fork_server():
+            result_iter = itertools.chain.from_iterable(
+                engine.imap_unordered(triage_batch, batches(tasks, trials, helper.batch_size())))
+        else:
+            result_iter = engine.imap_unordered(triage_task, tasks)
+        # Queue seeds stream into the execution engine while later trials are still being enumerated, and each
+        # trial is stored as soon as all of its seeds are triaged.
+        for content_id, reaches, triggers, crashes, executions, hang in tqdm.tqdm(result_iter, total=total):
+            stores.add_result(content_id, [reaches.tolist(), triggers.tolist(),
+                                           None if crashes is None else [list(crashset) for crashset in crashes],
+                                           None if executions is None else list(executions), hang])
+            metrics.REGISTRY.update_stage(seed_type, done=1)
+            if window is not None:
+                window.release()
+        metrics.REGISTRY.finish_stage(seed_type)
+    journal.close()
+    logging.info(f'triaged {stores.num_contents} unique contents and stored {stores.num_seeds} {seed_type} seeds '
+                 f'to parsed_seeds')
+
+
+# Returns (benchmark, fuzzer, trial name, corpus archive) of all trials, which pool workers receive once.
+# The corpus archive is None for trials extracted to disk.
+def trial_table(helper: ConfigHelper) -> list:
+    trials = []
+    for benchmark in helper.benchmarks():
+        for fuzzer in helper.fuzzers():
+            for trial in helper.trials(benchmark, fuzzer):
+                archive = None
+                if os.path.exists(helper.seed_index_file(benchmark, fuzzer, trial)):
+                    archive = helper.catalog().latest_archive(benchmark, fuzzer, trial)['path']
+                trials.append((benchmark, fuzzer, trial, archive))
+    return trials
+
+
+# Adds the seeds of each trial of `trial_iter` to `stores` and yields a task for the first seed of each content per
+# benchmark. Seeds with the same content on the same benchmark behave the same, so only one of them is executed.
+# Contents with results in `journal` or `stored` are not executed again. If set, `window` is acquired for each task.
+# Listed trials and tasks are counted towards the progress of `stage`.
+def seed_tasks(trial_iter, trials: list, stores: TrialStores, journal: TriageJournal, stored: StoredSeeds,
+               known_logs: dict, window: threading.BoundedSemaphore, helper: ConfigHelper, stage: str):
+    trial_ids = {trial[:3]: i for i, trial in enumerate(trials)}
+    # Maps (benchmark, hash) of each seed content of the current benchmark to its content id.
+    contents = {}
+    num_contents = 0
+    # Numbers of seeds listed and of seeds keeping their stored result.
+    num_seeds = 0
+    num_reused = 0
+    benchmark = None
+    for trial, trial_seeds in trial_iter:
+        if trial[0] != benchmark:
+            if benchmark is not None:
+                stores.benchmark_listed(benchmark)
+            # Contents are only shared within a benchmark.
+            benchmark = trial[0]
+            contents = {}
+        trial_id = trial_ids[trial]
+        trial_dir = helper.trial_data_dir(*trial)
+        content_ids = []
+        new_tasks = []
+        for seed in trial_seeds:
+            key = (seed['benchmark'], seed['hash'])
+            stored_result = stored.result(trial, seed)
+            num_seeds += 1
+            num_reused += stored_result is not None
+            if key not in contents:
+                contents[key] = num_contents
+                num_contents += 1
+                result = journal.contents.pop(key, None)
+                stores.add_content(contents[key], *key, stored_result if result is None else result)
+                if not stores.has_result(contents[key]):
+                    if seed.get('archive') != trials[trial_id][3]:
+                        # Raised instead of exiting, as this runs in the task feeding thread of the execution engine.
+                        raise RuntimeError(f'{"-".join(trial)}: the corpus archive changed since the last setup, '
+                                           f'rerun setup first')
+                    new_tasks.append(SeedTask(contents[key], trial_id, seed['path'][len(trial_dir) + 1:],
+                                              seed.get('offset'), seed.get('size'), known_logs.get(key), seed['hash']))
+            content_ids.append(contents[key])
+        # Archived seeds are run in the order of their members, so that workers read archives front to back.
+        new_tasks.sort(key=lambda task: task.offset or 0)
+        # The trial is added before its tasks, so that it is waiting for their results.
+        stores.add_trial(trial, trial_seeds, content_ids)
+        metrics.REGISTRY.update_stage(stage, trials_listed=1, listed=len(new_tasks))
+        for task in new_tasks:
+            if window is not None:
+                window.acquire()
+            yield task
+    if benchmark is not None:
+        stores.benchmark_listed(benchmark)
+    if stored.enabled:
+        logging.info(f'incremental triage keeps the stored results of {num_reused} of {num_seeds} seeds')
+
+
+# Groups consecutive tasks of the same benchmark into lists of at most `batch_size` tasks.
+def batches(tasks, trials: list, batch_size: int):
+    batch = []
+    for task in tasks:
+        if batch and (len(batch) == batch_size or trials[batch[0].trial_id][0] != trials[task.trial_id][0]):
+            yield batch
+            batch = []
+        batch.append(task)
+    if batch:
+        yield batch
+
+
+# Returns the digests of the triage binaries of all benchmarks, which key cached executions.
+def binary_digests(helper: ConfigHelper) -> dict:
+    return {benchmark: file_digest(helper.benchmark_triage_binary(benchmark)) for benchmark in helper.benchmarks()}
+
+
+# Returns reaches and triggers of queue seeds with the given (benchmark, hash) contents.
+# Crash seeds with the same content as a queue seed reuse them and skip the logging execution.
+def queue_logs(wanted: set, helper: ConfigHelper) -> dict:
+    logs = {}
+    for benchmark in helper.benchmarks():
+        for fuzzer in helper.fuzzers():
+            for trial in helper.trials(benchmark, fuzzer):
+                store = helper.parsed_seeds_store(benchmark, fuzzer, trial, 'queue')
+                if not os.path.exists(store):
+                    continue
+                with open(store, 'r') as f:
+                    for seed in json.load(f):
+                        if (benchmark, seed.get('hash')) in wanted:
+                            logs[(benchmark, seed['hash'])] = (seed['reaches'], seed['triggers'],
+                                                               seed.get('hang', False))
+    logging.info(f'reuse logs of {len(logs)} queue seeds for crash seeds with the same content')
+    return logs
+
+
+# Returns the engine running the coroutine functions below, with `WorkerState` as their first argument.
+def execution_engine(helper: ConfigHelper, trials: list, binary_digests: dict):
+    if helper.execution_engine() == 'distributed':
+        return Coordinator(helper.coordinator_address(), helper.coordinator_key(), helper.lease_timeout(),
+                           (trials, binary_digests))
+    return local_engine(helper, trials, binary_digests, 'slot', helper.exec_cache_file())
+
+
+# Returns the engine running tasks on this host, with tmp dirs named after `name` and executions cached in
+# `exec_cache_file`.
+def local_engine(helper: ConfigHelper, trials: list, binary_digests: dict, name: str, exec_cache_file: str):
+    timeouts = ExecutionTimeouts(helper, binary_digests, exec_cache_file)
+    if helper.execution_engine() == 'pool':
+        # Each pool worker adapts its own copy of the timeouts and admits its own executions.
+        return PoolEngine(helper, trials, binary_digests, exec_cache_file, timeouts, name)
+    admission = AdmissionControl(helper)
+    return AsyncExecutor([WorkerState(helper, trials, binary_digests, exec_cache_file, timeouts, admission,
+                                      f'{name}-{i}') for i in range(helper.cores())], close_worker)
+
+
+# Runs a worker-only process of distributed triage, which runs the tasks of the coordinator at coordinatorAddress
+# with `cores` slots until the coordinator is gone. Workers of a host share their own execution cache, as SQLite
+# databases cannot be shared by hosts over a network file system.
+def triage_worker(helper: ConfigHelper) -> None:
+    host = socket.gethostname()
+    name = f'{host}-{os.getpid()}'
+    run_worker(helper.coordinator_address(), helper.coordinator_key(), name, helper.cores(),
+               functools.partial(local_engine, helper, name=f'worker-{name}',
+                                 exec_cache_file=helper.exec_cache_file(host)))
+
+
+class WorkerState:
+    """State shared by all tasks of a pool worker or a slot of the async executor, which run one task at a time."""
+
+    def __init__(self, helper: ConfigHelper, trials: list, binary_digests: dict, exec_cache_file: str,
+                 timeouts: ExecutionTimeouts, admission: AdmissionControl, name: str):
+        self.helper = helper
+        # Names the tmp dir and the trace track of the worker.
+        self.name = name
+        self.trials = trials
+        # Maps benchmarks to the digest of their triage binary, empty if executions are not cached.
+        self.binary_digests = binary_digests
+        self.timeouts = timeouts
+        self.admission = admission
+        self.exec_cache = ExecCache(exec_cache_file) if binary_digests else None
+        self.tmp_dir = helper.tmp_running_dir(name)
+        common.paths.mkdir(self.tmp_dir)
+        # Maps sanitizer profiles to the environment of triage binaries.
+        self.envs = {}
+        for profile in SANITIZER_PROFILES:
+            self.envs[profile] = os.environ.copy()
+            sanitizer.set_sanitizer_options(self.envs[profile], profile=profile)
+        # Turned off when the triage binaries do not print batch markers.
+        self.batch_supported = True
+        # Maps names of files in `tmp_dir` to (trial id, offset) of the archived seeds they hold.
+        self.seed_files = {}
+        # Reader of the corpus archive this worker last read a seed from.
+        self.archive_reader = None
+        # Maps (benchmark, sanitizer profile) to the fork server of the triage binary, or None if it has no fork
+        # server.
+        self.fork_servers = {}
+
+
+class PoolEngine:
+    """Runs the coroutine functions of `AsyncExecutor` tasks in pool workers, each with its own event loop.
+
+    Logs are then parsed in parallel by the workers, which pays off for seeds logging more than the main process
+    can parse.
+    """
+
+    def __init__(self, helper: ConfigHelper, trials: list, binary_digests: dict, exec_cache_file: str,
+                 timeouts: ExecutionTimeouts, name: str):
+        self.__pool = multiprocessing.Pool(processes=helper.cores(), initializer=init_worker,
+                                           initargs=(helper, trials, binary_digests, exec_cache_file, timeouts, name,
+                                                     common.profiling.profile_dir()))
+
+    def apply_async(self, function, args: tuple = (), callback=None, error_callback=None) -> None:
+        self.__pool.apply_async(pool_worker, (function, *args), error_callback=error_callback,
+                                callback=lambda output: None if callback is None else callback(pool_result(output)))
+
+    def imap_unordered(self, function, iterable):
+        # Items are listed by the feeding thread of `async_executor.imap_unordered` rather than the task handler
+        # thread of the pool, so that listing them is profiled.
+        return async_executor.imap_unordered(self.apply_async, function, iterable)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args) -> None:
+        if exc_type is not None:
+            self.__pool.terminate()
+            return
+        # Workers exit once they are done, running their finalizers, e.g. to write profiles.
+        self.__pool.close()
+        self.__pool.join()
+
+
+# Set by `init_worker` in each pool worker.
+_worker = None
+_loop = None
+
+
+def init_worker(helper: ConfigHelper, trials: list, binary_digests: dict, exec_cache_file: str,
+                timeouts: ExecutionTimeouts, name: str, profile_dir: str) -> None:
+    global _worker, _loop
+    _worker = WorkerState(helper, trials, binary_digests, exec_cache_file, timeouts, AdmissionControl(helper),
+                          f'{name}-{multiprocessing.current_process().name}')
+    _loop = asyncio.new_event_loop()
+    common.profiling.start_worker(profile_dir, _worker.name)
+    # Records of the parent process were copied by fork and are not this worker's.
+    metrics.REGISTRY.take()
+
+
+# Returns the result of `function` along with the metrics it recorded and the time it was sent back.
+def pool_worker(function, *args):
+    return (common.profiling.sampled(_loop.run_until_complete, function(_worker, *args)), metrics.REGISTRY.take(),
+            time.time())
+
+
+# Adds the metrics of the output of `pool_worker` to those of this process and returns its result.
+def pool_result(output: tuple):
+    result, records, sent = output
+    metrics.REGISTRY.merge(records)
+    metrics.REGISTRY.observe('triage_ipc_seconds', max(time.time() - sent, 0), engine='pool')
+    return result
+
+
+# Closes the fork servers and the archive reader of `worker`.
+async def close_worker(worker: WorkerState) -> None:
+    for server in worker.fork_servers.values():
+        if server is not None:
+            await server.close()
+    if worker.archive_reader is not None:
+        worker.archive_reader.close()
+
+
+# Returns (content id, reaches, triggers, crashes, executions, hang) of the queue seed of `task`.
+# `crashes` and `executions` are only set for crash seeds, and `hang` tells whether the seed timed out.
+async def triage_task(worker: WorkerState, task: SeedTask) -> tuple:
     # Turn on logging of all injections.
-    seed_env["FIXREVERTER"] = 'off '
+    execution = await run_task(worker, task, 'off ', worker.helper.sanitizer_profile())
+    return (task.content_id, array.array('i', execution.reaches), array.array('i', execution.triggers), None, None,
+            execution.timed_out)
+
+
+# Runs the seed of `task` with FIXREVERTER set to `fixreverter` and the sanitizer options of `profile`, unless the
+# execution is cached.
+async def run_task(worker: WorkerState, task: SeedTask, fixreverter: str, profile: str) -> Execution:
+    benchmark = worker.trials[task.trial_id][0]
+    execution = cached_execution(worker, task, fixreverter, profile)
+    if execution is not None:
+        metrics.REGISTRY.count('triage_cached_executions_total', benchmark=benchmark)
+        return execution
+    seed_path = await seed_file(worker, task)
+    log_parser = LogParser()
+    async with worker.admission.admit(benchmark):
+        with common.profiling.span('execute', worker.name, benchmark=benchmark, seed=task.rel_path,
+                                   fixreverter=fixreverter, profile=profile) as span_args:
+            start = time.monotonic()
+            res = await run_seed(worker, benchmark, seed_path, fixreverter, profile, log_parser)
+            duration = time.monotonic() - start
+            span_args['retcode'] = res.retcode
+    count_execution(benchmark, res, duration)
+    if not res.timed_out:
+        worker.timeouts.add(benchmark, profile, duration)
+    if res.max_rss_mb is not None:
+        worker.admission.add(benchmark, res.max_rss_mb)
+    signature = parse_signature(log_parser.output, worker.helper.bucket_frames()) if res.retcode else None
+    execution = Execution(res.retcode, res.timed_out, *log_parser.log(), duration, signature)
+    cache_execution(worker, task, fixreverter, profile, execution)
+    return execution
+
+
+def count_execution(benchmark: str, res: ProcessResult, duration: float) -> None:
+    metrics.REGISTRY.count('triage_executions_total', benchmark=benchmark,
+                           result=metrics.retcode_class(res.retcode, res.timed_out))
+    metrics.REGISTRY.observe('triage_execution_seconds', duration, benchmark=benchmark)
+
+
+def cached_execution(worker: WorkerState, task: SeedTask, fixreverter: str, profile: str):
+    if worker.exec_cache is None:
+        return None
+    return worker.exec_cache.get(worker.binary_digests[worker.trials[task.trial_id][0]], task.hash, fixreverter,
+                                 profile)
+
+
+def cache_execution(worker: WorkerState, task: SeedTask, fixreverter: str, profile: str,
+                    execution: Execution) -> None:
+    if worker.exec_cache is not None:
+        worker.exec_cache.put(worker.binary_digests[worker.trials[task.trial_id][0]], task.hash, fixreverter,
+                              profile, execution)
+
+
+# Yields (content id, reaches, triggers, crashes, executions, hang) of the crash seeds of `tasks`.
+# All crash seeds are first run with logging of all injections. Crash sets are then searched for the seeds chosen by
+# `CrashBuckets`, and the other seeds of their buckets take the crash sets found.
+def triage_crash_seeds(tasks, trials: list, engine, helper: ConfigHelper):
+    runner = SearchRunner(engine)
+    # Numbers of seeds and runs validating the sanitizer profile of searches, and of runs it classifies differently.
+    validation = collections.Counter()
+    tasks = write_archived_seeds(list(tasks), trials, helper)
+    # Maps content ids to (reaches, triggers, signature, hang).
+    logs = {}
+    for task in tasks:
+        # Crash seeds may already carry the logs of a queue seed with the same content.
+        if task.logs is None:
+            runner.add(task, logging_run())
+        else:
+            reaches, triggers, hang = task.logs
+            logs[task.content_id] = (reaches, triggers, None, hang)
+    for content_id, result in runner:
+        logs[content_id] = result
+    buckets = CrashBuckets(tasks, logs, trials, helper)
+    for task in buckets.searched_tasks():
+        runner.add(task, crash_seed_search(task, logs[task.content_id], trials, helper, validation))
+    for content_id, result in runner:
+        search_executions, exhaustive = result[4]
+        metrics.REGISTRY.observe('triage_crash_search_executions', search_executions, search=helper.crash_search())
+        metrics.REGISTRY.observe('triage_crash_search_executions', exhaustive, search='exhaustive')
+        yield result
+        propagated, unresolved = buckets.finish(content_id, result[3])
+        for task, crashes in propagated:
+            reaches, triggers, _, _ = logs[task.content_id]
+            yield (task.content_id, array.array('i', reaches), array.array('i', triggers), crashes,
+                   (0, exhaustive_executions(len(triggers), crashes, helper.comb_level())), False)
+        for task in unresolved:
+            runner.add(task, crash_seed_search(task, logs[task.content_id], trials, helper, validation))
+    if validation['seeds']:
+        logging.info(f'validated the {helper.sanitizer_profile()} sanitizer profile on {validation["seeds"]} crash '
+                     f'seeds: {validation["mismatches"]} of {validation["runs"]} runs crash with only one profile')
+
+
+class SearchRunner:
+    """Drives searches of seeds, which are generators yielding lists of (FIXREVERTER value, sanitizer profile) to run
+    their seed with.
+
+    Each run is submitted to the execution engine as a separate task, so that idle workers take over runs of seeds
+    with many triggers instead of waiting for one worker to search them all. Iterating the runner yields
+    (content id, result) of searches as they stop, until no search is left.
+    """
+
+    def __init__(self, engine):
+        self.__engine = engine
+        self.__finished = queue.Queue()
+        # Maps content ids to [search, task, results of pending runs, number of pending runs].
+        self.__searches = {}
+        # (content id, result) of searches which stopped.
+        self.__stopped = collections.deque()
+
+    def add(self, task: SeedTask, search) -> None:
+        self.__searches[task.content_id] = [search, task, None, 0]
+        self.__advance(task.content_id, None)
+
+    def __iter__(self):
+        while self.__searches or self.__stopped:
+            if self.__stopped:
+                yield self.__stopped.popleft()
+                continue
+            content_id, i, result, error = self.__finished.get()
+            if error is not None:
+                raise error
+            entry = self.__searches[content_id]
+            entry[2][i] = result
+            entry[3] -= 1
+            if entry[3] == 0:
+                self.__advance(content_id, entry[2])
+
+    # Sends `results` to the search of `content_id` and submits the runs it asks for.
+    def __advance(self, content_id: int, results) -> None:
+        search, task, _, _ = self.__searches[content_id]
+        try:
+            runs = search.send(results)
+        except StopIteration as e:
+            del self.__searches[content_id]
+            self.__stopped.append((content_id, e.value))
+            return
+        self.__searches[content_id] = [search, task, [None] * len(runs), len(runs)]
+        for i, (fixreverter, profile) in enumerate(runs):
+            self.__engine.apply_async(run_task, (task, fixreverter, profile),
+                                      callback=lambda result, i=i: self.__finished.put((content_id, i, result, None)),
+                                      error_callback=lambda e, i=i: self.__finished.put((content_id, i, None, e)))
+
+
+# Runs a crash seed with logging of all injections and returns its (reaches, triggers, signature, hang).
+# The run has the full sanitizer profile, whose symbolized report signs the crash.
+def logging_run():
+    [execution] = yield [('off ', 'full')]
+    return execution.reaches, execution.triggers, execution.signature, execution.timed_out
+
+
+# Searches the crash sets of the crash seed of `task` given its (reaches, triggers, signature, hang) `logs`, yielding
+# lists of (FIXREVERTER value, sanitizer profile) to run the seed with and receiving the executions of `run_task` for
+# them. Searches run with the sanitizer profile of the config, and the min crash sets found are confirmed with the
+# full profile. `validation` counts the runs of seeds sampled to validate the profile.
+# Returns (content id, reaches, triggers, crashes, executions, hang), where `executions` holds the subsets of
+# triggers run by the crash set search and by the exhaustive search, and `hang` tells whether the seed timed out on its
+# logging run or with no injections turned on.
+def crash_seed_search(task: SeedTask, logs: tuple, trials: list, helper: ConfigHelper,
+                      validation: collections.Counter):
+    trial = trials[task.trial_id][2]
+    reaches, triggers, _, logs_hang = logs
+    # Seeds timing out on their baseline run are quarantined as hangs without any further runs.
+    if logs_hang:
+        logging.debug(f'triage on trial {trial} is logging {task.rel_path} and it hangs')
+        return task.content_id, array.array('i', reaches), array.array('i', triggers), (), (0, 0), True
+    where = f'triage on trial {trial} running {task.rel_path}'
+    profile = helper.sanitizer_profile()
+    validate = profile != 'full' and validated_seed(task, helper)
+    if validate:
+        validation['seeds'] += 1
+    runs = functools.partial(profile_runs, profile=profile, validate=validate, where=where, validation=validation)
+    # Turn off logging of any injections.
+    [execution] = yield from runs(['on '])
+    non_inj_crashed = crashed(execution)
+    hang = execution.timed_out
+    # Hangs are kept out of the search, where every subset of triggers would hang as well.
+    if hang:
+        logging.debug(f'triage on trial {trial} is running {task.rel_path} and it hangs')
+        crashes, executions = (), (0, 0)
+    # This bug is not caused by FixReverter injections.
+    elif non_inj_crashed:
+        crashes, executions = (), (0, 0)
+    else:
+        logging.debug(f'triage on trial {trial} is running {task.rel_path} with triggers{triggers}')
+        search = find_crash_sets(triggers, helper.comb_level(), helper.crash_search())
+        try:
+            crashes, search_executions = yield from subset_runs(search, runs)
+        except CrashSearchMismatch as e:
+            logging.warning(f'{where}: {e}')
+            crashes, search_executions = e.exhaustive_sets, e.executions
+        if crashes and profile != 'full':
+            crashes = yield from confirmed_crash_sets(crashes, where)
+        logging.debug(f'triage on trial {trial} is running {task.rel_path} and get min sets {crashes}')
+        executions = (search_executions, exhaustive_executions(len(triggers), crashes, helper.comb_level()))
+    return task.content_id, array.array('i', reaches), array.array('i', triggers), crashes, executions, hang
+
+
+# Returns whether `execution` crashed. Executions that timed out were killed and did not crash.
+def crashed(execution: Execution) -> bool:
+    return execution.retcode != 0 and not execution.timed_out
+
+
+# Runs the subsets of triggers asked for by `search` with `runs` and sends back whether each of them crashes.
+def subset_runs(search, runs):
+    try:
+        subsets = next(search)
+        while True:
+            # Only turn on injections of each subset.
+            results = yield from runs(['on ' + ' '.join([str(i) for i in subset]) for subset in subsets])
+            subsets = search.send([crashed(execution) for execution in results])
+    except StopIteration as e:
+        return e.value
+
+
+# Runs the seed with each FIXREVERTER value of `fixreverters` and the sanitizer options of `profile`, returning the
+# executions. If `validate` is set, the runs are repeated with the full profile, warning when a run crashes with only
+# one of the profiles.
+def profile_runs(fixreverters: list, profile: str, validate: bool, where: str, validation: collections.Counter):
+    runs = [(fixreverter, profile) for fixreverter in fixreverters]
+    if not validate:
+        return (yield runs)
+    results = yield runs + [(fixreverter, 'full') for fixreverter in fixreverters]
+    for fixreverter, execution, full_execution in zip(fixreverters, results, results[len(fixreverters):]):
+        validation['runs'] += 1
+        if crashed(execution) != crashed(full_execution):
+            validation['mismatches'] += 1
+            logging.warning(f'{where}: FIXREVERTER={fixreverter!r} exits with {execution.retcode} with the {profile} '
+                            f'sanitizer profile and {full_execution.retcode} with the full profile')
+    return results[:len(fixreverters)]
+
+
+# Returns whether the searches of the seed of `task` validate the sanitizer profile. Seeds are sampled by content
+# hash, so that the sample does not depend on fuzzers or trials.
+def validated_seed(task: SeedTask, helper: ConfigHelper) -> bool:
+    return int(task.hash[:8], 16) < helper.sanitizer_validation_ratio() * 0x100000000
+
+
+# Runs each crash set of `crashes` with the full sanitizer profile and returns the ones that still crash.
+def confirmed_crash_sets(crashes: tuple, where: str):
+    results = yield [('on ' + ' '.join([str(i) for i in crashset]), 'full') for crashset in crashes]
+    confirmed = tuple(crashset for crashset, execution in zip(crashes, results) if crashed(execution))
+    if len(confirmed) < len(crashes):
+        logging.warning(f'{where}: crash sets {[crashset for crashset in crashes if crashset not in confirmed]} '
+                        f'do not crash with the full sanitizer profile and are dropped')
+    return confirmed
+
+
+# Writes the crash seeds of `tasks` read from corpus archives to files, reading each archive once in the order of its
+# members, and returns the tasks with the paths of their files. Runs of crash seeds are spread over all workers, which
+# would otherwise decompress the archive up to the seed for most runs.
+def write_archived_seeds(tasks: list, trials: list, helper: ConfigHelper) -> list:
+    archived = sorted((task for task in tasks if task.offset is not None),
+                      key=lambda task: (task.trial_id, task.offset))
+    if not archived:
+        return tasks
+    seed_dir = helper.tmp_running_dir('archived_seeds')
+    common.paths.rm_before_mkdir(seed_dir)
+    paths = {}
+    reader = None
+    for task in archived:
+        archive = trials[task.trial_id][3]
+        if reader is None or reader.archive != archive:
+            if reader is not None:
+                reader.close()
+            reader = common.seed_source.ArchiveReader(archive)
+        paths[task.content_id] = os.path.join(seed_dir, str(task.content_id))
+        with open(paths[task.content_id], 'wb') as f:
+            f.write(reader.read(task.offset, task.size))
+    reader.close()
+    return [task._replace(path=paths.get(task.content_id)) for task in tasks]
+
+
+# Returns the path of the seed of `task`, materializing seeds read from corpus archives to a per-worker file.
+async def seed_file(worker: WorkerState, task: SeedTask, file_name: str = 'seed') -> str:
+    benchmark, fuzzer, trial, archive = worker.trials[task.trial_id]
+    if task.path is not None:
+        return task.path
+    if task.offset is None:
+        return os.path.join(worker.helper.trial_data_dir(benchmark, fuzzer, trial), task.rel_path)
+    seed_path = os.path.join(worker.tmp_dir, file_name)
+    key = (task.trial_id, task.offset)
+    if worker.seed_files.get(file_name) != key:
+        # Seeds the worker holds in another file, e.g. seeds of a batch which are run again, are copied instead of
+        # read from the archive again, which would decompress it from the start.
+        source = next((os.path.join(worker.tmp_dir, name) for name, held in worker.seed_files.items() if held == key),
+                      None)
+        worker.seed_files.pop(file_name, None)
+        # Decompressing the archive runs in a thread, so that the event loop keeps serving the other workers.
+        await asyncio.get_running_loop().run_in_executor(None, write_seed_file, worker, archive, task, seed_path,
+                                                         source)
+        worker.seed_files[file_name] = key
+    return seed_path
+
+
+# Writes the seed of `task` to `seed_path`, copied from `source` if set, or read from `archive` otherwise.
+def write_seed_file(worker: WorkerState, archive: str, task: SeedTask, seed_path: str, source: str) -> None:
+    if source is not None:
+        shutil.copyfile(source, seed_path)
+        return
+    if worker.archive_reader is None or worker.archive_reader.archive != archive:
+        if worker.archive_reader is not None:
+            worker.archive_reader.close()
+        worker.archive_reader = common.seed_source.ArchiveReader(archive)
+    with open(seed_path, 'wb') as f:
+        f.write(worker.archive_reader.read(task.offset, task.size))
+
+
+# Triages queue seeds of the same benchmark with one triage binary invocation per batch.
+# When a seed crashes or hangs the binary, seeds that finished keep their logs, the seed that was running is
+# triaged alone, and the remaining seeds are run in a new batch.
+async def triage_batch(worker: WorkerState, tasks: list) -> list:
+    results = []
+    uncached = []
+    profile = worker.helper.sanitizer_profile()
+    for task in tasks:
+        execution = cached_execution(worker, task, 'off ', profile)
+        if execution is None:
+            uncached.append(task)
+        else:
+            metrics.REGISTRY.count('triage_cached_executions_total', benchmark=worker.trials[task.trial_id][0])
+            results.append((task.content_id, array.array('i', execution.reaches),
+                            array.array('i', execution.triggers), None, None, execution.timed_out))
+    tasks = uncached
+    while tasks:
+        if len(tasks) == 1 or not worker.batch_supported:
+            results.extend([await triage_task(worker, task) for task in tasks])
+            break
+        helper = worker.helper
+        benchmark = worker.trials[tasks[0].trial_id][0]
+        seed_env = dict(worker.envs[profile])
+        # Turn on logging of all injections.
+        seed_env["FIXREVERTER"] = 'off '
+        seed_env["FR_BATCH_MARKERS"] = '1'
+        args = [
+            helper.benchmark_triage_binary(benchmark),
+            f'-timeout={UNIT_TIMEOUT}',
+            f'-rss_limit_mb={RSS_LIMIT_MB}',
+            *[await seed_file(worker, task, f'seed-{i}') for i, task in enumerate(tasks)]
+        ]
+        # Seeds start at argv index 3.
+        first_arg = 3
+        log_parser = LogParser()
+        async with worker.admission.admit(benchmark):
+            with common.profiling.span('execute batch', worker.name, benchmark=benchmark,
+                                       seeds=len(tasks)) as span_args:
+                start = time.monotonic()
+                # Each seed of the batch gets the timeout of the benchmark.
+                res = await execute_seed(args, seed_env, worker.tmp_dir,
+                                         worker.timeouts.timeout(benchmark, profile) * len(tasks), log_parser)
+                span_args['retcode'] = res.retcode
+        count_execution(benchmark, res, time.monotonic() - start)
+        worker.admission.add(benchmark, res.max_rss_mb)
+        logs, running = log_parser.files, log_parser.running
+        if not log_parser.ready:
+            logging.warning(f'triage binary of benchmark {benchmark} does not support batch mode, '
+                            f'running one seed per invocation')
+            worker.batch_supported = False
+            continue
+        if running is not None:
+            # This seed crashed or hung the binary.
+            stop = running - first_arg
+        elif res.retcode == 0 and not res.timed_out:
+            # Seeds without logs after a complete run were skipped by the driver, e.g. empty files.
+            stop = len(tasks)
+        else:
+            # The binary died between seeds, so seeds after the last finished one may not have started.
+            stop = max(logs, default=first_arg - 1) - first_arg + 1
+        for i, task in enumerate(tasks[:stop]):
+            reaches, triggers = logs.get(i + first_arg, ([], []))
+            cache_execution(worker, task, 'off ', profile, Execution(0, False, reaches, triggers, None, None))
+            results.append((task.content_id, array.array('i', reaches), array.array('i', triggers), None, None, False))
+        tasks = tasks[stop:]
+        if tasks and (running is not None or stop == 0):
+            # Triages the seed that stopped the binary alone, which also guarantees progress.
+            results.append(await triage_task(worker, tasks[0]))
+            tasks = tasks[1:]
+    return results
+
+
+# Runs the triage binary of `benchmark` on `seed_path` with FIXREVERTER set to `fixreverter` and the sanitizer options
+# of `profile`, parsing its logs with `log_parser`. Uses the fork server of the binary if enabled, or a new process
+# per execution otherwise.
+async def run_seed(worker: WorkerState, benchmark: str, seed_path: str, fixreverter: str, profile: str,
+                   log_parser: LogParser) -> ProcessResult:
+    helper = worker.helper
+    server = await fork_server(worker, benchmark, profile)
+    if server is not None:
+        try:
+            return await server.execute(seed_path, fixreverter, worker.timeouts.timeout(benchmark, profile),
+                                        log_parser)
+        except ForkServerError as e:
+            # The fork server is restarted for the next execution.
+            logging.warning(f'fork server of benchmark {benchmark} failed, running {seed_path} in a new process: {e}')
+            del worker.fork_servers[(benchmark, profile)]
+            await server.close()
+    seed_env = dict(worker.envs[profile])
+    seed_env["FIXREVERTER"] = fixreverter
     args = [
-        helper.benchmark_triage_binary(seed['benchmark']),
+        helper.benchmark_triage_binary(benchmark),
         f'-timeout={UNIT_TIMEOUT}',
         f'-rss_limit_mb={RSS_LIMIT_MB}',
-        seed['path']
+        seed_path
     ]
-    res = execute_seed(args, seed_env, helper.tmp_running_dir(worker_name))
-    seed['reaches'], seed['triggers'] = parse_log(res.output)
-    # We only need reaches and triggers for seeds in queue.
-    if seed_type == 'queue':
-        return seed
+    return await execute_seed(args, seed_env, worker.tmp_dir, worker.timeouts.timeout(benchmark, profile),
+                              log_parser)
 
-    # Turn off logging of any injections.
-    seed_env["FIXREVERTER"] = 'on '
-    non_inj_res = execute_seed(args, seed_env, helper.tmp_running_dir(worker_name))
-    # This bug is not caused by FixReverter injections.
-    if non_inj_res.retcode:
-        seed['crashes'] = []
-    else:
-        logging.debug(f'triage on trial {seed["trial"]} is running {seed["path"]} with triggers{seed["triggers"]}')
-        min_crashsets = []
-        # TODO: Make combination level configurable.
-        comb_level = min(len(seed['triggers']), 3)
-        # Find min crash sets by iterating the power set of triggers.
-        for n in range(1, comb_level + 1):
-            for currset in itertools.combinations(seed['triggers'], n):
-                # Skip if current set is superset of a crash set.
-                for crashset in min_crashsets:
-                    if set(currset).issuperset(crashset):
-                        break
-                else:
-                    # Only turn on injections of currset.
-                    seed_env["FIXREVERTER"] = 'on ' + ' '.join([str(i) for i in currset])
-                    logging.debug(f'triage on trial {seed["trial"]} is running {seed["path"]} with set{currset}')
-                    curr_res = execute_seed(args, seed_env, helper.tmp_running_dir(worker_name))
-                    if curr_res.retcode:
-                        logging.debug(f'triage on trial {seed["trial"]} is running {seed["path"]} and get min set {currset}')
-                        min_crashsets.append(sorted(currset))
-        seed['crashes'] = min_crashsets
-    return seed
-
-
-def execute_seed(args: list, env: dict, cwd: str) -> ProcessResult:
-    return new_process.execute(args,
-                               env=env,
-                               cwd=cwd,
-                               expect_zero=False,
-                               kill_children=True,
-                               timeout=UNIT_TIMEOUT + 5)
+
+# Returns the fork server of the triage binary of `benchmark` with the sanitizer options of `profile`, starting it
+# on first use. Sanitizers read their options at startup, so each profile has its own fork server.
+# Returns None if fork servers are disabled or the binary does not support them.
+async def fork_server(worker: WorkerState, benchmark: str, profile: str):
+    if not worker.helper.fork_server():
+        return None
+    key = (benchmark, profile)
+    if key not in worker.fork_servers:
+        try:
+            worker.fork_servers[key] = await ForkServer.start(worker.helper.benchmark_triage_binary(benchmark),
+                                                              worker.envs[profile], worker.tmp_dir)
+        except ForkServerError as e:
+            logging.warning(f'{e}, running one process per execution')
+            worker.fork_servers[key] = None
+    return worker.fork_servers[key]
+
+
+async def execute_seed(args: list, env: dict, cwd: str, timeout: float, log_parser: LogParser) -> ProcessResult:
+    return await async_executor.execute(args, env, cwd, timeout, log_parser)
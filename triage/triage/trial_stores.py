@@ -0,0 +1,189 @@
+import collections
+import json
+import logging
+import os
+import threading
+
+import common.seed_source
+from common.confighelper import ConfigHelper
+
+
+class TriageJournal:
+    """Append-only record of a triage stage, read back by `--resume`.
+
+    Each line holds either the result of a seed content, keyed by benchmark and hash, or a trial whose
+    parsed_seeds store has been written. Without `resume`, the journal is started over.
+    """
+
+    def __init__(self, path: str, resume: bool, helper: ConfigHelper, seed_type: str):
+        # Maps (benchmark, hash) to results of contents triaged by previous runs.
+        self.contents = {}
+        # (benchmark, fuzzer, trial) of trials whose stores are complete.
+        self.trials = set()
+        if resume and os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # The last line of an interrupted run may be incomplete.
+                        continue
+                    if 'trial' in entry:
+                        self.trials.add(tuple(entry['trial']))
+                    else:
+                        self.contents[(entry['benchmark'], entry['hash'])] = entry['result']
+            self.trials = {trial for trial in self.trials
+                           if os.path.exists(helper.parsed_seeds_store(*trial, seed_type))}
+            logging.info(f'resume {seed_type} triage with {len(self.trials)} stored trials '
+                         f'and {len(self.contents)} triaged contents')
+        self.__file = open(path, 'a' if resume else 'w')
+
+    def add_content(self, benchmark: str, content_hash: str, result: list) -> None:
+        self.__append({'benchmark': benchmark, 'hash': content_hash, 'result': result})
+
+    def add_trial(self, trial: tuple) -> None:
+        self.__append({'trial': list(trial)})
+
+    def close(self) -> None:
+        self.__file.close()
+
+    def __append(self, entry: dict) -> None:
+        self.__file.write(json.dumps(entry) + '\n')
+        # Flushed per line so that an interrupted run loses at most the entry being written.
+        self.__file.flush()
+
+
+class StoredSeeds:
+    """Results of seeds in the parsed_seeds stores of a previous triage, read back by `--incremental`.
+
+    A seed keeps its stored result if the store of its trial has a seed with the same path and content hash, so
+    that only new or changed seeds are triaged. Stores are read one trial at a time, as seeds are listed.
+    """
+
+    def __init__(self, helper: ConfigHelper, seed_type: str, enabled: bool):
+        self.__helper = helper
+        self.__seed_type = seed_type
+        self.enabled = enabled
+        self.__trial = None
+        # Maps paths of the seeds stored for `__trial` to their stored seeds.
+        self.__seeds = {}
+
+    # Returns the stored result of `seed` of `trial`, or None if it is new or changed.
+    def result(self, trial: tuple, seed: dict):
+        if not self.enabled:
+            return None
+        if trial != self.__trial:
+            self.__trial = trial
+            self.__seeds = {}
+            store = self.__helper.parsed_seeds_store(*trial, self.__seed_type)
+            if os.path.exists(store):
+                with open(store, 'r') as f:
+                    self.__seeds = {stored['path']: stored for stored in json.load(f)}
+        stored = self.__seeds.get(seed['path'])
+        if stored is None or stored.get('hash') != seed['hash']:
+            return None
+        return stored_result(stored)
+
+
+# Returns the result of a seed of a parsed_seeds store, as passed to `TrialStores.add_result`.
+def stored_result(seed: dict) -> list:
+    executions = None
+    # Stores of older triage runs do not record executions.
+    if seed.get('executions') is not None:
+        executions = [seed['executions'], seed.get('exhaustive_executions')]
+    return [seed['reaches'], seed['triggers'], seed.get('crashes'), executions, seed.get('hang', False)]
+
+
+class TrialStores:
+    """Seeds of trials waiting for the results of their contents.
+
+    A trial is written to its parsed_seeds store as soon as all of its contents are triaged, and results are kept
+    only while a trial that is not written yet needs them. Seeds are listed in the task feeding thread of the pool
+    while results arrive in the main thread, so all methods hold a lock.
+    """
+
+    def __init__(self, helper: ConfigHelper, seed_type: str, journal: TriageJournal):
+        self.__helper = helper
+        self.__seed_type = seed_type
+        self.__journal = journal
+        self.__lock = threading.Lock()
+        # Maps (benchmark, fuzzer, trial) to [seeds, content ids of the seeds, content ids without results].
+        self.__trials = {}
+        # Maps content ids to (benchmark, hash), results, and the trials waiting for them.
+        self.__contents = {}
+        self.__results = {}
+        self.__waiting = collections.defaultdict(set)
+        # Maps content ids to the number of unwritten trials with seeds of the content.
+        self.__refs = collections.Counter()
+        # Benchmarks whose seeds are all listed, so no new trial refers to their contents.
+        self.__listed = set()
+        self.num_contents = 0
+        self.num_seeds = 0
+
+    # Registers a content id, with its result if known from the journal or a previous stage.
+    def add_content(self, content_id: int, benchmark: str, content_hash: str, result: list = None) -> None:
+        with self.__lock:
+            self.__contents[content_id] = (benchmark, content_hash)
+            if result is not None:
+                self.__results[content_id] = result
+
+    def has_result(self, content_id: int) -> bool:
+        with self.__lock:
+            return content_id in self.__results
+
+    def add_trial(self, trial: tuple, seeds: list, content_ids: list) -> None:
+        with self.__lock:
+            missing = {content_id for content_id in content_ids if content_id not in self.__results}
+            self.__trials[trial] = [seeds, content_ids, missing]
+            self.__refs.update(set(content_ids))
+            for content_id in missing:
+                self.__waiting[content_id].add(trial)
+            if not missing:
+                self.__write(trial)
+
+    def add_result(self, content_id: int, result: list) -> None:
+        with self.__lock:
+            self.__results[content_id] = result
+            self.num_contents += 1
+            self.__journal.add_content(*self.__contents[content_id], result)
+            for trial in self.__waiting.pop(content_id, ()):
+                missing = self.__trials[trial][2]
+                missing.discard(content_id)
+                if not missing:
+                    self.__write(trial)
+
+    # Called once all trials of `benchmark` are added.
+    def benchmark_listed(self, benchmark: str) -> None:
+        with self.__lock:
+            self.__listed.add(benchmark)
+            for content_id in [content_id for content_id, (content_benchmark, _) in self.__contents.items()
+                               if content_benchmark == benchmark and self.__refs[content_id] == 0]:
+                self.__forget(content_id)
+
+    def __write(self, trial: tuple) -> None:
+        seeds, content_ids, _ = self.__trials.pop(trial)
+        for seed, content_id in zip(seeds, content_ids):
+            reaches, triggers, crashes, executions, hang = self.__results[content_id]
+            seed['reaches'] = reaches
+            seed['triggers'] = triggers
+            if hang:
+                seed['hang'] = True
+            if crashes is not None:
+                seed['crashes'] = crashes
+            if executions is not None:
+                # Subsets of triggers run to find the crash sets, and how many the exhaustive search would run.
+                seed['executions'], seed['exhaustive_executions'] = executions
+        with open(self.__helper.parsed_seeds_store(*trial, self.__seed_type), 'w+') as f:
+            json.dump([{key: val for key, val in seed.items() if key not in common.seed_source.ARCHIVE_KEYS}
+                       for seed in seeds], f, indent=2)
+        self.__journal.add_trial(trial)
+        self.num_seeds += len(seeds)
+        for content_id in set(content_ids):
+            self.__refs[content_id] -= 1
+            if self.__refs[content_id] == 0 and self.__contents[content_id][0] in self.__listed:
+                self.__forget(content_id)
+
+    def __forget(self, content_id: int) -> None:
+        del self.__contents[content_id]
+        self.__results.pop(content_id, None)
+        del self.__refs[content_id]